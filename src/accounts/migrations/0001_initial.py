@@ -0,0 +1,77 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TypeEducation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Year',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Teacher',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('specialization', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('education_language_type', models.CharField(blank=True, choices=[('general', 'General'), ('languages', 'Languages'), ('baccalaureate', 'Baccalaureate')], default='general', max_length=15, null=True)),
+                ('promo_video', models.FileField(blank=True, null=True, upload_to='teacher_videos/')),
+                ('promo_video_link', models.CharField(blank=True, max_length=300, null=True)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='teachers/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.IntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['order'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Student',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=50, null=True)),
+                ('parent_phone', models.CharField(blank=True, max_length=11, null=True)),
+                ('points', models.IntegerField(default=1)),
+                ('division', models.CharField(blank=True, max_length=50, null=True)),
+                ('government', models.CharField(blank=True, max_length=100, null=True)),
+                ('jwt_token', models.CharField(blank=True, max_length=1000, null=True)),
+                ('active', models.BooleanField(default=False)),
+                ('block', models.BooleanField(default=False)),
+                ('code', models.CharField(blank=True, max_length=50, null=True)),
+                ('by_code', models.BooleanField(default=False)),
+                ('is_admin', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('type_education', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.typeeducation')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('year', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.year')),
+            ],
+        ),
+    ]
@@ -0,0 +1,107 @@
+"""
+``Idempotency-Key`` support for write endpoints.
+
+Clients on flaky networks resend the same write. With an
+``Idempotency-Key`` header, the ``idempotent`` view decorator runs the
+view once per (view, user, key, request body) and stores its response in
+the default cache for ``settings.IDEMPOTENCY['TTL']`` seconds. Retries
+within that window get the stored response back, marked with
+``Idempotent-Replayed: true``, without touching the database.
+
+The first request claims the key with ``cache.add`` before running the
+view. A duplicate that arrives while it is still running waits for its
+response, for up to ``WAIT_TIMEOUT`` seconds, instead of running the view
+a second time. After that it gets a 409 to retry later. Only successful
+(2xx) responses are stored. After a 4xx, a 5xx or an exception, a retry
+runs the view again, so a client can retry with the same key once the
+cause is fixed. Requests without the header are not affected.
+
+As with courses.admission, the guarantee only spans processes sharing the
+cache: configure a shared cache such as Redis in CACHES in production.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+DEFAULT_IDEMPOTENCY_SETTINGS = {
+    'TTL': 24 * 60 * 60,
+    # How long a claimed key stays claimed if its request dies without an answer
+    'LOCK_TIMEOUT': 60,
+    'WAIT_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+IN_FLIGHT = 'in-flight'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def get_idempotency_settings():
+    conf = dict(DEFAULT_IDEMPOTENCY_SETTINGS)
+    conf.update(getattr(settings, 'IDEMPOTENCY', {}))
+    return conf
+
+
+def request_fingerprint(data):
+    """sha256 of the request body, independent of key order."""
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def idempotency_cache_key(view, request, key):
+    user = request.user
+    owner = user.pk if user is not None and user.is_authenticated else 'anonymous'
+    scope = f"{type(view).__module__}.{type(view).__name__}:{owner}:{key}:{request_fingerprint(request.data)}"
+    return f"idempotency:{hashlib.sha256(scope.encode()).hexdigest()}"
+
+
+def replay(stored):
+    response = Response(stored['data'], status=stored['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(method):
+    """Decorator for the ``post`` (or ``put`` ...) method of an APIView."""
+
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return method(view, request, *args, **kwargs)
+
+        conf = get_idempotency_settings()
+        cache_key = idempotency_cache_key(view, request, key)
+        deadline = time.monotonic() + conf['WAIT_TIMEOUT']
+        while not cache.add(cache_key, IN_FLIGHT, conf['LOCK_TIMEOUT']):
+            stored = cache.get(cache_key)
+            if isinstance(stored, dict):
+                return replay(stored)
+            if time.monotonic() >= deadline:
+                response = Response(
+                    {"error": "A request with this Idempotency-Key is still being processed."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+                response['Retry-After'] = str(conf['WAIT_TIMEOUT'])
+                return response
+            # Still in flight; if it fails, the key is freed and add() wins
+            time.sleep(conf['POLL_INTERVAL'])
+
+        try:
+            response = method(view, request, *args, **kwargs)
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+        if not 200 <= response.status_code < 300 or not hasattr(response, 'data'):
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {'status': response.status_code, 'data': response.data}, conf['TTL'])
+        return response
+
+    return wrapper
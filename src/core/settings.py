@@ -59,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'courses.middleware.AdmissionControlMiddleware',
     'dashboard.middleware.RequestLogMiddleware',
 ]
 
@@ -92,6 +93,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file rather than SQLite's shared in-memory database, which locks
+        # per table and fails at once ("database table is locked") instead
+        # of waiting out the busy timeout. The threaded enrollment tests in
+        # courses.tests need the real locking. Django deletes it after a run.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -108,6 +114,17 @@ DATABASES = {
 #     }
 # }
 
+#^ Request logs can be kept in a separate database (e.g. REQUEST_LOG_DATABASE=logs)
+#^ so they don't compete with enrollment writes for the SQLite writer lock.
+REQUEST_LOG_DATABASE = os.getenv('REQUEST_LOG_DATABASE', 'default')
+if REQUEST_LOG_DATABASE not in DATABASES:
+    DATABASES[REQUEST_LOG_DATABASE] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{REQUEST_LOG_DATABASE}.sqlite3',
+    }
+
+DATABASE_ROUTERS = ['dashboard.routers.RequestLogRouter']
+
 
 
 
@@ -168,6 +185,38 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS=50000
 #     }
 # }
 
+#* Seconds dashboard_stats may serve a cached snapshot (see dashboard/caching.py);
+#* model signals invalidate it sooner
+DASHBOARD_STATS_CACHE_TTL = 60
+#* Seconds a confirmation-latency result is reused for the same filters
+CONFIRMATION_LATENCY_CACHE_TTL = 300
+#* Seconds student facet counts are reused for the same filters
+STUDENT_FACETS_CACHE_TTL = 30
+#* Upper bound for the timeslot heatmap cache; group, time and subscription
+#* changes invalidate it sooner
+TIMESLOT_HEATMAP_CACHE_TTL = 3600
+#* Waiting room for enrollment spikes (see courses/admission.py): per URL
+#* name, RATE requests per second with at most CONCURRENCY in flight; the
+#* rest get a queue ticket. Off by default: clients must handle the 429 and
+#* ticket flow, and the limits only hold across workers with a shared cache
+#* (Redis in CACHES above); with the default LocMemCache they are per process
+ADMISSION_CONTROL = {
+    'ENABLED': os.getenv('ADMISSION_CONTROL', 'false').lower() in ('1', 'true'),
+    'TICKET_TTL': 600,
+    'ENDPOINTS': {
+        'subscribe-to-groups': {'RATE': 20, 'CONCURRENCY': 4},
+        'course-groups': {'RATE': 100, 'CONCURRENCY': 16},
+    },
+}
+#* Idempotency-Key replay on write endpoints (see core/idempotency.py): TTL is
+#* how long a response is replayed, WAIT_TIMEOUT how long a duplicate waits
+#* for the first request to finish
+IDEMPOTENCY = {
+    'TTL': 24 * 60 * 60,
+    'LOCK_TIMEOUT': 60,
+    'WAIT_TIMEOUT': 10,
+}
+
 
 #^ < ==========================REST FRAMEWORK SETTINGS========================== >
 
@@ -220,6 +269,7 @@ CORS_ALLOW_HEADERS = [
     'Auth',
     'Authorization',
     'Content-Type',  
+    'Idempotency-Key',
 ]
 
 CORS_ALLOW_METHODS = [
@@ -307,6 +357,94 @@ APP_VERSION = "1.2.2"
 EASY_STREAM_BASE = "http://127.0.0.1:8000/video/video-ready-call-back/"
 
 
+# ^ < ==========================REQUEST LOGS CONFIG========================== >
+
+#* 'sync' writes every RequestLog inline, 'buffered' hands it to a background
+#* thread that bulk-inserts batches (see dashboard/log_writer.py). Opt in with
+#* REQUEST_LOG_MODE=buffered: queued records are lost if a worker is killed
+REQUEST_LOG_WRITER = {
+    'MODE': os.getenv('REQUEST_LOG_MODE', 'sync'),
+    'QUEUE_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+    'OVERFLOW': 'drop_newest',  # drop_newest | drop_oldest | block
+    'BLOCK_TIMEOUT': 0.05,
+    'SHUTDOWN_TIMEOUT': 5.0,
+}
+
+#* Path prefixes RequestLogMiddleware never logs (compiled into one regex)
+REQUEST_LOG_EXCLUDE_PATHS = [
+    '/admin/',
+    '/static/',
+    '/media/',
+    '/center/',
+    '/dashboard/logs/',
+]
+
+#* Staff write requests are always logged, everything else is sampled
+#* (see dashboard/sampling.py). First matching rule wins.
+REQUEST_LOG_SAMPLING = {
+    'DEFAULT_RATE': 0.0,
+    'RULES': [
+        {'path_prefix': '/courses/subscriptions/', 'rate': 0.02},
+        {'path_prefix': '/dashboard/subscriptions-simple/', 'rate': 0.05},
+        {'path_prefix': '/about/info/', 'rate': 0.01},
+    ],
+    'ALWAYS_LOG_ERRORS': True,
+    'ERROR_STATUS': 500,
+    'SLOW_REQUEST_MS': 1000,
+}
+
+#* Bodies above this size are truncated in the log and stored with their
+#* size and sha256 instead (see dashboard/body_capture.py)
+REQUEST_LOG_BODY_MAX_BYTES = 16 * 1024
+
+#* Count queries / DB time per logged request, and send a Server-Timing
+#* header (db, serialize, render, total) on every response
+REQUEST_LOG_INSTRUMENT_DB = True
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', str(DEBUG)).lower() in ('1', 'true')
+
+#* With ENABLED, prune_request_logs moves rows past MAX_AGE_DAYS into daily
+#* compressed segment files under DIR instead of deleting them; they stay
+#* browsable with GET /dashboard/logs/?source=archive (see dashboard/archive.py)
+REQUEST_LOG_ARCHIVE = {
+    'ENABLED': os.getenv('REQUEST_LOG_ARCHIVE', 'false').lower() in ('1', 'true'),
+    'DIR': os.path.join(BASE_DIR, 'log_archive'),
+    'KEEP_DAYS': 365,
+    'BLOCK_ROWS': 256,
+    'LEVEL': 6,
+}
+
+#* Requests slower than THRESHOLD_MS are stored as SlowRequest with every SQL
+#* statement, its time and project call site (GET /dashboard/logs/slow/).
+#* Off by default: it walks the stack on every statement of a traced request
+SLOW_REQUEST_TRACE = {
+    'ENABLED': os.getenv('SLOW_REQUEST_TRACE', 'false').lower() in ('1', 'true'),
+    'THRESHOLD_MS': 1000,
+    'MAX_QUERIES': 500,
+    'STACK_DEPTH': 5,
+    'SQL_MAX_CHARS': 2000,
+}
+
+#* Store bodies of at least MIN_BYTES zlib-compressed ('zlib') or as plain text (None).
+#* Existing rows can be converted with `manage.py recompress_request_logs`
+REQUEST_LOG_COMPRESSION = {
+    'CODEC': os.getenv('REQUEST_LOG_BODY_CODEC') or None,
+    'MIN_BYTES': 256,
+    'LEVEL': 6,
+}
+
+#* Enforced by `manage.py prune_request_logs` (run it from cron); deletes
+#* in CHUNK_SIZE primary-key chunks with PAUSE seconds between them
+REQUEST_LOG_RETENTION = {
+    'MAX_AGE_DAYS': int(os.getenv('REQUEST_LOG_MAX_AGE_DAYS', 30)),
+    'MAX_ROWS': None,
+    'ROLLUP_MAX_AGE_DAYS': 365,
+    'CHUNK_SIZE': 1000,
+    'PAUSE': 0.05,
+}
+
+
 # ^ < ==========================ordering apps and models in the admin========================== >
 from django.contrib import admin
 from django.contrib.admin import AdminSite
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from .idempotency import REPLAYED_HEADER, idempotent
+
+
+class CountingView(APIView):
+    authentication_classes = []
+    permission_classes = []
+    #^ Status of the first runs, 201 after that
+    status_codes = ()
+    #^ A request resent with the same key while this one is still running
+    duplicate = None
+
+    @idempotent
+    def post(self, request):
+        CountingView.runs += 1
+        run = CountingView.runs
+        if self.duplicate is not None:
+            CountingView.duplicate_response = CountingView.as_view()(self.duplicate)
+        code = self.status_codes[run - 1] if run <= len(self.status_codes) else status.HTTP_201_CREATED
+        return Response({'run': run}, status=code)
+
+
+@override_settings(IDEMPOTENCY={'WAIT_TIMEOUT': 0})
+class IdempotencyTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        CountingView.runs = 0
+        self.factory = APIRequestFactory()
+
+    def post(self, body, key='key-1', **initkwargs):
+        request = self.factory.post('/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        return CountingView.as_view(**initkwargs)(request)
+
+    def test_retry_gets_the_stored_response(self):
+        first = self.post({'group_ids': [1]})
+        retry = self.post({'group_ids': [1]})
+        self.assertEqual((retry.status_code, retry.data), (first.status_code, first.data))
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(CountingView.runs, 1)
+
+    def test_same_key_with_another_body_runs_again(self):
+        self.post({'group_ids': [1]})
+        other = self.post({'group_ids': [2]})
+        self.assertEqual(other.data, {'run': 2})
+        self.assertFalse(other.has_header(REPLAYED_HEADER))
+
+    def test_duplicate_while_in_flight_gets_409(self):
+        duplicate = self.factory.post('/', {'group_ids': [1]}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        first = self.post({'group_ids': [1]}, duplicate=duplicate)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(CountingView.duplicate_response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('Retry-After', CountingView.duplicate_response)
+        self.assertEqual(CountingView.runs, 1)
+
+    def test_errors_are_not_replayed(self):
+        rejected = self.post({'group_ids': [1]}, status_codes=(status.HTTP_400_BAD_REQUEST,))
+        retry = self.post({'group_ids': [1]}, status_codes=(status.HTTP_400_BAD_REQUEST,))
+        self.assertEqual(rejected.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual((retry.status_code, retry.data), (status.HTTP_201_CREATED, {'run': 2}))
+        self.assertFalse(retry.has_header(REPLAYED_HEADER))
+
+    def test_requests_without_a_key_always_run(self):
+        self.post({'group_ids': [1]}, key='')
+        again = self.post({'group_ids': [1]}, key='')
+        self.assertEqual(again.data, {'run': 2})
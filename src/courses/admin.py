@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Course, CourseGroup, CourseGroupTime, CourseGroupSubscription
+from .models import Course, CourseGroup, CourseGroupTime, CourseGroupSubscription, WaitlistEntry
 
 class CourseGroupTimeInline(admin.TabularInline):
     model = CourseGroupTime
@@ -52,8 +52,9 @@ class CourseGroupAdmin(admin.ModelAdmin):
     list_editable = ('is_active',)
 
     def confirmed_subscriptions_count(self, obj):
-        return obj.confirmed_subscriptions_count()
+        return obj.confirmed_count
     confirmed_subscriptions_count.short_description = "Confirmed Subs"
+    confirmed_subscriptions_count.admin_order_field = 'confirmed_count'
 
     def available_capacity(self, obj):
         return obj.available_capacity()
@@ -130,40 +131,23 @@ class CourseGroupSubscriptionAdmin(admin.ModelAdmin):
     ]
 
     def confirm_subscriptions(self, request, queryset):
-        updated = queryset.filter(is_confirmed=False).update(
-            is_confirmed=True,
-            confirmed_at=timezone.now(),
-            is_declined=False,
-            decline_note=None,
-            declined_at=None
-        )
+        updated = queryset.confirm()
         self.message_user(request, f"{updated} subscription(s) successfully confirmed.")
     confirm_subscriptions.short_description = "✅ Confirm selected subscriptions"
 
     def unconfirm_subscriptions(self, request, queryset):
-        updated = queryset.filter(is_confirmed=True).update(
-            is_confirmed=False,
-            confirmed_at=None
-        )
+        updated = queryset.unconfirm()
         self.message_user(request, f"{updated} subscription(s) marked as unconfirmed.")
     unconfirm_subscriptions.short_description = "⏳ Unconfirm selected subscriptions"
 
     def decline_subscriptions(self, request, queryset):
         default_note = "Declined by admin"
-        updated = queryset.filter(is_confirmed=False).update(
-            is_declined=True,
-            decline_note=default_note,
-            declined_at=timezone.now()
-        )
+        updated = queryset.decline(note=default_note)
         self.message_user(request, f"{updated} subscription(s) declined with default note.")
     decline_subscriptions.short_description = "❌ Decline selected subscriptions"
 
     def clear_decline_status(self, request, queryset):
-        updated = queryset.filter(is_declined=True).update(
-            is_declined=False,
-            decline_note=None,
-            declined_at=None
-        )
+        updated = queryset.clear_decline()
         self.message_user(request, f"{updated} subscription(s) had decline status cleared.")
     clear_decline_status.short_description = "🔄 Clear decline status"
 
@@ -172,8 +156,10 @@ class CourseGroupSubscriptionAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
-
-
-
-
-
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'course', 'course_group', 'created_at')
+    list_filter = ('course', 'course_group__teacher')
+    search_fields = ('student__name', 'course__title')
+    readonly_fields = ('created_at',)
+    ordering = ('course_group', 'created_at', 'id')
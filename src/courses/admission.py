@@ -0,0 +1,171 @@
+"""
+Admission control ("waiting room") for the enrollment endpoints.
+
+When a term opens, thousands of students hit the enrollment endpoints at
+once. AdmissionControlMiddleware lets the database see a bounded rate
+instead, per URL name, as configured in ``settings.ADMISSION_CONTROL``:
+
+    ADMISSION_CONTROL = {
+        'ENABLED': True,
+        'TICKET_TTL': 600,
+        'ENDPOINTS': {
+            'subscribe-to-groups': {'RATE': 20, 'CONCURRENCY': 4},
+            'course-groups': {'RATE': 100, 'CONCURRENCY': 16},
+        },
+    }
+
+A request is let through when it holds one of ``CONCURRENCY`` slots and
+one of the ``RATE`` tokens of the current second. Everything else gets a
+429 with a signed queue ticket. A ticket's turn (``eta``) is the end of
+the queue plus ``1 / RATE`` seconds, so the queue drains at ``RATE`` per
+second, and a ticket abandoned by its client costs its turn and nothing
+more. Clients resend the request with the ticket in ``X-Queue-Ticket``
+once its turn has come. Newcomers without a ticket only get in while
+nobody is queued. ``GET /courses/admission/?ticket=...`` reports a
+ticket's position from the cache alone.
+
+All state lives in the default cache (``incr`` / ``add``). With the
+default LocMemCache every process has its own gate; configure a shared
+cache such as Redis in CACHES so that the limits are global. Slot counters
+expire every ``SLOT_TTL`` seconds, so slots leaked by a killed worker heal.
+"""
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache as default_cache
+
+DEFAULT_ADMISSION_SETTINGS = {
+    'ENABLED': False,
+    'TICKET_TTL': 600,
+    'ENDPOINTS': {},
+}
+SLOT_TTL = 60
+TICKET_HEADER = 'X-Queue-Ticket'
+TICKET_SALT = 'courses.admission.ticket'
+
+
+def get_admission_settings():
+    conf = dict(DEFAULT_ADMISSION_SETTINGS)
+    conf.update(getattr(settings, 'ADMISSION_CONTROL', {}))
+    return conf
+
+
+@dataclass(frozen=True)
+class Ticket:
+    endpoint: str
+    number: int
+    eta: float
+
+
+class AdmissionGate:
+    """Token window, concurrency cap and ticket queue of one endpoint."""
+
+    def __init__(self, endpoint, rate, concurrency, ticket_ttl=600, cache=default_cache, clock=time.time):
+        self.endpoint = endpoint
+        self.rate = rate
+        self.concurrency = concurrency
+        self.ticket_ttl = ticket_ttl
+        self.cache = cache
+        self.clock = clock
+
+    @classmethod
+    def from_settings(cls, endpoint, conf=None, **kwargs):
+        conf = conf or get_admission_settings()
+        endpoint_conf = conf['ENDPOINTS'][endpoint]
+        return cls(
+            endpoint, endpoint_conf['RATE'], endpoint_conf['CONCURRENCY'],
+            ticket_ttl=conf['TICKET_TTL'], **kwargs,
+        )
+
+    def key(self, *parts):
+        return ':'.join(['admission', self.endpoint, *map(str, parts)])
+
+    def _incr(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.add(key, 1, timeout)
+            return 1
+
+    def acquire_slot(self):
+        if self._incr(self.key('slots'), SLOT_TTL) <= self.concurrency:
+            return True
+        self.release_slot()
+        return False
+
+    def release_slot(self):
+        try:
+            self.cache.decr(self.key('slots'))
+        except ValueError:
+            # The counter expired meanwhile and starts over at zero
+            pass
+
+    def take_token(self):
+        return self._incr(self.key('tokens', int(self.clock())), 2) <= self.rate
+
+    def issue_ticket(self):
+        """A ticket at the end of the queue, one ``1 / RATE`` step after the last one."""
+        number = self._incr(self.key('issued'), None)
+        # get/set rather than atomic: two tickets racing here may share a
+        # turn, which the token window still bounds
+        eta = max(self.clock(), self.cache.get(self.key('tail'), 0)) + 1 / self.rate
+        self.cache.set(self.key('tail'), eta, self.ticket_ttl)
+        return Ticket(self.endpoint, number, eta)
+
+    def queue_is_empty(self):
+        return self.cache.get(self.key('tail'), 0) <= self.clock()
+
+    def admit(self, ticket=None):
+        """
+        Try to let a request in. Returns ``(True, None)`` with a slot held
+        (give it back with ``release_slot``) or ``(False, ticket)`` with the
+        ticket to come back with: ``ticket`` itself or a new one.
+        """
+        if ticket is not None and (
+            ticket.endpoint != self.endpoint or self.cache.get(self.key('used', ticket.number))
+        ):
+            # Another endpoint's ticket, or one that already got in once
+            ticket = None
+        turn = self.queue_is_empty() if ticket is None else ticket.eta <= self.clock()
+        if turn and self.acquire_slot():
+            if self.take_token():
+                if ticket is not None:
+                    self.cache.set(self.key('used', ticket.number), True, self.ticket_ttl)
+                return True, None
+            self.release_slot()
+        return False, ticket or self.issue_ticket()
+
+    def position(self, ticket):
+        """Tickets ahead of ``ticket``, including it; 0 once its turn has come."""
+        return max(math.ceil((ticket.eta - self.clock()) * self.rate), 0)
+
+    def retry_after(self, ticket):
+        """Seconds until ``ticket``'s turn, or one ``1 / RATE`` step if it has come, to a tenth."""
+        return math.ceil(max(ticket.eta - self.clock(), 1 / self.rate) * 10) / 10
+
+    def status(self, ticket):
+        position = self.position(ticket)
+        return {
+            'endpoint': self.endpoint,
+            'position': position,
+            'ready': position == 0,
+            'retry_after': self.retry_after(ticket),
+        }
+
+
+def sign_ticket(ticket):
+    return signing.dumps([ticket.endpoint, ticket.number, ticket.eta], salt=TICKET_SALT, compress=True)
+
+
+def read_ticket(token, max_age):
+    """The Ticket of a signed ``token``, or None if it is forged or older than ``max_age`` seconds."""
+    try:
+        endpoint, number, eta = signing.loads(token, salt=TICKET_SALT, max_age=max_age)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return Ticket(endpoint, number, eta)
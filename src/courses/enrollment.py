@@ -0,0 +1,223 @@
+"""
+Student self-enrollment into course groups.
+
+``enroll`` handles a whole request in one transaction with a constant
+number of queries, however many groups are asked for:
+
+1. lock the requested CourseGroup rows before reading anything
+   (``CourseGroupQuerySet.lock``: ``SELECT ... FOR UPDATE`` in id order so
+   concurrent requests can't deadlock, or the SQLite write lock), which
+   serializes every enrollment into the same group;
+2. read the student's existing subscriptions in one query; the locked
+   rows carry each group's ``confirmed_count`` and ``pending_count``;
+3. ``bulk_create`` the new pending subscriptions and send
+   ``subscriptions_changed`` for them, as ``save()`` would.
+
+The (student, course_group) unique constraint backs this up against
+writers that don't take the lock: if the insert still collides, the
+transaction is retried and the colliding group reported as already
+subscribed. A database still locked after its busy timeout is retried
+with backoff too.
+
+Full groups can be queued on instead (``waitlist=True``): the student gets
+a WaitlistEntry, and ``promote_waitlist`` turns the oldest entries into
+pending subscriptions as seats free up. A seat is free when neither a
+confirmed nor a pending subscription holds it (``CourseGroup.free_seats``).
+Enrollment and promotion both go by this one definition, and while a
+group has a queue, newcomers join its back rather than taking a seat
+ahead of it.
+"""
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from .models import CourseGroup, CourseGroupSubscription, WaitlistEntry
+from .signals import STATUS_PENDING, SubscriptionChange, send_subscriptions_changed
+
+ENROLL_ATTEMPTS = 5
+#^ Seconds before the first retry; doubled (with jitter) on every attempt
+ENROLL_BACKOFF = 0.05
+
+REASON_ALREADY_SUBSCRIBED = 'Already subscribed'
+REASON_NO_SEATS = 'No available seats'
+REASON_ALREADY_WAITLISTED = 'Already waitlisted'
+
+
+class GroupsNotFound(Exception):
+    def __init__(self, group_ids):
+        super().__init__(f"Invalid group IDs: {set(group_ids)}")
+        self.group_ids = group_ids
+
+
+def _skipped_entry(group_id, existing):
+    if existing is None:
+        return {'group_id': group_id, 'reason': REASON_NO_SEATS}
+    return {
+        'group_id': group_id,
+        'reason': REASON_ALREADY_SUBSCRIBED,
+        'existing_subscription_id': existing.id,
+        'status': 'subscribed' if existing.is_confirmed else 'pending',
+    }
+
+
+def waitlist_positions(student, group_ids):
+    """``{group_id: (entry_id, position)}`` of ``student``'s entries, 1 = next in line."""
+    ahead = (
+        WaitlistEntry.objects.filter(course_group_id=OuterRef('course_group_id'))
+        .filter(Q(created_at__lt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), id__lt=OuterRef('id')))
+        .order_by().values('course_group_id').annotate(n=Count('id')).values('n')
+    )
+    entries = (
+        WaitlistEntry.objects.filter(student=student, course_group_id__in=group_ids)
+        .annotate(ahead=Coalesce(Subquery(ahead), Value(0)))
+        .values_list('course_group_id', 'id', 'ahead')
+    )
+    return {group_id: (entry_id, ahead + 1) for group_id, entry_id, ahead in entries}
+
+
+def _enroll_once(student, group_ids, waitlist=False):
+    with transaction.atomic():
+        groups = {
+            group.id: group for group in
+            CourseGroup.objects.filter(id__in=group_ids).lock()
+        }
+        missing = [group_id for group_id in group_ids if group_id not in groups]
+        if missing:
+            raise GroupsNotFound(missing)
+
+        existing = {
+            subscription.course_group_id: subscription for subscription in
+            CourseGroupSubscription.objects.filter(student=student, course_group_id__in=groups)
+            .only('id', 'course_group_id', 'is_confirmed')
+        }
+        queued = dict(
+            WaitlistEntry.objects.filter(course_group_id__in=groups).order_by()
+            .values('course_group_id').annotate(n=Count('id')).values_list('course_group_id', 'n')
+        )
+        waiting = set(
+            WaitlistEntry.objects.filter(student=student, course_group_id__in=groups)
+            .values_list('course_group_id', flat=True)
+        )
+
+        pending, skipped, entries = [], [], []
+        for group_id in group_ids:
+            group = groups[group_id]
+            if group_id in existing:
+                skipped.append((group_id, existing[group_id]))
+                continue
+            if group.free_seats() <= 0 or queued.get(group_id):
+                if not waitlist:
+                    skipped.append((group_id, None))
+                elif group_id not in waiting:
+                    waiting.add(group_id)
+                    queued[group_id] = queued.get(group_id, 0) + 1
+                    entries.append(WaitlistEntry(student=student, course_id=group.course_id, course_group=group))
+                continue
+            subscription = CourseGroupSubscription(
+                student=student, course_id=group.course_id, course_group=group, is_confirmed=False,
+            )
+            # A repeated id in the request is "already subscribed" by then
+            existing[group_id] = subscription
+            pending.append(subscription)
+
+        created = CourseGroupSubscription.objects.bulk_create(pending)
+        send_subscriptions_changed(CourseGroupSubscription, [
+            SubscriptionChange.for_instance(subscription, None, STATUS_PENDING) for subscription in created
+        ])
+        results = {
+            # Rendered after bulk_create, which fills in the ids of the new rows
+            'created': [
+                {'group_id': subscription.course_group_id, 'subscription_id': subscription.id, 'status': 'pending'}
+                for subscription in created
+            ],
+            'skipped': [_skipped_entry(group_id, subscription) for group_id, subscription in skipped],
+        }
+        if waitlist:
+            WaitlistEntry.objects.bulk_create(entries)
+            new = {entry.course_group_id for entry in entries}
+            positions = waitlist_positions(student, waiting)
+            results['waitlisted'] = [
+                {
+                    'group_id': group_id,
+                    'waitlist_entry_id': entry_id,
+                    'position': position,
+                    **({} if group_id in new else {'reason': REASON_ALREADY_WAITLISTED}),
+                }
+                for group_id, (entry_id, position) in positions.items()
+            ]
+    return results
+
+
+def enroll(student, group_ids, waitlist=False):
+    """
+    Subscribe ``student`` to every group of ``group_ids`` that has free seats
+    and isn't subscribed yet. Returns ``{'created': [...], 'skipped': [...]}``
+    in the shape SubscribeToGroupsView has always returned. Raises
+    GroupsNotFound, before creating anything, if a group doesn't exist.
+
+    With ``waitlist``, full groups queue the student instead of being
+    skipped, and the result gains ``'waitlisted': [{'group_id',
+    'waitlist_entry_id', 'position'}, ...]``.
+    """
+    for attempt in range(ENROLL_ATTEMPTS):
+        try:
+            return _enroll_once(student, group_ids, waitlist)
+        except (IntegrityError, OperationalError):
+            # IntegrityError: a subscription was inserted without the group
+            # lock since we read; the next attempt sees it as existing.
+            # OperationalError: the database stayed locked past its busy
+            # timeout (SQLite in a registration burst). Inside an outer
+            # transaction a retry can't help
+            if attempt == ENROLL_ATTEMPTS - 1 or transaction.get_connection().in_atomic_block:
+                raise
+            time.sleep(ENROLL_BACKOFF * 2 ** attempt * random.uniform(1, 2))
+
+
+def promote_waitlist(group_ids):
+    """
+    Give the free seats of ``group_ids`` to their oldest waitlist entries,
+    as pending subscriptions, with a constant number of queries. Entries
+    of students subscribed some other way are dropped. Runs in (or as) the
+    caller's transaction with the groups locked; returns the new
+    subscriptions.
+    """
+    with transaction.atomic():
+        slots = {
+            group.id: group.free_seats() for group in
+            CourseGroup.objects.filter(id__in=group_ids).lock()
+        }
+        slots = {group_id: free for group_id, free in slots.items() if free > 0}
+        if not slots:
+            return []
+
+        queued = WaitlistEntry.objects.filter(course_group_id__in=slots)
+        subscribed = CourseGroupSubscription.objects.filter(
+            student_id=OuterRef('student_id'), course_group_id=OuterRef('course_group_id'),
+        )
+        # Students subscribed some other way meanwhile leave the queue
+        queued.filter(Exists(subscribed)).delete()
+        entries = list(
+            queued.annotate(position=Window(
+                RowNumber(), partition_by=F('course_group_id'), order_by=[F('created_at').asc(), F('id').asc()],
+            ))
+            .filter(position__lte=max(slots.values()))
+            .order_by('course_group_id', 'position')
+        )
+        entries = [entry for entry in entries if entry.position <= slots[entry.course_group_id]]
+
+        WaitlistEntry.objects.filter(id__in=[entry.id for entry in entries]).delete()
+        pending = [
+            CourseGroupSubscription(
+                student_id=entry.student_id, course_id=entry.course_id,
+                course_group_id=entry.course_group_id, is_confirmed=False,
+            )
+            for entry in entries
+        ]
+        created = CourseGroupSubscription.objects.bulk_create(pending)
+        send_subscriptions_changed(CourseGroupSubscription, [
+            SubscriptionChange.for_instance(subscription, None, STATUS_PENDING) for subscription in created
+        ])
+    return created
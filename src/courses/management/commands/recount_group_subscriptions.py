@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import CourseGroup
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute CourseGroup.confirmed_count / pending_count / declined_count from the "
+        "subscription table (after migrating, or after raw SQL writes)."
+    )
+
+    def handle(self, *args, **options):
+        groups = CourseGroup.objects.recount_subscriptions()
+        self.stdout.write(self.style.SUCCESS(f"Done: {groups} groups recounted"))
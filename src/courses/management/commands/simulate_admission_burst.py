@@ -0,0 +1,100 @@
+import heapq
+import random
+from collections import Counter
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.admission import AdmissionGate, get_admission_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a registration burst against an endpoint's admission gate (ADMISSION_CONTROL) "
+        "on a simulated clock and a private cache, and report the admitted rate, concurrency "
+        "and waiting times. Touches neither the database nor the real cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('endpoint', nargs='?', default='subscribe-to-groups', help="URL name to simulate.")
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--spread', type=float, default=10.0, help="Seconds over which the clients arrive.")
+        parser.add_argument('--service-ms', type=float, default=150.0, help="Time an admitted request takes.")
+        parser.add_argument('--abandon', type=float, default=0.0, help="Share of queued clients that give up.")
+        parser.add_argument('--rate', type=int, help="Override RATE.")
+        parser.add_argument('--concurrency', type=int, help="Override CONCURRENCY.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        conf = get_admission_settings()
+        endpoint = options['endpoint']
+        if endpoint not in conf['ENDPOINTS'] and not (options['rate'] and options['concurrency']):
+            raise CommandError(f"{endpoint!r} is not in ADMISSION_CONTROL['ENDPOINTS']; pass --rate and --concurrency")
+        endpoint_conf = conf['ENDPOINTS'].get(endpoint, {})
+        rate = options['rate'] or endpoint_conf['RATE']
+        concurrency = options['concurrency'] or endpoint_conf['CONCURRENCY']
+
+        now = [0.0]
+        gate = AdmissionGate(
+            endpoint, rate, concurrency, ticket_ttl=conf['TICKET_TTL'],
+            cache=LocMemCache(f'admission-simulation-{endpoint}', {}), clock=lambda: now[0],
+        )
+        stats = simulate(gate, now, options['clients'], options['spread'], options['service_ms'] / 1000,
+                         options['abandon'], random.Random(options['seed']))
+
+        waits = sorted(stats['waits'])
+        per_second = Counter(int(at) for at in stats['admitted_at'])
+
+        def percentile(p):
+            return waits[min(int(len(waits) * p / 100), len(waits) - 1)] if waits else 0.0
+
+        self.stdout.write(f"endpoint {endpoint}: RATE={rate}/s CONCURRENCY={concurrency}")
+        self.stdout.write(
+            f"clients {options['clients']} over {options['spread']}s: {len(waits)} admitted, "
+            f"{stats['abandoned']} gave up, {stats['attempts']} requests, {stats['tickets']} tickets"
+        )
+        self.stdout.write(
+            f"admitted per second: max {max(per_second.values(), default=0)}, "
+            f"max in flight {stats['max_in_flight']}, drained after {stats['finished']:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"wait: p50 {percentile(50):.1f}s, p95 {percentile(95):.1f}s, max {percentile(100):.1f}s"
+        ))
+
+
+def simulate(gate, now, clients, spread, service, abandon, rng):
+    """
+    Discrete-event run: clients arrive uniformly over ``spread`` seconds,
+    admitted requests hold their slot for ``service`` seconds, and queued
+    clients come back after Retry-After (or give up with ``abandon`` odds).
+    """
+    # (time, order, kind, client): releases sort before attempts at the same time
+    events = [(rng.uniform(0, spread), 1, 'attempt', client) for client in range(clients)]
+    heapq.heapify(events)
+    arrived, tickets = {}, {}
+    stats = {'waits': [], 'admitted_at': [], 'attempts': 0, 'abandoned': 0, 'max_in_flight': 0, 'finished': 0.0}
+    in_flight = 0
+    while events:
+        now[0], _, kind, client = heapq.heappop(events)
+        if kind == 'release':
+            gate.release_slot()
+            in_flight -= 1
+            continue
+
+        arrived.setdefault(client, now[0])
+        stats['attempts'] += 1
+        admitted, ticket = gate.admit(tickets.get(client))
+        if admitted:
+            in_flight += 1
+            stats['max_in_flight'] = max(stats['max_in_flight'], in_flight)
+            stats['waits'].append(now[0] - arrived[client])
+            stats['admitted_at'].append(now[0])
+            stats['finished'] = now[0]
+            heapq.heappush(events, (now[0] + service, 0, 'release', client))
+        elif client not in tickets and rng.random() < abandon:
+            stats['abandoned'] += 1
+        else:
+            tickets[client] = ticket
+            heapq.heappush(events, (now[0] + gate.retry_after(ticket), 1, 'attempt', client))
+    stats['tickets'] = len(tickets)
+    return stats
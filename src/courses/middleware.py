@@ -0,0 +1,113 @@
+import math
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import JsonResponse
+from django.urls import get_resolver, reverse
+
+from .admission import TICKET_HEADER, AdmissionGate, get_admission_settings, read_ticket, sign_ticket
+
+#^ Never gated, so preflight requests don't spend tokens
+UNGATED_METHODS = ('OPTIONS', 'HEAD')
+#^ Where the literal prefix of a URL regex ends
+REGEX_SYNTAX = re.compile(r'[\\()\[\].*+?^$|{]')
+
+
+def url_routes(url_name):
+    """``(literal path prefix, compiled regex)`` for every URL pattern named ``url_name``."""
+    routes = []
+    for _, pattern, _, _ in get_resolver().reverse_dict.getlist(url_name):
+        prefix = '/' + REGEX_SYNTAX.split(pattern, 1)[0]
+        routes.append((prefix, re.compile(pattern)))
+    return routes
+
+
+class AdmissionControlMiddleware:
+    """
+    Lets requests to the endpoints of ``settings.ADMISSION_CONTROL`` through
+    at a bounded rate and concurrency, and answers the rest with a 429 and
+    a queue ticket (see courses/admission.py). Placed before
+    RequestLogMiddleware so turned-away requests cost no database write.
+
+    Sync and async like RequestLogMiddleware, so it keeps an ASGI chain
+    async. Only gated requests touch the cache (from a worker thread in
+    async mode); the rest cost a ``startswith`` on the gated URL prefixes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        conf = get_admission_settings()
+        self.ticket_ttl = conf['TICKET_TTL']
+        self.gates = {
+            endpoint: AdmissionGate.from_settings(endpoint, conf)
+            for endpoint in conf['ENDPOINTS']
+        } if conf['ENABLED'] else {}
+        self._routes = None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        gate = self.gate_for(request)
+        if gate is None:
+            return self.get_response(request)
+        admitted, ticket = gate.admit(self.read_ticket(request))
+        if not admitted:
+            return self.queued_response(gate, ticket)
+        try:
+            return self.get_response(request)
+        finally:
+            gate.release_slot()
+
+    async def __acall__(self, request):
+        gate = self.gate_for(request)
+        if gate is None:
+            return await self.get_response(request)
+        admitted, ticket = await sync_to_async(gate.admit)(self.read_ticket(request))
+        if not admitted:
+            return self.queued_response(gate, ticket)
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(gate.release_slot)()
+
+    @property
+    def routes(self):
+        # Built on first use: the URLconf may not be importable yet in __init__
+        if self._routes is None:
+            self._routes = [
+                (prefix, regex, gate)
+                for endpoint, gate in self.gates.items()
+                for prefix, regex in url_routes(endpoint)
+            ]
+        return self._routes
+
+    def gate_for(self, request):
+        if not self.gates or request.method in UNGATED_METHODS:
+            return None
+        path = request.path_info
+        for prefix, regex, gate in self.routes:
+            if path.startswith(prefix) and regex.match(path, 1):
+                return gate
+        return None
+
+    def read_ticket(self, request):
+        token = request.headers.get(TICKET_HEADER)
+        return read_ticket(token, self.ticket_ttl) if token else None
+
+    def queued_response(self, gate, ticket):
+        status = gate.status(ticket)
+        response = JsonResponse({
+            'detail': "Too many requests right now; you have a place in the queue.",
+            'ticket': sign_ticket(ticket),
+            'ticket_header': TICKET_HEADER,
+            'poll_url': reverse('admission-ticket'),
+            **status,
+        }, status=429)
+        response['Retry-After'] = str(math.ceil(status['retry_after']))
+        return response
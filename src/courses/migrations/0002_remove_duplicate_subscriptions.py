@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count
+
+#^ Ids per DELETE, under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    """
+    Keep one subscription per (student, course_group) so that
+    unique_student_course_group can be added: the confirmed one if any,
+    else a pending one, else the oldest.
+    """
+    Subscription = apps.get_model('courses', 'CourseGroupSubscription')
+    subscriptions = Subscription.objects.using(schema_editor.connection.alias)
+    duplicated = (
+        subscriptions.order_by().values('student_id', 'course_group_id')
+        .annotate(n=Count('id')).filter(n__gt=1)
+    )
+    doomed = []
+    for pair in duplicated:
+        ids = list(
+            subscriptions.filter(student_id=pair['student_id'], course_group_id=pair['course_group_id'])
+            .order_by('-is_confirmed', 'is_declined', 'created_at', 'id').values_list('id', flat=True)
+        )
+        doomed.extend(ids[1:])
+    for start in range(0, len(doomed), CHUNK_SIZE):
+        subscriptions.filter(id__in=doomed[start:start + CHUNK_SIZE]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_remove_duplicate_subscriptions'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='coursegroupsubscription',
+            constraint=models.UniqueConstraint(fields=('student', 'course_group'), name='unique_student_course_group'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_subscriptions(apps, schema_editor):
+    """Fill the new columns from the subscriptions already there."""
+    CourseGroup = apps.get_model('courses', 'CourseGroup')
+    Subscription = apps.get_model('courses', 'CourseGroupSubscription')
+    using = schema_editor.connection.alias
+    counts = {}
+    rows = (
+        Subscription.objects.using(using).order_by()
+        .values('course_group_id', 'is_confirmed', 'is_declined').annotate(n=Count('id'))
+    )
+    for row in rows:
+        group = counts.setdefault(row['course_group_id'], {'confirmed_count': 0, 'pending_count': 0, 'declined_count': 0})
+        if row['is_confirmed']:
+            group['confirmed_count'] += row['n']
+        elif row['is_declined']:
+            group['declined_count'] += row['n']
+        else:
+            group['pending_count'] += row['n']
+    for group_id, fields in counts.items():
+        CourseGroup.objects.using(using).filter(pk=group_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_unique_student_course_group'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursegroup',
+            name='confirmed_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='coursegroup',
+            name='declined_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='coursegroup',
+            name='pending_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_subscriptions, migrations.RunPython.noop),
+    ]
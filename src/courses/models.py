@@ -1,6 +1,19 @@
-from django.db import models
+from collections import Counter
+
+from django.db import connections, models, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from accounts.models import Year, TypeEducation, Student, Teacher
 from django.utils import timezone
+from .signals import (
+    STATUS_CONFIRMED,
+    STATUS_DECLINED,
+    STATUS_PENDING,
+    SubscriptionChange,
+    SubscriptionState,
+    send_subscriptions_changed,
+    subscription_status,
+)
 
 class Course(models.Model):
     title = models.CharField(max_length=100)
@@ -13,6 +26,68 @@ class Course(models.Model):
     def __str__(self):
         return f"{self.title} - {self.year.name}"
 
+SUBSCRIPTION_COUNT_FIELDS = {
+    STATUS_CONFIRMED: 'confirmed_count',
+    STATUS_PENDING: 'pending_count',
+    STATUS_DECLINED: 'declined_count',
+}
+#^ CourseGroup.free_seats() as an expression, for filters and annotations
+FREE_SEATS = F('capacity') - F('confirmed_count') - F('pending_count')
+
+
+class CourseGroupQuerySet(models.QuerySet):
+
+    def lock(self):
+        """
+        These groups, locked until the end of the transaction, in id order.
+
+        ``select_for_update()`` is a no-op on SQLite. There, two
+        transactions that read first and write later can't both upgrade
+        their lock, and one fails at once with "database is locked". So
+        on SQLite a no-op UPDATE takes the database write lock before
+        anything is read, and concurrent writers wait on the busy timeout.
+        """
+        if connections[self.db].vendor == 'sqlite':
+            self.update(capacity=F('capacity'))
+        return self.select_for_update().order_by('id')
+
+    def apply_subscription_changes(self, changes):
+        """
+        Add a batch of SubscriptionChange to the count columns of their
+        groups, with one UPDATE ... SET x_count = x_count + CASE ... END.
+        """
+        deltas = {}
+        for change in changes:
+            counts = deltas.setdefault(change.course_group_id, Counter())
+            if change.new_status:
+                counts[SUBSCRIPTION_COUNT_FIELDS[change.new_status]] += 1
+            if change.old_status:
+                counts[SUBSCRIPTION_COUNT_FIELDS[change.old_status]] -= 1
+        updates = {}
+        for field in SUBSCRIPTION_COUNT_FIELDS.values():
+            whens = [When(pk=group_id, then=Value(counts[field])) for group_id, counts in deltas.items() if counts[field]]
+            if whens:
+                updates[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+        if not updates:
+            return 0
+        return self.filter(pk__in=sorted(deltas)).update(**updates)
+
+    def recount_subscriptions(self):
+        """Recompute the count columns from the subscription table."""
+        def count(**filters):
+            return Coalesce(Subquery(
+                CourseGroupSubscription.objects.filter(course_group=OuterRef('pk'), **filters)
+                .order_by().values('course_group').annotate(n=Count('id')).values('n'),
+                output_field=IntegerField(),
+            ), 0)
+
+        return self.update(
+            confirmed_count=count(is_confirmed=True),
+            pending_count=count(is_confirmed=False, is_declined=False),
+            declined_count=count(is_confirmed=False, is_declined=True),
+        )
+
+
 class CourseGroup(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     teacher = models.ForeignKey(Teacher, on_delete=models.CASCADE)
@@ -21,18 +96,52 @@ class CourseGroup(models.Model):
     image = models.ImageField(upload_to='course_groups/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Subscriptions per status, kept current from subscriptions_changed
+    # (see courses.signals); recount with manage.py recount_group_subscriptions
+    confirmed_count = models.IntegerField(default=0, editable=False)
+    pending_count = models.IntegerField(default=0, editable=False)
+    declined_count = models.IntegerField(default=0, editable=False)
+
+    objects = CourseGroupQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.course.title} - Group {self.id} (Teacher: {self.teacher.name})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_capacity = instance.__dict__.get('capacity')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The counts only change through F() updates; saving an instance
+        # loaded earlier must not write its stale values back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in SUBSCRIPTION_COUNT_FIELDS.values()
+            ]
+        loaded_capacity = getattr(self, '_loaded_capacity', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if loaded_capacity is not None and self.capacity > loaded_capacity:
+                # More seats: let the waitlist in
+                from .enrollment import promote_waitlist
+                promote_waitlist([self.pk])
+        self._loaded_capacity = self.capacity
+
+    def free_seats(self):
+        """Seats not held by a confirmed or pending subscription."""
+        return self.capacity - self.confirmed_count - self.pending_count
+
     def confirmed_subscriptions_count(self):
-        return self.coursegroupsubscription_set.filter(is_confirmed=True).count()
+        return self.confirmed_count
 
     def available_capacity(self):
-        return self.capacity - self.confirmed_subscriptions_count()
+        return self.free_seats()
 
     def has_seats(self):
-        return self.available_capacity() > 0
+        return self.free_seats() > 0
 
 class CourseGroupTime(models.Model):
     DAY_CHOICES = [
@@ -52,6 +161,116 @@ class CourseGroupTime(models.Model):
     def __str__(self):
         return f"{self.get_day_display()} at {self.time.strftime('%H:%M')}"
 
+SUBSCRIPTION_STATE_FIELDS = ('is_confirmed', 'is_declined', 'confirmed_at', 'declined_at')
+SUBSCRIPTION_CHANGE_FIELDS = (
+    'id', 'student_id', 'course_id', 'course_group_id', 'created_at',
+) + SUBSCRIPTION_STATE_FIELDS
+
+
+class CourseGroupSubscriptionQuerySet(models.QuerySet):
+    """
+    ``update()`` of any status field locks and reads the affected rows,
+    updates them with a single UPDATE, reads their new state and sends
+    ``subscriptions_changed`` (see courses.signals), all in one transaction,
+    so derived counters stay correct. The bulk status transitions below
+    are built on it.
+    """
+
+    def update(self, **kwargs):
+        if not set(SUBSCRIPTION_STATE_FIELDS) & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            rows = list(self.select_for_update().values(*SUBSCRIPTION_CHANGE_FIELDS))
+            if not rows:
+                return 0
+            # Only the locked rows, not whatever matches the filter by now
+            locked = self.model._default_manager.using(self.db).filter(pk__in=[row['id'] for row in rows])
+            updated = super(CourseGroupSubscriptionQuerySet, locked).update(**kwargs)
+            new_states = {state['id']: state for state in locked.values('id', *SUBSCRIPTION_STATE_FIELDS)}
+            changes = []
+            for row in rows:
+                new = new_states[row['id']]
+                changes.append(SubscriptionChange(
+                    subscription_id=row['id'],
+                    student_id=row['student_id'],
+                    course_id=row['course_id'],
+                    course_group_id=row['course_group_id'],
+                    old_status=subscription_status(row['is_confirmed'], row['is_declined']),
+                    new_status=subscription_status(new['is_confirmed'], new['is_declined']),
+                    created_at=row['created_at'],
+                    confirmed_at=new['confirmed_at'],
+                    declined_at=new['declined_at'],
+                    old_confirmed_at=row['confirmed_at'],
+                    old_declined_at=row['declined_at'],
+                ))
+            send_subscriptions_changed(self.model, changes)
+        return updated
+
+    def _transition(self, updates):
+        # timezone.now as a value means "the time of this transition"
+        now = timezone.now()
+        return self.update(**{field: now if value is timezone.now else value for field, value in updates.items()})
+
+    def confirm(self):
+        return self.filter(is_confirmed=False)._transition(dict(
+            is_confirmed=True,
+            confirmed_at=timezone.now,
+            is_declined=False,
+            decline_note=None,
+            declined_at=None,
+        ))
+
+    def confirm_within_capacity(self):
+        """
+        Confirm the unconfirmed subscriptions of this queryset per group,
+        oldest first (created_at, id), only up to each group's available
+        seats (capacity - confirmed_count), in one transaction with the
+        groups locked. Returns ``{'confirmed', 'overflowed',
+        'already_confirmed'}`` lists of ids, with a constant number of
+        queries however many rows match.
+        """
+        with transaction.atomic(using=self.db):
+            seats = {
+                group_id: capacity - confirmed for group_id, capacity, confirmed in
+                CourseGroup.objects.using(self.db)
+                .filter(id__in=self.order_by().values('course_group_id')).lock()
+                .values_list('id', 'capacity', 'confirmed_count')
+            }
+            result = {'confirmed': [], 'overflowed': [], 'already_confirmed': []}
+            rows = self.order_by('course_group_id', 'created_at', 'id').values_list('id', 'course_group_id', 'is_confirmed')
+            for subscription_id, group_id, is_confirmed in rows:
+                if is_confirmed:
+                    result['already_confirmed'].append(subscription_id)
+                elif seats[group_id] > 0:
+                    seats[group_id] -= 1
+                    result['confirmed'].append(subscription_id)
+                else:
+                    result['overflowed'].append(subscription_id)
+            if result['confirmed']:
+                self.model._default_manager.using(self.db).filter(id__in=result['confirmed']).confirm()
+        return result
+
+    def unconfirm(self):
+        return self.filter(is_confirmed=True)._transition(dict(
+            is_confirmed=False,
+            confirmed_at=None,
+        ))
+
+    def decline(self, note=None):
+        return self.filter(is_confirmed=False)._transition(dict(
+            is_declined=True,
+            decline_note=note,
+            declined_at=timezone.now,
+        ))
+
+    def clear_decline(self):
+        return self.filter(is_declined=True)._transition(dict(
+            is_declined=False,
+            decline_note=None,
+            declined_at=None,
+        ))
+
+
 class CourseGroupSubscription(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -62,9 +281,47 @@ class CourseGroupSubscription(models.Model):
     is_declined = models.BooleanField(default=False)
     decline_note = models.TextField(blank=True, null=True)
     declined_at = models.DateTimeField(null=True, blank=True)
+
+    objects = CourseGroupSubscriptionQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course_group'], name='unique_student_course_group'),
+        ]
     
     def __str__(self):
         return f"{self.student.name} in {self.course_group}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # State as stored, so save() can tell what changed (deferred
+        # status fields leave it unknown)
+        if all(field in field_names for field in SUBSCRIPTION_STATE_FIELDS):
+            instance._loaded_state = instance.current_state()
+        return instance
+
+    def current_state(self):
+        return SubscriptionState.of(self.is_confirmed, self.is_declined, self.confirmed_at, self.declined_at)
+
+    def loaded_state(self):
+        """SubscriptionState in the database when loaded or last saved, None if not saved."""
+        if self.pk is None:
+            return None
+        if not hasattr(self, '_loaded_state'):
+            row = type(self)._default_manager.filter(pk=self.pk).values(*SUBSCRIPTION_STATE_FIELDS).first()
+            self._loaded_state = SubscriptionState.of(**row) if row else None
+        return self._loaded_state
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # Read again at the next save, not the state before the refresh
+        self.__dict__.pop('_loaded_state', None)
+
+    def delete(self, *args, **kwargs):
+        # post_delete sends subscriptions_changed inside the same transaction
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
     
     def save(self, *args, **kwargs):
         # 1. Handle confirmation timestamp
@@ -92,11 +349,35 @@ class CourseGroupSubscription(models.Model):
             self.declined_at = None
             self.decline_note = None
         
-        super().save(*args, **kwargs)
-    
-
+        with transaction.atomic():
+            old_state = None if self._state.adding else self.loaded_state()
+            super().save(*args, **kwargs)
+            new_state = self.current_state()
+            send_subscriptions_changed(type(self), [
+                SubscriptionChange.for_instance(self, old_state, new_state.status)
+            ])
+            self._loaded_state = new_state
 
 
+class WaitlistEntry(models.Model):
+    """
+    A student queued for a full group. Promoted to a pending subscription,
+    oldest first, as seats free up (see courses.enrollment.promote_waitlist).
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    course_group = models.ForeignKey(CourseGroup, on_delete=models.CASCADE, related_name='waitlist')
+    created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['created_at', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course_group'], name='unique_waitlist_student_course_group'),
+        ]
+        indexes = [
+            models.Index(fields=['course_group', 'created_at', 'id']),
+        ]
 
+    def __str__(self):
+        return f"{self.student.name} waiting for {self.course_group}"
 
@@ -82,19 +82,12 @@ class CourseGroupSerializer(serializers.ModelSerializer):
         return None
     
     def get_confirmed_subscriptions(self, obj):
-        # Use annotation if available, otherwise fall back to model method
-        if hasattr(obj, 'confirmed_subs'):
-            return obj.confirmed_subs
-        return obj.confirmed_subscriptions_count()
+        return obj.confirmed_count
     
     def get_available_capacity(self, obj):
-        if hasattr(obj, 'confirmed_subs'):
-            return obj.capacity - obj.confirmed_subs
         return obj.available_capacity()
     
     def get_has_seats(self, obj):
-        if hasattr(obj, 'confirmed_subs'):
-            return obj.capacity > obj.confirmed_subs
         return obj.has_seats()
 
 class CourseSerializer(serializers.ModelSerializer):
@@ -110,6 +103,8 @@ class SubscribeToGroupsSerializer(serializers.Serializer):
         child=serializers.IntegerField(),
         min_length=1
     )
+    # Queue on full groups instead of skipping them
+    waitlist = serializers.BooleanField(default=False)
 
     def validate_group_ids(self, value):
         # Check if all group IDs exist
@@ -162,7 +157,7 @@ class CourseGroupSubscriptionSerializer(serializers.ModelSerializer):
             'is_active': group.is_active,
             'image': self.context['request'].build_absolute_uri(group.image.url) if group.image else "",
             'times': CourseGroupTimeSerializer(group.times.all(), many=True).data,
-            'confirmed_subscriptions': group.confirmed_subscriptions_count(),
+            'confirmed_subscriptions': group.confirmed_count,
             'available_capacity': group.available_capacity(),
             'has_seats': group.has_seats(),
             'subscription_status': self.get_subscription_status(group)
@@ -217,7 +212,7 @@ class TeacherCourseGroupSerializer(serializers.ModelSerializer):
         return obj.coursegroupsubscription_set.count()
 
     def get_available_seats(self, obj):
-        return obj.capacity - obj.coursegroupsubscription_set.count()
+        return obj.free_seats()
 
 class TeacherCourseSerializer(serializers.ModelSerializer):
     year = YearSerializer()
@@ -0,0 +1,127 @@
+"""
+``subscriptions_changed`` is sent whenever CourseGroupSubscription rows are
+created, deleted or change status, with ``changes``: a list of
+SubscriptionChange. It is sent inside the transaction that made the
+change, from:
+
+* ``CourseGroupSubscription.save()`` (create and status changes),
+* deletes, including cascades (``post_delete`` below),
+* ``update()`` of the status fields on a subscription queryset, including
+  the bulk transitions (``confirm()``, ``unconfirm()``, ``decline()``,
+  ``clear_decline()``),
+* ``courses.enrollment.enroll`` and ``promote_waitlist`` (``bulk_create``).
+
+Deletes cascading from another model (a group or student deleted) are
+sent with ``cascade=True``.
+
+Raw SQL and ``bulk_update()`` bypass it. Receivers that keep derived data (counters,
+rollups) can rely on seeing every change exactly once per commit.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from django.apps import apps
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+
+STATUS_PENDING = 'pending'
+STATUS_CONFIRMED = 'confirmed'
+STATUS_DECLINED = 'declined'
+
+subscriptions_changed = Signal()  # sender=CourseGroupSubscription, changes=[SubscriptionChange]
+
+
+def subscription_status(is_confirmed, is_declined):
+    if is_confirmed:
+        return STATUS_CONFIRMED
+    if is_declined:
+        return STATUS_DECLINED
+    return STATUS_PENDING
+
+
+@dataclass(frozen=True)
+class SubscriptionChange:
+    """
+    One subscription moving from ``old_status`` to ``new_status`` (None =
+    not existing), with its confirmed_at / declined_at before and after.
+    """
+    subscription_id: int
+    student_id: int
+    course_id: int
+    course_group_id: int
+    old_status: Optional[str]
+    new_status: Optional[str]
+    created_at: Optional[datetime] = None
+    confirmed_at: Optional[datetime] = None
+    declined_at: Optional[datetime] = None
+    old_confirmed_at: Optional[datetime] = None
+    old_declined_at: Optional[datetime] = None
+
+    @classmethod
+    def for_instance(cls, subscription, old_state, new_status):
+        """``old_state`` is a SubscriptionState or None; the new one is read from ``subscription``."""
+        return cls(
+            subscription_id=subscription.pk,
+            student_id=subscription.student_id,
+            course_id=subscription.course_id,
+            course_group_id=subscription.course_group_id,
+            old_status=old_state.status if old_state else None,
+            new_status=new_status,
+            created_at=subscription.created_at,
+            confirmed_at=subscription.confirmed_at if new_status else None,
+            declined_at=subscription.declined_at if new_status else None,
+            old_confirmed_at=old_state.confirmed_at if old_state else None,
+            old_declined_at=old_state.declined_at if old_state else None,
+        )
+
+
+@dataclass(frozen=True)
+class SubscriptionState:
+    status: str
+    confirmed_at: Optional[datetime]
+    declined_at: Optional[datetime]
+
+    @classmethod
+    def of(cls, is_confirmed, is_declined, confirmed_at, declined_at):
+        return cls(subscription_status(is_confirmed, is_declined), confirmed_at, declined_at)
+
+
+def send_subscriptions_changed(sender, changes, **kwargs):
+    changes = [change for change in changes if change.old_status != change.new_status]
+    if changes:
+        subscriptions_changed.send(sender=sender, changes=changes, **kwargs)
+
+
+@receiver(subscriptions_changed)
+def count_group_subscriptions(sender, changes, **kwargs):
+    apps.get_model('courses', 'CourseGroup').objects.apply_subscription_changes(changes)
+
+
+#^ Transitions that give a seat back: a held subscription declined or deleted
+SEAT_FREEING = {
+    (STATUS_PENDING, STATUS_DECLINED), (STATUS_PENDING, None),
+    (STATUS_CONFIRMED, STATUS_DECLINED), (STATUS_CONFIRMED, None),
+}
+
+
+@receiver(subscriptions_changed)
+def promote_waitlists(sender, changes, cascade=False, **kwargs):
+    # Connected after count_group_subscriptions, so the counts it reads are
+    # current. Not on cascades: the group or student is going away too
+    if cascade:
+        return
+    group_ids = {
+        change.course_group_id for change in changes
+        if (change.old_status, change.new_status) in SEAT_FREEING
+    }
+    if group_ids:
+        from .enrollment import promote_waitlist
+        promote_waitlist(group_ids)
+
+
+@receiver(post_delete, sender='courses.CourseGroupSubscription')
+def subscription_deleted(sender, instance, origin=None, **kwargs):
+    send_subscriptions_changed(sender, [
+        SubscriptionChange.for_instance(instance, instance.loaded_state(), None)
+    ], cascade=origin is not None and getattr(origin, 'model', type(origin)) is not sender)
@@ -1,3 +1,360 @@
-from django.test import TestCase
+import functools
+import threading
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from accounts.models import Student, Teacher, Year
+from .admission import AdmissionGate, Ticket, read_ticket, sign_ticket
+from .enrollment import enroll, waitlist_positions
+from .models import Course, CourseGroup, CourseGroupSubscription, WaitlistEntry
+
+
+class ConcurrentEnrollmentTests(TransactionTestCase):
+    """Many enrollments at once, each in its own thread and connection."""
+
+    def setUp(self):
+        year = Year.objects.create(name='year')
+        teacher = Teacher.objects.create(user=User.objects.create_user('teacher'), name='teacher')
+        self.course = Course.objects.create(title='course', year=year)
+        self.group = CourseGroup.objects.create(course=self.course, teacher=teacher, capacity=100)
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}'), name=f'student{i}', year=year)
+            for i in range(30)
+        ]
+
+    def run_concurrently(self, calls):
+        barrier = threading.Barrier(len(calls))
+        results, errors = [], []
+
+        def run(call):
+            try:
+                barrier.wait()
+                results.append(call())
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(call,)) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_students_all_enroll(self):
+        results, errors = self.run_concurrently([
+            lambda student=student: enroll(student, [self.group.id]) for student in self.students
+        ])
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(len(result['created']) for result in results), len(self.students))
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.pending_count, len(self.students))
+        self.assertEqual(CourseGroupSubscription.objects.filter(course_group=self.group).count(), len(self.students))
+
+    def test_concurrent_students_never_overbook(self):
+        group = CourseGroup.objects.create(course=self.course, teacher=self.group.teacher, capacity=5)
+        results, errors = self.run_concurrently([
+            lambda student=student: enroll(student, [group.id]) for student in self.students
+        ])
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(len(result['created']) for result in results), group.capacity)
+        skipped = [entry['reason'] for result in results for entry in result['skipped']]
+        self.assertEqual(skipped, ['No available seats'] * (len(self.students) - group.capacity))
+        group.refresh_from_db()
+        self.assertEqual((group.pending_count, group.free_seats()), (group.capacity, 0))
+        self.assertEqual(CourseGroupSubscription.objects.filter(course_group=group).count(), group.capacity)
+
+    def test_same_student_enrolls_once(self):
+        student = self.students[0]
+        results, errors = self.run_concurrently([lambda: enroll(student, [self.group.id]) for _ in range(10)])
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(len(result['created']) for result in results), 1)
+        self.assertEqual(CourseGroupSubscription.objects.filter(student=student, course_group=self.group).count(), 1)
+
+
+class EnrollmentTests(TestCase):
+
+    def setUp(self):
+        year = Year.objects.create(name='year')
+        teacher = Teacher.objects.create(user=User.objects.create_user('teacher'), name='teacher')
+        course = Course.objects.create(title='course', year=year)
+        self.group = CourseGroup.objects.create(course=course, teacher=teacher, capacity=3)
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}'), name=f'student{i}', year=year)
+            for i in range(4)
+        ]
+
+    def test_enrollment_past_capacity_is_rejected(self):
+        for student in self.students[:3]:
+            self.assertEqual(len(enroll(student, [self.group.id])['created']), 1)
+        result = enroll(self.students[3], [self.group.id])
+        self.assertEqual(result['created'], [])
+        self.assertEqual(result['skipped'], [{'group_id': self.group.id, 'reason': 'No available seats'}])
+        self.assertEqual(CourseGroupSubscription.objects.filter(course_group=self.group).count(), 3)
+
+    def test_repeated_enrollment_is_reported_not_duplicated(self):
+        [created] = enroll(self.students[0], [self.group.id])['created']
+        result = enroll(self.students[0], [self.group.id, self.group.id])
+        self.assertEqual(result['created'], [])
+        self.assertEqual(
+            [(entry['reason'], entry['existing_subscription_id']) for entry in result['skipped']],
+            [('Already subscribed', created['subscription_id'])] * 2,
+        )
+
+
+class RemoveDuplicateSubscriptionsMigrationTests(TransactionTestCase):
+    """courses.0002 keeps one subscription per (student, course_group)."""
+    migrate_from = [('courses', '0001_initial')]
+    migrate_to = [('courses', '0002_remove_duplicate_subscriptions')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_keeps_the_confirmed_subscription(self):
+        apps = self.migrate(self.migrate_from)
+        Subscription = apps.get_model('courses', 'CourseGroupSubscription')
+        year = apps.get_model('accounts', 'Year').objects.create(name='year')
+        make_user = apps.get_model('auth', 'User').objects.create
+        teacher = apps.get_model('accounts', 'Teacher').objects.create(user=make_user(username='teacher'), name='teacher')
+        course = apps.get_model('courses', 'Course').objects.create(title='course', year=year)
+        group = apps.get_model('courses', 'CourseGroup').objects.create(course=course, teacher=teacher, capacity=10)
+        make_student = apps.get_model('accounts', 'Student').objects.create
+        first = make_student(user=make_user(username='first'), name='first', year=year)
+        second = make_student(user=make_user(username='second'), name='second', year=year)
+        subscribe = functools.partial(Subscription.objects.create, course=course, course_group=group)
+        subscribe(student=first)
+        confirmed = subscribe(student=first, is_confirmed=True)
+        subscribe(student=first, is_declined=True)
+        pending = subscribe(student=second)
+        subscribe(student=second, is_declined=True)
+
+        apps = self.migrate(self.migrate_to)
+        kept = apps.get_model('courses', 'CourseGroupSubscription').objects.order_by('id')
+        self.assertEqual(list(kept.values_list('id', flat=True)), [confirmed.id, pending.id])
+
+
+class SeatDefinitionTests(TestCase):
+    """Group listings advertise the same seats that enrollment hands out."""
+
+    def setUp(self):
+        year = Year.objects.create(name='year')
+        self.teacher = Teacher.objects.create(user=User.objects.create_user('teacher'), name='teacher')
+        self.course = Course.objects.create(title='course', year=year)
+        self.group = CourseGroup.objects.create(course=self.course, teacher=self.teacher, capacity=2)
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}'), name=f'student{i}', year=year)
+            for i in range(3)
+        ]
+        for student in self.students[:2]:
+            enroll(student, [self.group.id])
+
+    def client_for(self, student):
+        client = APIClient()
+        client.force_authenticate(student.user)
+        return client
+
+    def test_group_full_of_pending_subscriptions_has_no_seats(self):
+        client = self.client_for(self.students[2])
+        url = f'/courses/{self.course.id}/{self.teacher.id}/groups/'
+
+        listed = client.get(url, {'has_seats': 'true'}).data['results']
+        self.assertEqual(listed, [])
+        [group] = client.get(url).data['results']
+        self.assertEqual((group['available_capacity'], group['has_seats']), (0, False))
+
+        response = client.post('/courses/subscribe/', {'group_ids': [self.group.id]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['results']['created'], [])
+        self.assertEqual(response.data['results']['skipped'][0]['reason'], 'No available seats')
+
+    def test_group_listed_with_seats_takes_the_subscription(self):
+        CourseGroupSubscription.objects.filter(student=self.students[0]).decline()
+        client = self.client_for(self.students[2])
+        url = f'/courses/{self.course.id}/{self.teacher.id}/groups/'
+
+        [group] = client.get(url, {'has_seats': 'true'}).data['results']
+        self.assertEqual((group['id'], group['available_capacity'], group['has_seats']), (self.group.id, 1, True))
+
+        response = client.post('/courses/subscribe/', {'group_ids': [self.group.id]}, format='json')
+        self.assertEqual(len(response.data['results']['created']), 1)
+        self.assertEqual(client.get(url, {'has_seats': 'true'}).data['results'], [])
+
+
+class GroupSubscriptionCountTests(TestCase):
+    """The count columns of CourseGroup follow every status change."""
+
+    def setUp(self):
+        year = Year.objects.create(name='year')
+        teacher = Teacher.objects.create(user=User.objects.create_user('teacher'), name='teacher')
+        self.course = Course.objects.create(title='course', year=year)
+        self.groups = [CourseGroup.objects.create(course=self.course, teacher=teacher, capacity=10) for _ in range(2)]
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}'), name=f'student{i}', year=year)
+            for i in range(4)
+        ]
+
+    def subscribe(self, student, group, **kwargs):
+        return CourseGroupSubscription.objects.create(student=student, course=self.course, course_group=group, **kwargs)
+
+    def counts(self):
+        return list(CourseGroup.objects.order_by('id').values_list('confirmed_count', 'pending_count', 'declined_count'))
+
+    def assertCountsMatchRecount(self):
+        counts = self.counts()
+        CourseGroup.objects.recount_subscriptions()
+        self.assertEqual(counts, self.counts())
+        return counts
+
+    def test_counts_follow_changes(self):
+        first, second = self.groups
+        a = self.subscribe(self.students[0], first)
+        b = self.subscribe(self.students[1], first, is_confirmed=True)
+        self.subscribe(self.students[2], first)
+        self.subscribe(self.students[0], second)
+        self.assertEqual(self.assertCountsMatchRecount(), [(1, 2, 0), (0, 1, 0)])
+
+        CourseGroupSubscription.objects.filter(course_group=first, is_confirmed=False).decline()
+        CourseGroupSubscription.objects.filter(pk=b.pk).unconfirm()
+        a.refresh_from_db()
+        a.is_declined = False
+        a.is_confirmed = True
+        a.save()
+        CourseGroupSubscription.objects.filter(course_group=second).update(is_declined=True)
+        self.assertEqual(self.assertCountsMatchRecount(), [(1, 1, 1), (0, 0, 1)])
+
+        CourseGroupSubscription.objects.get(pk=a.pk).delete()
+        CourseGroupSubscription.objects.filter(course_group=second).delete()
+        self.students[2].delete()
+        self.assertEqual(self.assertCountsMatchRecount(), [(0, 1, 0), (0, 0, 0)])
+
+    def test_recount_fixes_writes_that_bypass_the_signal(self):
+        self.subscribe(self.students[0], self.groups[0])
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {CourseGroupSubscription._meta.db_table} SET is_confirmed = %s', [True])
+        self.assertEqual(self.counts(), [(0, 1, 0), (0, 0, 0)])
+
+        self.assertEqual(CourseGroup.objects.recount_subscriptions(), 2)
+        self.assertEqual(self.counts(), [(1, 0, 0), (0, 0, 0)])
+        self.assertEqual(CourseGroup.objects.get(pk=self.groups[0].pk).free_seats(), 9)
+
+
+class WaitlistPromotionTests(TestCase):
+    """Freed seats go to the oldest waitlist entries."""
+
+    def setUp(self):
+        year = Year.objects.create(name='year')
+        teacher = Teacher.objects.create(user=User.objects.create_user('teacher'), name='teacher')
+        course = Course.objects.create(title='course', year=year)
+        self.group = CourseGroup.objects.create(course=course, teacher=teacher, capacity=2)
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}'), name=f'student{i}', year=year)
+            for i in range(5)
+        ]
+        for student in self.students[:2]:
+            enroll(student, [self.group.id])
+        for position, student in enumerate(self.students[2:], 1):
+            [entry] = enroll(student, [self.group.id], waitlist=True)['waitlisted']
+            self.assertEqual(entry['position'], position)
+
+    def subscribed(self):
+        return list(
+            CourseGroupSubscription.objects.filter(course_group=self.group, is_declined=False)
+            .order_by('id').values_list('student__name', flat=True)
+        )
+
+    def queue(self):
+        return list(WaitlistEntry.objects.filter(course_group=self.group).values_list('student__name', flat=True))
+
+    def test_freed_seats_go_to_the_oldest_entries(self):
+        CourseGroupSubscription.objects.filter(student=self.students[0]).decline()
+        self.assertEqual(self.subscribed(), ['student1', 'student2'])
+        self.assertEqual(self.queue(), ['student3', 'student4'])
+        self.assertEqual(waitlist_positions(self.students[4], [self.group.id]), {
+            self.group.id: (WaitlistEntry.objects.get(student=self.students[4]).id, 2),
+        })
+
+        CourseGroupSubscription.objects.get(student=self.students[1]).delete()
+        self.assertEqual(self.subscribed(), ['student2', 'student3'])
+
+        self.group.refresh_from_db()
+        self.group.capacity = 4
+        self.group.save()
+        self.assertEqual(self.subscribed(), ['student2', 'student3', 'student4'])
+        self.assertEqual(self.queue(), [])
+
+    def test_newcomers_queue_behind_the_waitlist(self):
+        # A seat freed without promoting anyone still belongs to the queue
+        CourseGroup.objects.filter(pk=self.group.pk).update(capacity=3)
+        late = Student.objects.create(user=User.objects.create_user('late'), name='late', year=self.students[0].year)
+        result = enroll(late, [self.group.id], waitlist=True)
+        self.assertEqual((result['created'], result['waitlisted'][0]['position']), ([], 4))
+
+
+class AdmissionGateTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.cache = LocMemCache('admission-tests', {})
+        self.cache.clear()
+
+    def gate(self, rate, concurrency, endpoint='subscribe-to-groups'):
+        return AdmissionGate(endpoint, rate, concurrency, cache=self.cache, clock=lambda: self.now)
+
+    def admit(self, gate, ticket=None):
+        admitted, ticket = gate.admit(ticket)
+        if admitted:
+            gate.release_slot()
+        return admitted, ticket
+
+    def test_rate_limit_queues_tickets_in_turn(self):
+        gate = self.gate(rate=2, concurrency=10)
+        self.assertEqual([self.admit(gate) for _ in range(2)], [(True, None)] * 2)
+        first, second, third = (self.admit(gate)[1] for _ in range(3))
+        self.assertEqual([(ticket.number, ticket.eta) for ticket in (first, second, third)], [
+            (1, 1000.5), (2, 1001.0), (3, 1001.5),
+        ])
+        self.assertEqual(gate.status(second), {
+            'endpoint': 'subscribe-to-groups', 'position': 2, 'ready': False, 'retry_after': 1.0,
+        })
+
+        self.now = 1000.5
+        self.assertEqual(self.admit(gate, second), (False, second))
+        # A new second has fresh tokens, and these turns have come
+        self.now = 1001.0
+        self.assertEqual(self.admit(gate, first), (True, None))
+        # A used ticket counts for nothing: back of the queue, like a newcomer
+        self.assertEqual(self.admit(gate, first)[1].number, 4)
+        self.assertEqual(self.admit(gate)[1].number, 5)
+        self.assertEqual(self.admit(gate, second), (True, None))
+        self.assertEqual(self.admit(gate, third), (False, third))
+
+    def test_concurrency_limit(self):
+        gate = self.gate(rate=100, concurrency=2)
+        self.assertEqual([gate.admit()[0] for _ in range(2)], [True, True])
+        admitted, ticket = gate.admit()
+        self.assertFalse(admitted)
+
+        self.now += 1
+        self.assertEqual(gate.admit(ticket), (False, ticket))
+        gate.release_slot()
+        self.assertEqual(gate.admit(ticket), (True, None))
+
+    def test_signed_ticket_round_trip(self):
+        ticket = Ticket('subscribe-to-groups', 7, 1000.25)
+        token = sign_ticket(ticket)
+        self.assertEqual(read_ticket(token, max_age=600), ticket)
+        self.assertIsNone(read_ticket(token[:-1] + ('A' if token[-1] != 'A' else 'B'), max_age=600))
+        self.assertIsNone(read_ticket(token, max_age=-1))
+        self.assertIsNone(read_ticket('garbage', max_age=600))
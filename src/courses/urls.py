@@ -6,7 +6,9 @@ from .views import (
     CourseGroupsView,
     SubscribeToGroupsView,
     StudentSubscriptionsView,
-    UnsubscribeCourseGroupView
+    UnsubscribeCourseGroupView,
+    LeaveWaitlistView,
+    AdmissionTicketView
 )
 
 urlpatterns = [
@@ -18,4 +20,6 @@ urlpatterns = [
     path('teachers/<int:id>/full-data/', GetTeacherFullDataView.as_view(), name='teacher-full-data'),
     #new
     path('unsubscribe/group/<int:group_id>/', UnsubscribeCourseGroupView.as_view(), name='unsubscribe-by-group'),
+    path('waitlist/group/<int:group_id>/leave/', LeaveWaitlistView.as_view(), name='leave-waitlist'),
+    path('admission/', AdmissionTicketView.as_view(), name='admission-ticket'),
 ]
\ No newline at end of file
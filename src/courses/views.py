@@ -1,9 +1,9 @@
 from rest_framework import generics, status
 from rest_framework.response import Response
 from django.db.models import Prefetch
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from accounts.models import Student, Teacher
-from .models import Course, CourseGroup, CourseGroupSubscription
+from .models import FREE_SEATS, Course, CourseGroup, CourseGroupSubscription, WaitlistEntry
 from .serializers import (
     CourseSerializer, 
     CourseGroupSerializer,
@@ -11,7 +11,11 @@ from .serializers import (
     SubscribeToGroupsSerializer,
     TeacherFullDataSerializer
 )
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from core.idempotency import idempotent
+from .admission import AdmissionGate, get_admission_settings, read_ticket
+from .enrollment import GroupsNotFound, enroll
 from django.db.models import Count, F, Q
 from rest_framework.views import APIView
 
@@ -34,15 +38,6 @@ class CourseGroupsView(generics.ListAPIView):
         queryset = CourseGroup.objects.filter(
             course_id=course_id,
             teacher_id=teacher_id
-        ).annotate(
-            confirmed_subs=Count(
-                'coursegroupsubscription',
-                filter=Q(coursegroupsubscription__is_confirmed=True)
-            ),
-            declined_subs=Count(
-                'coursegroupsubscription',
-                filter=Q(coursegroupsubscription__is_declined=True)
-            )
         )
         
         # Filter by is_active if provided
@@ -53,10 +48,11 @@ class CourseGroupsView(generics.ListAPIView):
         # Filter by has_seats if provided
         has_seats = self.request.query_params.get('has_seats', None)
         if has_seats is not None:
+            # The same seats enroll() hands out (CourseGroup.free_seats)
             if has_seats.lower() == 'true':
-                queryset = queryset.filter(capacity__gt=F('confirmed_subs'))
+                queryset = queryset.alias(free_seats=FREE_SEATS).filter(free_seats__gt=0)
             elif has_seats.lower() == 'false':
-                queryset = queryset.filter(capacity__lte=F('confirmed_subs'))
+                queryset = queryset.alias(free_seats=FREE_SEATS).filter(free_seats__lte=0)
             
         return queryset
     
@@ -82,54 +78,19 @@ class SubscribeToGroupsView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = SubscribeToGroupsSerializer
     
+    @idempotent
     def create(self, request, *args, **kwargs):
         student = get_object_or_404(Student, user=request.user)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         group_ids = serializer.validated_data['group_ids']
-        results = {
-            'created': [],
-            'skipped': []
-        }
-        
-        for group_id in group_ids:
-            group = get_object_or_404(CourseGroup, id=group_id)
-            
-            # Check if subscription already exists
-            existing_sub = CourseGroupSubscription.objects.filter(
-                student=student,
-                course_group=group
-            ).first()
-            
-            if existing_sub:
-                results['skipped'].append({
-                    'group_id': group_id,
-                    'reason': 'Already subscribed',
-                    'existing_subscription_id': existing_sub.id,
-                    'status': 'subscribed' if existing_sub.is_confirmed else 'pending'
-                })
-                continue
-
-            if not group.has_seats():
-                results['skipped'].append({
-                    'group_id': group_id,
-                    'reason': 'No available seats'
-                })
-                continue
-                
-            subscription = CourseGroupSubscription.objects.create(
-                student=student,
-                course=group.course,
-                course_group=group,
-                is_confirmed=False  # Default to pending
-            )
-            
-            results['created'].append({
-                'group_id': group_id,
-                'subscription_id': subscription.id,
-                'status': 'pending'
-            })
+        try:
+            # Locks the groups, so concurrent requests can't overbook them
+            # or subscribe the same student twice (see courses.enrollment)
+            results = enroll(student, group_ids, waitlist=serializer.validated_data['waitlist'])
+        except GroupsNotFound:
+            raise Http404
         
         return Response({
             'message': 'Subscription processed',
@@ -153,12 +114,6 @@ class GetTeacherFullDataView(generics.RetrieveAPIView):
                 'coursegroup_set',
                 queryset=CourseGroup.objects.select_related('course', 'teacher')
                     .prefetch_related('times')
-                    .annotate(
-                        confirmed_subs=Count(
-                            'coursegroupsubscription',
-                            filter=Q(coursegroupsubscription__is_confirmed=True)
-                        )
-                    )
             ),
             Prefetch(
                 'coursegroup_set__course',
@@ -280,3 +235,34 @@ class UnsubscribeCourseGroupView(APIView):
             )
 
 
+class LeaveWaitlistView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, group_id):
+        student = get_object_or_404(Student, user=request.user)
+        entry = get_object_or_404(WaitlistEntry, student=student, course_group_id=group_id)
+        entry_id = entry.id
+        entry.delete()
+        return Response(
+            {
+                "success": True,
+                "deleted_waitlist_entry_id": entry_id,
+                "group_id": group_id
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class AdmissionTicketView(APIView):
+    """Position of a queue ticket handed out by AdmissionControlMiddleware; reads the cache only."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    def get(self, request):
+        conf = get_admission_settings()
+        ticket = read_ticket(request.query_params.get('ticket', ''), conf['TICKET_TTL'])
+        if ticket is None or ticket.endpoint not in conf['ENDPOINTS']:
+            return Response({"error": "Invalid or expired ticket."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(AdmissionGate.from_settings(ticket.endpoint, conf).status(ticket))
+
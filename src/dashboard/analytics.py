@@ -0,0 +1,180 @@
+"""
+Enrollment analytics.
+
+``EnrollmentRollup`` holds per (day, course, teacher) counts of
+subscriptions created, confirmed and declined. ``record_enrollment_changes``
+keeps it current from ``subscriptions_changed`` with F() increments in the
+same transaction as the change, so ``enrollment_series`` charts any range
+from a few hundred rollup rows instead of grouping the subscription table.
+
+As with the counters (dashboard.counters), increments only start once
+``rebuild_enrollment_rollups`` has built the rollups and stored the
+``ROLLUPS_INITIALIZED`` marker; before that the first read builds them.
+Otherwise, on an existing database a change to an older subscription
+would start its rollup row from zero (created=-1 for a deletion).
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from courses.models import Course, CourseGroup, CourseGroupSubscription
+from courses.signals import STATUS_CONFIRMED, STATUS_DECLINED
+
+from .models import EnrollmentRollup, StatsCounter
+
+ENROLLMENT_METRICS = ('created', 'confirmed', 'declined')
+INTERVALS = {'day': F, 'week': TruncWeek}
+GROUP_BY_FIELDS = {
+    'course': 'course_id',
+    'teacher': 'teacher_id',
+    'year': 'year_id',
+    'type_education': 'type_education_id',
+}
+#^ StatsCounter marker row: the rollups were built from the subscriptions
+ROLLUPS_INITIALIZED = '_enrollment_rollups_initialized'
+
+
+def _day(value):
+    return timezone.localdate(value) if value else None
+
+
+def enrollment_deltas(changes):
+    """``{(day, course_id, teacher_id): Counter(metric=delta)}`` for a batch of changes."""
+    teachers = dict(
+        CourseGroup.objects.filter(id__in={change.course_group_id for change in changes})
+        .values_list('id', 'teacher_id')
+    )
+    deltas = {}
+
+    def add(day, change, metric, delta):
+        teacher_id = teachers.get(change.course_group_id)
+        if day is None or teacher_id is None:
+            return
+        deltas.setdefault((day, change.course_id, teacher_id), Counter())[metric] += delta
+
+    for change in changes:
+        if change.old_status is None:
+            add(_day(change.created_at), change, 'created', 1)
+        if change.new_status is None:
+            add(_day(change.created_at), change, 'created', -1)
+        for status, metric, old_at, new_at in (
+            (STATUS_CONFIRMED, 'confirmed', change.old_confirmed_at, change.confirmed_at),
+            (STATUS_DECLINED, 'declined', change.old_declined_at, change.declined_at),
+        ):
+            if change.old_status == status:
+                add(_day(old_at), change, metric, -1)
+            if change.new_status == status:
+                add(_day(new_at), change, metric, 1)
+    return deltas
+
+
+def rollups_initialized():
+    return StatsCounter.objects.filter(name=ROLLUPS_INITIALIZED).exists()
+
+
+def apply_enrollment_deltas(deltas):
+    """Add the deltas to the rollups. Does nothing before they were first built."""
+    deltas = {key: counts for key, counts in deltas.items() if any(counts.values())}
+    if not deltas:
+        return
+    with transaction.atomic():
+        if not rollups_initialized():
+            return
+        courses = {
+            row['id']: row for row in
+            Course.objects.filter(id__in={course_id for _, course_id, _ in deltas})
+            .values('id', 'year_id', 'type_education_id')
+        }
+        for key in sorted(deltas):
+            day, course_id, teacher_id = key
+            counts = deltas[key]
+            updates = {metric: F(metric) + counts[metric] for metric in ENROLLMENT_METRICS if counts[metric]}
+            rows = EnrollmentRollup.objects.filter(day=day, course_id=course_id, teacher_id=teacher_id)
+            if rows.update(**updates):
+                continue
+            course = courses.get(course_id, {})
+            try:
+                with transaction.atomic():
+                    EnrollmentRollup.objects.create(
+                        day=day, course_id=course_id, teacher_id=teacher_id,
+                        year_id=course.get('year_id'),
+                        type_education_id=course.get('type_education_id'),
+                        **{metric: counts[metric] for metric in ENROLLMENT_METRICS},
+                    )
+            except IntegrityError:
+                rows.update(**updates)
+
+
+def record_enrollment_changes(changes):
+    apply_enrollment_deltas(enrollment_deltas(changes))
+
+
+def rebuild_enrollment_rollups():
+    """Recompute every rollup row from the subscription table. Returns the row count."""
+    keys = ('course_id', 'course_group__teacher_id', 'course__year_id', 'course__type_education_id')
+    rows = {}
+    for metric, column, status_filter in (
+        ('created', 'created_at', {}),
+        ('confirmed', 'confirmed_at', {'is_confirmed': True}),
+        ('declined', 'declined_at', {'is_declined': True, 'is_confirmed': False}),
+    ):
+        grouped = (
+            CourseGroupSubscription.objects
+            .filter(**status_filter, **{f'{column}__isnull': False})
+            .annotate(day=TruncDate(column, tzinfo=timezone.get_current_timezone()))
+            .values('day', *keys)
+            .annotate(n=Count('id'))
+            .order_by()
+        )
+        for row in grouped:
+            key = (row['day'], row['course_id'], row['course_group__teacher_id'])
+            rollup = rows.setdefault(key, EnrollmentRollup(
+                day=key[0], course_id=key[1], teacher_id=key[2],
+                year_id=row['course__year_id'],
+                type_education_id=row['course__type_education_id'],
+            ))
+            setattr(rollup, metric, row['n'])
+    with transaction.atomic():
+        EnrollmentRollup.objects.all().delete()
+        EnrollmentRollup.objects.bulk_create(rows.values(), batch_size=1000)
+        StatsCounter.objects.get_or_create(name=ROLLUPS_INITIALIZED, defaults={'value': 1})
+    return len(rows)
+
+
+def enrollment_series(start=None, end=None, interval='day', group_by=None, **filters):
+    """
+    Counts per period (and per ``group_by`` value) between the dates
+    ``start`` and ``end``. ``filters`` may hold course, teacher, year and
+    type_education ids. Builds the rollups first if they never were.
+    """
+    if not rollups_initialized():
+        rebuild_enrollment_rollups()
+    rollups = EnrollmentRollup.objects.all()
+    if start:
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        rollups = rollups.filter(day__lte=end)
+    for name, value in filters.items():
+        if value is not None:
+            rollups = rollups.filter(**{GROUP_BY_FIELDS[name]: value})
+
+    columns = ['period']
+    if group_by:
+        columns.append(GROUP_BY_FIELDS[group_by])
+    series = (
+        rollups.annotate(period=INTERVALS[interval]('day'))
+        .values(*columns)
+        .annotate(**{metric: Sum(metric) for metric in ENROLLMENT_METRICS})
+        .order_by(*columns)
+    )
+    result = []
+    for row in series:
+        item = {'period': row['period'].isoformat()}
+        if group_by:
+            item[group_by] = row[GROUP_BY_FIELDS[group_by]]
+        item.update((metric, row[metric]) for metric in ENROLLMENT_METRICS)
+        result.append(item)
+    return result
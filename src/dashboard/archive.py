@@ -0,0 +1,472 @@
+"""
+Cold storage for old request logs.
+
+Rows older than the hot-table retention are exported to one segment per
+day under ``REQUEST_LOG_ARCHIVE['DIR']`` and then deleted from SQL:
+
+``requests-YYYY-MM-DD.jsonl.gz``
+    Append-only. Each block of up to ``BLOCK_ROWS`` rows is written as its
+    own gzip member, so the whole file is still plain ``zcat``-able JSONL,
+    but a single block can be decompressed on its own.
+``requests-YYYY-MM-DD.idx``
+    One fixed-size ``INDEX_RECORD`` per row: timestamp, row id, offset and
+    length of the row's block, slot within the block, status code and a
+    view id, kept in (timestamp, id) order. Read in place through
+    ``mmap`` as a numpy record array: the time range is a bisection, status
+    and view are vectorised comparisons, and none of it touches the
+    compressed data.
+``requests-YYYY-MM-DD.views.json``
+    The view names behind the view ids of that day.
+
+``ArchivedLogs`` reads a range back newest first, as unsaved RequestLog
+instances, and behaves as a sequence, so a paginator only reads the index
+records and decompresses the blocks of the page it shows.
+"""
+import bisect
+import gzip
+import json
+import os
+import struct
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import RequestLog
+from .retention import delete_in_chunks, get_retention_settings
+
+DEFAULT_ARCHIVE_SETTINGS = {
+    'ENABLED': False,
+    'DIR': None,            # defaults to BASE_DIR / 'log_archive'
+    'KEEP_DAYS': 365,       # delete segment files older than this
+    'BLOCK_ROWS': 256,      # rows per independently compressed block
+    'LEVEL': 6,
+}
+
+#^ timestamp, id, block offset, block length, slot, status_code, view id
+INDEX_RECORD = struct.Struct('<dQQIHHI')
+#^ The same layout as a numpy record, to read the index without unpacking it
+INDEX_DTYPE = np.dtype([
+    ('timestamp', '<f8'), ('id', '<u8'), ('offset', '<u8'), ('length', '<u4'),
+    ('slot', '<u2'), ('status_code', '<u2'), ('view', '<u4'),
+])
+SEGMENT_SUFFIX = '.jsonl.gz'
+INDEX_SUFFIX = '.idx'
+VIEWS_SUFFIX = '.views.json'
+NO_VIEW = 0xFFFFFFFF
+#^ Candidate rows read from the index at a time when filtering decompressed rows
+SCAN_BATCH = 256
+
+ARCHIVED_FIELDS = (
+    'id', 'request_id', 'user_id', 'ip_address', 'path', 'method', 'view_name',
+    'query_params', 'status_code', 'response_time', 'request_body_size',
+    'request_body_sha256', 'log_reason', 'sample_rate', 'db_query_count',
+    'db_time', 'db_slowest_time', 'db_slowest_query',
+)
+
+
+def get_archive_settings():
+    conf = {**DEFAULT_ARCHIVE_SETTINGS, **getattr(settings, 'REQUEST_LOG_ARCHIVE', {})}
+    if conf['DIR'] is None:
+        conf['DIR'] = os.path.join(settings.BASE_DIR, 'log_archive')
+    return conf
+
+
+def segment_paths(directory, day):
+    base = os.path.join(directory, f"requests-{day:%Y-%m-%d}")
+    return base + SEGMENT_SUFFIX, base + INDEX_SUFFIX, base + VIEWS_SUFFIX
+
+
+def archived_days(directory):
+    """Dates that have an index file, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    days = []
+    for name in os.listdir(directory):
+        if name.startswith('requests-') and name.endswith(INDEX_SUFFIX):
+            days.append(datetime.strptime(name[len('requests-'):-len(INDEX_SUFFIX)], '%Y-%m-%d').date())
+    return sorted(days)
+
+
+def log_to_record(log):
+    record = {field: getattr(log, field) for field in ARCHIVED_FIELDS}
+    record['user'] = record.pop('user_id')
+    record['timestamp'] = log.timestamp.isoformat()
+    record['request_body'] = log.get_request_body()
+    return record
+
+
+def _load_views(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_views(path, views):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(views, f)
+    os.replace(tmp, path)
+
+
+def record_to_log(record):
+    """An unsaved RequestLog rebuilt from an archived record; ``user`` is left unloaded."""
+    fields = {field: record[field] for field in ARCHIVED_FIELDS if field != 'user_id'}
+    return RequestLog(
+        **fields,
+        user_id=record['user'],
+        timestamp=parse_datetime(record['timestamp']),
+        request_body=record['request_body'],
+    )
+
+
+def _index_length(path):
+    """Complete records in an index file; a record still being appended is ignored."""
+    if not os.path.exists(path):
+        return 0
+    return os.path.getsize(path) // INDEX_RECORD.size
+
+
+def _read_index(path):
+    """
+    Index records of one day as a read-only ``INDEX_DTYPE`` array mapped
+    over the file (nothing is copied), or None if there are none.
+    """
+    length = _index_length(path)
+    if not length:
+        return None
+    return np.memmap(path, dtype=INDEX_DTYPE, mode='r', shape=(length,))
+
+
+class SegmentWriter:
+    """Appends rows of a single day to its segment, index and view table."""
+
+    def __init__(self, directory, day, block_rows=256, level=6):
+        self.segment_path, self.index_path, self.views_path = segment_paths(directory, day)
+        self.block_rows = block_rows
+        self.level = level
+        self.views = _load_views(self.views_path)
+        self.view_ids = {name: i for i, name in enumerate(self.views)}
+        index = _read_index(self.index_path)
+        if index is not None and os.path.getsize(self.index_path) % INDEX_RECORD.size:
+            # A run died halfway through a record: drop it before appending
+            os.truncate(self.index_path, len(index) * INDEX_RECORD.size)
+        # Rows archived by an earlier run that died before deleting them
+        self.archived_ids = set(index['id'].tolist()) if index is not None else set()
+        self.last_key = (float(index[-1]['timestamp']), int(index[-1]['id'])) if index is not None else None
+
+    def _view_id(self, view_name):
+        if not view_name:
+            return NO_VIEW
+        if view_name not in self.view_ids:
+            self.view_ids[view_name] = len(self.views)
+            self.views.append(view_name)
+        return self.view_ids[view_name]
+
+    def append(self, logs):
+        """Archive ``logs`` (one day, any order). Returns the rows written."""
+        logs = [log for log in logs if log.pk not in self.archived_ids]
+        if not logs:
+            return 0
+        logs.sort(key=lambda log: (log.timestamp, log.pk))
+        entries = []
+        with open(self.segment_path, 'ab') as segment:
+            for start in range(0, len(logs), self.block_rows):
+                block = logs[start:start + self.block_rows]
+                data = gzip.compress(
+                    b''.join(json.dumps(log_to_record(log), default=str).encode() + b'\n' for log in block),
+                    compresslevel=self.level,
+                )
+                offset = segment.tell()
+                segment.write(data)
+                for slot, log in enumerate(block):
+                    entries.append(INDEX_RECORD.pack(
+                        log.timestamp.timestamp(), log.pk, offset, len(data), slot,
+                        log.status_code, self._view_id(log.view_name),
+                    ))
+            segment.flush()
+            os.fsync(segment.fileno())
+        # Index last: an entry only ever points at data already on disk
+        _save_views(self.views_path, self.views)
+        first_key = (logs[0].timestamp.timestamp(), logs[0].pk)
+        if self.last_key is None or first_key > self.last_key:
+            with open(self.index_path, 'ab') as index:
+                index.write(b''.join(entries))
+                index.flush()
+                os.fsync(index.fileno())
+        else:
+            self._merge_index(b''.join(entries))
+        last_key = (logs[-1].timestamp.timestamp(), logs[-1].pk)
+        self.last_key = max(self.last_key, last_key) if self.last_key else last_key
+        self.archived_ids.update(log.pk for log in logs)
+        return len(logs)
+
+    def _merge_index(self, data):
+        # Rows older than some already indexed (a log written late, or
+        # chunks archived out of order): rewrite the index in (timestamp, id) order
+        with open(self.index_path, 'rb') as index:
+            records = np.frombuffer(index.read() + data, dtype=INDEX_DTYPE)
+        records = records[np.lexsort((records['id'], records['timestamp']))]
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'wb') as index:
+            index.write(records.tobytes())
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(tmp, self.index_path)
+
+
+def archive_request_logs(before, chunk_size=1000, pause=0.0, directory=None):
+    """
+    Move every RequestLog older than ``before`` to the archive, one
+    primary-key chunk at a time: the chunk is appended to its day segments
+    first and only then deleted from the table. Returns the rows archived.
+    """
+    conf = get_archive_settings()
+    directory = directory or conf['DIR']
+    os.makedirs(directory, exist_ok=True)
+    using = router.db_for_read(RequestLog)
+    writers = {}
+    archived = 0
+    last_pk = 0
+    while True:
+        chunk = list(
+            RequestLog.objects.using(using)
+            .filter(timestamp__lt=before, pk__gt=last_pk)
+            .order_by('pk')[:chunk_size]
+        )
+        if not chunk:
+            break
+        by_day = {}
+        for log in chunk:
+            by_day.setdefault(timezone.localdate(log.timestamp), []).append(log)
+        for day, logs in by_day.items():
+            if day not in writers:
+                writers[day] = SegmentWriter(directory, day, conf['BLOCK_ROWS'], conf['LEVEL'])
+            writers[day].append(logs)
+        delete_in_chunks(RequestLog.objects.filter(pk__in=[log.pk for log in chunk]), chunk_size, pause)
+        archived += len(chunk)
+        last_pk = chunk[-1].pk
+    return archived
+
+
+def prune_archive(keep_days, directory=None, today=None):
+    """Delete segment files older than ``keep_days``. Returns the days removed."""
+    directory = directory or get_archive_settings()['DIR']
+    cutoff = (today or timezone.localdate()) - timedelta(days=keep_days)
+    removed = 0
+    for day in archived_days(directory):
+        if day >= cutoff:
+            break
+        for path in segment_paths(directory, day):
+            if os.path.exists(path):
+                os.remove(path)
+        removed += 1
+    return removed
+
+
+def archive_horizon():
+    """Rows older than this are only in the archive (None if archiving is off)."""
+    conf = get_archive_settings()
+    if not conf['ENABLED']:
+        return None
+    max_age_days = get_retention_settings()['MAX_AGE_DAYS']
+    if max_age_days is None:
+        return None
+    return timezone.now() - timedelta(days=max_age_days)
+
+
+class ArchivedLogs:
+    """
+    Archived rows between ``start`` and ``end`` (aware datetimes, either may
+    be None) newest first, filtered by the index on ``status_code`` and
+    ``view_name`` and, after decompression, on ``user``, ``method`` and
+    ``path_contains``. Supports ``len()`` and slicing, so it can be handed
+    to a paginator; only the index records and blocks of the requested
+    slice are read.
+
+    Without the decompressed-row filters ``len()`` only bisects the first
+    and last day and counts whole days from their file size. With them, a
+    slice decompresses candidates newest first until it is filled, and
+    ``known_count()`` reports how many matches were found so far, for
+    paginators that should not scan the whole range just to count it.
+    """
+
+    def __init__(self, start=None, end=None, status_code=None, view_name=None,
+                 user=None, method=None, path_contains=None, directory=None):
+        self.directory = directory or get_archive_settings()['DIR']
+        self.start = start
+        self.end = end
+        self.status_code = status_code
+        self.view_name = view_name
+        self.row_filters = {
+            key: value for key, value in
+            (('user', user), ('method', method), ('path_contains', path_contains))
+            if value is not None
+        }
+        self._matches = None
+        self._rows = []
+        self._scan = None
+        self._exhausted = False
+
+    def _days(self):
+        first = timezone.localdate(self.start) if self.start else None
+        last = timezone.localdate(self.end) if self.end else None
+        return [
+            day for day in archived_days(self.directory)
+            if (first is None or day >= first) and (last is None or day <= last)
+        ]
+
+    def _day_positions(self, day):
+        """Positions of the matching index records of ``day``, oldest first."""
+        _, index_path, views_path = segment_paths(self.directory, day)
+        start = self.start.timestamp() if self.start else None
+        end = self.end.timestamp() if self.end else None
+        if self.status_code is None and self.view_name is None:
+            length = _index_length(index_path)
+            # Days wholly inside the range are counted from the file size
+            if not length or (start is None or day > timezone.localdate(self.start)) and (
+                end is None or day < timezone.localdate(self.end)
+            ):
+                return range(length)
+        index = _read_index(index_path)
+        if index is None:
+            return range(0)
+        timestamps = index['timestamp']
+        low = bisect.bisect_left(timestamps, start) if start is not None else 0
+        high = bisect.bisect_right(timestamps, end) if end is not None else len(index)
+        mask = None
+        if self.status_code is not None:
+            mask = index['status_code'][low:high] == self.status_code
+        if self.view_name is not None:
+            views = _load_views(views_path)
+            if self.view_name not in views:
+                return range(0)
+            view_mask = index['view'][low:high] == views.index(self.view_name)
+            mask = view_mask if mask is None else mask & view_mask
+        if mask is None:
+            return range(low, high)
+        return low + np.flatnonzero(mask)
+
+    def matches(self):
+        """``(day, positions)`` of every day with matching index records, newest day first."""
+        if self._matches is None:
+            self._matches = [
+                (day, positions) for day, positions in
+                ((day, self._day_positions(day)) for day in reversed(self._days()))
+                if len(positions)
+            ]
+        return self._matches
+
+    def _entries(self, day, positions):
+        """Index entries ``(segment_path, offset, length, slot)`` at ``positions`` of ``day``."""
+        segment_path, index_path, _ = segment_paths(self.directory, day)
+        records = _read_index(index_path)[np.asarray(positions, dtype=np.intp)]
+        return [
+            (segment_path, offset, length, slot) for offset, length, slot in
+            zip(records['offset'].tolist(), records['length'].tolist(), records['slot'].tolist())
+        ]
+
+    def _slice_entries(self, start, stop):
+        """Index entries of matches ``start:stop``, newest first."""
+        entries = []
+        wanted, skip = stop - start, start
+        for day, positions in self.matches():
+            if len(entries) >= wanted:
+                break
+            if skip >= len(positions):
+                skip -= len(positions)
+                continue
+            newest_first = positions[::-1]
+            entries += self._entries(day, newest_first[skip:skip + wanted - len(entries)])
+            skip = 0
+        return entries
+
+    def _load(self, entries):
+        blocks = {}
+        rows = []
+        for segment_path, offset, length, slot in entries:
+            key = (segment_path, offset)
+            if key not in blocks:
+                with open(segment_path, 'rb') as f:
+                    f.seek(offset)
+                    blocks[key] = gzip.decompress(f.read(length)).splitlines()
+            rows.append(json.loads(blocks[key][slot]))
+        return rows
+
+    def _matches_row(self, row):
+        filters = self.row_filters
+        if 'user' in filters and row['user'] != filters['user']:
+            return False
+        if 'method' in filters and row['method'] != filters['method']:
+            return False
+        if 'path_contains' in filters and filters['path_contains'].lower() not in row['path'].lower():
+            return False
+        return True
+
+    def _candidate_batches(self):
+        for day, positions in self.matches():
+            newest_first = positions[::-1]
+            for start in range(0, len(newest_first), SCAN_BATCH):
+                yield self._entries(day, newest_first[start:start + SCAN_BATCH])
+
+    def _fill(self, stop=None):
+        """Decompress candidates until ``stop`` matching rows are found (all with None)."""
+        if self._scan is None:
+            self._scan = self._candidate_batches()
+        while not self._exhausted and (stop is None or len(self._rows) < stop):
+            batch = next(self._scan, None)
+            if batch is None:
+                self._exhausted = True
+            else:
+                self._rows += [row for row in self._load(batch) if self._matches_row(row)]
+
+    def _to_logs(self, rows):
+        logs = [record_to_log(row) for row in rows]
+        users = get_user_model()._default_manager.in_bulk({log.user_id for log in logs if log.user_id})
+        for log in logs:
+            if log.user_id is not None:
+                # Deleted users show up as no user, as for live rows
+                log.user = users.get(log.user_id)
+        return logs
+
+    def known_count(self):
+        """
+        ``(count, is_estimate)``: exact without the decompressed-row
+        filters, otherwise the matches found by the slices taken so far.
+        """
+        if not self.row_filters:
+            return len(self), False
+        return len(self._rows), not self._exhausted
+
+    def __len__(self):
+        if self.row_filters:
+            self._fill()
+            return len(self._rows)
+        return sum(len(positions) for _, positions in self.matches())
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if index < 0:
+                index += len(self)
+            rows = self[index:index + 1] if index >= 0 else []
+            if not rows:
+                raise IndexError(index)
+            return rows[0]
+        if index.step not in (None, 1):
+            raise ValueError("ArchivedLogs slices take no step")
+        start, stop = index.start or 0, index.stop
+        if start < 0 or stop is None or stop < 0:
+            start, stop, _ = index.indices(len(self))
+        if self.row_filters:
+            # One row past the slice tells whether more follow
+            self._fill(stop + 1)
+            return self._to_logs(self._rows[start:stop])
+        return self._to_logs(self._load(self._slice_entries(start, max(start, stop))))
+
+    def count(self):
+        return len(self)
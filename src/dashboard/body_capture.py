@@ -0,0 +1,144 @@
+"""
+Request body capture for RequestLogMiddleware.
+
+Nothing is copied while the request is being handled. ``prepare_body_capture``
+runs in ``process_request`` and only makes sure the body can still be looked
+at afterwards:
+
+* small JSON/text bodies are read into Django's own ``request.body`` cache,
+  which DRF reuses, so no second copy is made;
+* anything else (large bodies, multipart uploads, unknown types) is left
+  to be streamed by the view through a wrapper that counts bytes, hashes
+  them on the way through and keeps only the first
+  ``REQUEST_LOG_BODY_MAX_BYTES`` of text bodies.
+
+``build_body_record`` then runs in ``process_response`` for requests that
+are actually logged and returns ``(text, size, sha256)`` with the text
+capped at ``settings.REQUEST_LOG_BODY_MAX_BYTES``.
+"""
+import hashlib
+
+from django.conf import settings
+
+DEFAULT_BODY_MAX_BYTES = 16 * 1024
+TRUNCATION_MARKER = "...[truncated {} bytes]"
+
+
+def get_body_max_bytes():
+    return getattr(settings, 'REQUEST_LOG_BODY_MAX_BYTES', DEFAULT_BODY_MAX_BYTES)
+
+
+class DigestingStream:
+    """
+    Wrap a request stream, counting and hashing whatever is read from it and
+    keeping at most ``head_bytes`` of it for the log.
+    """
+
+    def __init__(self, stream, head_bytes):
+        self._stream = stream
+        self.size = 0
+        self.head = b""
+        self._head_bytes = head_bytes
+        self._digest = hashlib.sha256()
+
+    def _seen(self, data):
+        if len(self.head) < self._head_bytes:
+            self.head += data[:self._head_bytes - len(self.head)]
+        self.size += len(data)
+        self._digest.update(data)
+        return data
+
+    def read(self, *args, **kwargs):
+        return self._seen(self._stream.read(*args, **kwargs))
+
+    def readline(self, *args, **kwargs):
+        return self._seen(self._stream.readline(*args, **kwargs))
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _content_length(request):
+    try:
+        return int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return None
+
+
+def _is_text(content_type):
+    return "application/json" in content_type or "text/" in content_type
+
+
+def prepare_body_capture(request):
+    content_type = request.META.get("CONTENT_TYPE", "").lower()
+    length = _content_length(request)
+    max_bytes = get_body_max_bytes()
+    if _is_text(content_type) and length is not None and length <= max_bytes:
+        request.body  # cached on the request, DRF parses from the same bytes
+    elif not getattr(request, '_read_started', False):
+        head_bytes = max_bytes if _is_text(content_type) else 0
+        request._body_digest = request._stream = DigestingStream(request._stream, head_bytes)
+
+
+def _truncate(text, max_bytes):
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return text
+    kept = encoded[:max_bytes].decode("utf-8", errors="ignore")
+    return kept + TRUNCATION_MARKER.format(len(encoded) - max_bytes)
+
+
+def _decode_head(head, size, max_bytes):
+    try:
+        # A truncated body may end in the middle of a multi-byte character
+        text = head[:max_bytes].decode("utf-8", errors="strict" if size <= max_bytes else "ignore")
+    except UnicodeDecodeError:
+        return "<decoding-error>"
+    if size > max_bytes:
+        text += TRUNCATION_MARKER.format(size - max_bytes)
+    return text
+
+
+def build_body_record(request):
+    """Return ``(text, size, sha256)`` describing the request body."""
+    max_bytes = get_body_max_bytes()
+    content_type = request.META.get("CONTENT_TYPE", "").lower()
+
+    if '_body' in request.__dict__:
+        body = request._body
+        size = len(body)
+        sha256 = hashlib.sha256(body).hexdigest() if size > max_bytes else None
+        if not _is_text(content_type):
+            return "<non-text-body>", size, sha256
+        return _decode_head(body, size, max_bytes), size, sha256
+
+    digest = getattr(request, '_body_digest', None)
+    size = _content_length(request) or (digest.size if digest else None)
+    # Only trust the hash if the view consumed the whole body
+    complete = digest is not None and digest.size > 0 and digest.size == size
+    sha256 = digest.hexdigest() if complete else None
+
+    if "multipart/form-data" in content_type:
+        # Only summarise the form if the view already parsed it; parsing it
+        # here just for the log is exactly the cost we want to avoid.
+        if '_post' not in request.__dict__:
+            return f"<multipart: {size} bytes>", size, sha256
+        request_body = {}
+        if request._post:
+            request_body.update(dict(request._post))
+        files = request.__dict__.get('_files')
+        if files:
+            request_body.update({
+                name: f"File: {file.name}, Size: {file.size} bytes" for name, file in files.items()
+            })
+        text = str(request_body) if request_body else "<empty-multipart>"
+        return _truncate(text, max_bytes), size, sha256
+
+    if _is_text(content_type) and digest is not None and digest.head:
+        return _decode_head(digest.head, size, max_bytes), size, sha256
+    if _is_text(content_type):
+        return f"<body not read: {size} bytes>", size, sha256
+    return "<non-text-body>", size, sha256
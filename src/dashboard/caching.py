@@ -0,0 +1,54 @@
+"""
+Namespaced snapshots in the default cache.
+
+Each namespace has a version number stored in the cache. Cached values are
+keyed by that version, so ``invalidate(namespace)`` drops every snapshot
+of a namespace at once by bumping the number; the old entries simply
+expire. Invalidation is per cache backend: with the default LocMemCache it
+only reaches the current process, so the TTL bounds staleness elsewhere
+(configure a shared cache such as Redis in CACHES to invalidate everywhere).
+"""
+from django.core.cache import cache
+
+#^ Namespaces
+DASHBOARD_STATS = 'dashboard-stats'
+CONFIRMATION_LATENCY = 'confirmation-latency'
+STUDENT_FACETS = 'student-facets'
+TIMESLOT_HEATMAP = 'timeslot-heatmap'
+
+VERSION_KEY = 'snapshot-version:{}'
+VALUE_KEY = 'snapshot:{}:{}:{}'
+
+
+def namespace_version(namespace):
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def invalidate(namespace):
+    key = VERSION_KEY.format(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not set yet (or evicted): any new number retires old snapshots
+        cache.add(key, 2, timeout=None)
+
+
+def cached_snapshot(namespace, key, build, ttl, fresh=False):
+    """
+    Return the cached value of ``build()`` for ``key`` in ``namespace``,
+    building and storing it for ``ttl`` seconds when missing or when
+    ``fresh`` is set.
+    """
+    cache_key = VALUE_KEY.format(namespace, namespace_version(namespace), key)
+    if not fresh:
+        value = cache.get(cache_key)
+        if value is not None:
+            return value
+    value = build()
+    cache.set(cache_key, value, ttl)
+    return value
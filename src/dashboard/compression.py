@@ -0,0 +1,67 @@
+"""
+Optional compressed storage for RequestLog.request_body.
+
+With ``settings.REQUEST_LOG_COMPRESSION['CODEC'] = 'zlib'`` bodies of at
+least ``MIN_BYTES`` are stored zlib-compressed in ``request_body_compressed``
+with ``request_body_codec = 'zlib'`` and ``request_body`` left empty.
+Shorter bodies stay in ``request_body`` as plain text. ``RequestLog.get_request_body()``
+returns the text whatever the storage format.
+"""
+import zlib
+
+from django.conf import settings
+
+CODEC_PLAIN = None
+CODEC_ZLIB = 'zlib'
+CODECS = (CODEC_PLAIN, CODEC_ZLIB)
+
+DEFAULT_COMPRESSION_SETTINGS = {
+    'CODEC': CODEC_PLAIN,
+    'MIN_BYTES': 256,
+    'LEVEL': 6,
+}
+
+
+def get_compression_settings():
+    return {**DEFAULT_COMPRESSION_SETTINGS, **getattr(settings, 'REQUEST_LOG_COMPRESSION', {})}
+
+
+def decode_body(text, blob, codec):
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(bytes(blob)).decode("utf-8") if blob is not None else None
+    if codec not in CODECS:
+        raise ValueError(f"Unknown request body codec {codec!r}")
+    return text
+
+
+def encode_body(text, codec, min_bytes=0, level=6):
+    """Return ``(text, blob, codec)`` to store for ``text``."""
+    if text is None or codec == CODEC_PLAIN:
+        return text, None, CODEC_PLAIN
+    if codec != CODEC_ZLIB:
+        raise ValueError(f"Unknown request body codec {codec!r}")
+    raw = text.encode("utf-8")
+    if len(raw) < min_bytes:
+        return text, None, CODEC_PLAIN
+    return None, zlib.compress(raw, level), CODEC_ZLIB
+
+
+_FROM_SETTINGS = object()
+
+
+def store_request_body(log, codec=_FROM_SETTINGS, min_bytes=None, level=None):
+    """
+    Re-encode ``log``'s body in place, by default with the configured codec.
+    Returns True if the storage format changed.
+    """
+    conf = get_compression_settings()
+    codec = conf['CODEC'] if codec is _FROM_SETTINGS else codec
+    min_bytes = conf['MIN_BYTES'] if min_bytes is None else min_bytes
+    level = conf['LEVEL'] if level is None else level
+
+    text = decode_body(log.request_body, log.request_body_compressed, log.request_body_codec)
+    stored = encode_body(text, codec, min_bytes=min_bytes, level=level)
+    if stored[2] == log.request_body_codec:
+        return False
+    log.request_body, log.request_body_compressed, log.request_body_codec = stored
+    return True
@@ -0,0 +1,157 @@
+"""
+How long subscriptions wait before being confirmed or declined.
+
+The timestamps of every matching subscription are loaded with one
+``values_list`` query into a single float matrix (NaN for missing). The
+database converts the timestamps to epoch seconds (``Epoch``), so no
+datetime objects are built per row. Everything after that is numpy:
+outcome masks, wait times, percentiles, histograms over ``BIN_EDGES_HOURS``
+and the age of the pending backlog. Splitting by teacher or course sorts
+the arrays once by group and summarises each slice, so Python only loops
+over groups, never over rows.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db.models import FloatField, Func
+from django.utils import timezone
+
+from courses.models import CourseGroupSubscription
+
+PERCENTILES = (50, 75, 90, 95, 99)
+#^ Histogram buckets in hours; the last one is open-ended
+BIN_EDGES_HOURS = (0, 1, 6, 24, 72, 168, 336, 720)
+GROUP_BY_FIELDS = {
+    'teacher': 'course_group__teacher_id',
+    'course': 'course_id',
+}
+FILTER_FIELDS = {
+    'course': 'course_id',
+    'teacher': 'course_group__teacher_id',
+    'year': 'course__year_id',
+    'type_education': 'course__type_education_id',
+}
+
+
+class Epoch(Func):
+    """Seconds since 1970-01-01 UTC of a datetime column, as a float."""
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    arity = 1
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='((julianday(%(expressions)s) - 2440587.5) * 86400.0)', **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def start_of_day(day):
+    """Midnight at the start of ``day``, in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def load_columns(start=None, end=None, group_by=None, **filters):
+    """
+    Arrays ``created``, ``confirmed``, ``declined`` (epoch seconds),
+    ``is_confirmed``, ``is_declined`` and, with ``group_by``, ``group`` for
+    the subscriptions created between the dates ``start`` and ``end``.
+    """
+    subscriptions = CourseGroupSubscription.objects.order_by()
+    # Bounds on the bare column rather than created_at__date, which wraps
+    # it in a function and keeps the database from using its index
+    if start:
+        subscriptions = subscriptions.filter(created_at__gte=start_of_day(start))
+    if end:
+        subscriptions = subscriptions.filter(created_at__lt=start_of_day(end + timedelta(days=1)))
+    for name, value in filters.items():
+        if value is not None:
+            subscriptions = subscriptions.filter(**{FILTER_FIELDS[name]: value})
+
+    subscriptions = subscriptions.annotate(
+        created=Epoch('created_at'), confirmed=Epoch('confirmed_at'), declined=Epoch('declined_at'),
+    )
+    fields = ['created', 'confirmed', 'declined', 'is_confirmed', 'is_declined']
+    if group_by:
+        fields.append(GROUP_BY_FIELDS[group_by])
+    matrix = np.array(list(subscriptions.values_list(*fields)), dtype=np.float64).reshape(-1, len(fields))
+    arrays = {
+        'created': matrix[:, 0],
+        'confirmed': matrix[:, 1],
+        'declined': matrix[:, 2],
+        'is_confirmed': matrix[:, 3] == 1,
+        'is_declined': matrix[:, 4] == 1,
+    }
+    if group_by:
+        arrays['group'] = np.nan_to_num(matrix[:, 5], nan=-1).astype(np.int64)
+    return arrays
+
+
+def histogram(hours):
+    edges = np.asarray(BIN_EDGES_HOURS, dtype=np.float64)
+    buckets = np.searchsorted(edges, hours, side='right') - 1
+    counts = np.bincount(np.clip(buckets, 0, None), minlength=len(edges))
+    return [
+        {'from_hours': int(low), 'to_hours': int(high) if high is not None else None, 'count': int(count)}
+        for low, high, count in zip(edges, [*edges[1:], None], counts)
+    ]
+
+
+def distribution(hours):
+    """Count, mean, max, percentiles and histogram of an array of hours."""
+    if not hours.size:
+        return {'count': 0, 'mean_hours': None, 'max_hours': None,
+                'percentiles': {f'p{p}': None for p in PERCENTILES}, 'histogram': histogram(hours)}
+    return {
+        'count': int(hours.size),
+        'mean_hours': round(float(hours.mean()), 2),
+        'max_hours': round(float(hours.max()), 2),
+        'percentiles': {
+            f'p{p}': round(float(value), 2)
+            for p, value in zip(PERCENTILES, np.percentile(hours, PERCENTILES))
+        },
+        'histogram': histogram(hours),
+    }
+
+
+def summarize(arrays, now):
+    """Confirmed and declined wait times plus the pending backlog age, in hours."""
+    created = arrays['created']
+    confirmed = arrays['is_confirmed'] & ~np.isnan(arrays['confirmed'])
+    declined = arrays['is_declined'] & ~arrays['is_confirmed'] & ~np.isnan(arrays['declined'])
+    pending = ~arrays['is_confirmed'] & ~arrays['is_declined']
+    return {
+        'confirmed': distribution(np.maximum(arrays['confirmed'][confirmed] - created[confirmed], 0) / 3600),
+        'declined': distribution(np.maximum(arrays['declined'][declined] - created[declined], 0) / 3600),
+        'pending': distribution(np.maximum(now - created[pending], 0) / 3600),
+    }
+
+
+def confirmation_latency(start=None, end=None, group_by=None, **filters):
+    """
+    Wait-time distributions for the matching subscriptions, overall and,
+    with ``group_by`` ('teacher' or 'course'), per group.
+    """
+    now = timezone.now()
+    arrays = load_columns(start, end, group_by, **filters)
+    result = {
+        'generated_at': now.isoformat(),
+        'bins_hours': list(BIN_EDGES_HOURS),
+        'overall': summarize(arrays, now.timestamp()),
+    }
+    if group_by:
+        order = np.argsort(arrays['group'], kind='stable')
+        grouped = {name: values[order] for name, values in arrays.items()}
+        ids, starts = np.unique(grouped['group'], return_index=True)
+        bounds = [*starts[1:], grouped['group'].size]
+        result['groups'] = [
+            {
+                group_by: int(group_id) if group_id >= 0 else None,
+                **summarize({name: values[low:high] for name, values in grouped.items()}, now.timestamp()),
+            }
+            for group_id, low, high in zip(ids, starts, bounds)
+        ]
+    return result
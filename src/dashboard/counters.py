@@ -0,0 +1,204 @@
+"""
+Global counters for the dashboard, stored in StatsCounter.
+
+Every counter is derived from a row's own fields, so a change is always
+``counters_for(new) - counters_for(old)``; ``apply_deltas`` adds the result
+with one ``UPDATE ... SET value = value + n`` per counter inside the
+caller's transaction. The receivers in dashboard.signals feed it from
+model saves/deletes and from ``subscriptions_changed``, and
+``reconcile_counters`` recomputes everything with GROUP BY queries.
+
+Counter names:
+
+* ``students_total``, ``students_active``, ``students_blocked``,
+  ``students:year:<id>``, ``students:type:<id>``
+* ``teachers_total``
+* ``courses_total``, ``courses:type:<id>``
+* ``groups_total``, ``groups_active``
+* ``subs_total``, ``subs_pending``, ``subs_confirmed``, ``subs_declined``,
+  ``subs_confirmed:year:<id>``, ``subs_confirmed:type:<id>``
+
+``<id>`` is ``none`` for rows without a year / type. Names starting with
+``_`` are marker rows (see below and dashboard.analytics), not counters.
+
+Increments only start once ``reconcile_counters`` has stored every
+counter together with the ``INITIALIZED`` marker row. Until then writes
+leave the table alone, and the first read computes it from the tables
+(``ensure_counters``). Otherwise, on an existing database the first write
+would create a counter holding only its own delta.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from accounts.models import Student, Teacher
+from courses.models import Course, CourseGroup, CourseGroupSubscription
+from courses.signals import STATUS_CONFIRMED, subscription_status
+
+from .models import StatsCounter
+
+#^ Marker row: the counters were computed from the tables at least once
+INITIALIZED = '_initialized'
+MARKER_PREFIX = '_'
+
+
+def _key(prefix, pk):
+    return f"{prefix}:{'none' if pk is None else pk}"
+
+
+def student_counters(active, block, year_id, type_education_id):
+    counters = Counter({'students_total': 1, _key('students:year', year_id): 1,
+                        _key('students:type', type_education_id): 1})
+    counters['students_active'] += bool(active)
+    counters['students_blocked'] += bool(block)
+    return counters
+
+
+def course_counters(type_education_id):
+    return Counter({'courses_total': 1, _key('courses:type', type_education_id): 1})
+
+
+def group_counters(is_active):
+    return Counter({'groups_total': 1, 'groups_active': int(bool(is_active))})
+
+
+def subscription_counters(status, year_id, type_education_id):
+    if status is None:
+        return Counter()
+    counters = Counter({'subs_total': 1, f'subs_{status}': 1})
+    if status == STATUS_CONFIRMED:
+        counters[_key('subs_confirmed:year', year_id)] += 1
+        counters[_key('subs_confirmed:type', type_education_id)] += 1
+    return counters
+
+
+def diff(new, old):
+    deltas = Counter(new)
+    deltas.subtract(old)
+    return deltas
+
+
+def apply_deltas(deltas):
+    """
+    Add ``{name: delta}`` to the counters, creating missing ones (a new
+    year or type starts at zero). Does nothing before the counters were
+    first computed.
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        if not StatsCounter.objects.filter(name=INITIALIZED).exists():
+            return
+        # Sorted so concurrent writers lock counters in the same order
+        for name in sorted(deltas):
+            delta = deltas[name]
+            if StatsCounter.objects.filter(name=name).update(value=F('value') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    StatsCounter.objects.create(name=name, value=delta)
+            except IntegrityError:
+                StatsCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def subscription_change_deltas(changes):
+    """Counter deltas for a batch of SubscriptionChange, one query for the courses."""
+    courses = {
+        row['id']: row for row in
+        Course.objects.filter(id__in={change.course_id for change in changes})
+        .values('id', 'year_id', 'type_education_id')
+    }
+    deltas = Counter()
+    for change in changes:
+        course = courses.get(change.course_id, {})
+        year_id, type_id = course.get('year_id'), course.get('type_education_id')
+        deltas.update(subscription_counters(change.new_status, year_id, type_id))
+        deltas.subtract(subscription_counters(change.old_status, year_id, type_id))
+    return deltas
+
+
+def read_counters():
+    return dict(StatsCounter.objects.exclude(name__startswith=MARKER_PREFIX).values_list('name', 'value'))
+
+
+def compute_counters():
+    """Every counter recomputed from the tables."""
+    counters = Counter()
+
+    students = Student.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(active=True)),
+        blocked=Count('id', filter=Q(block=True)),
+    )
+    counters['students_total'] = students['total']
+    counters['students_active'] = students['active']
+    counters['students_blocked'] = students['blocked']
+    for row in Student.objects.values('year_id').annotate(n=Count('id')).order_by():
+        counters[_key('students:year', row['year_id'])] = row['n']
+    for row in Student.objects.values('type_education_id').annotate(n=Count('id')).order_by():
+        counters[_key('students:type', row['type_education_id'])] = row['n']
+
+    counters['teachers_total'] = Teacher.objects.count()
+
+    for row in Course.objects.values('type_education_id').annotate(n=Count('id')).order_by():
+        counters['courses_total'] += row['n']
+        counters[_key('courses:type', row['type_education_id'])] = row['n']
+
+    groups = CourseGroup.objects.aggregate(total=Count('id'), active=Count('id', filter=Q(is_active=True)))
+    counters['groups_total'] = groups['total']
+    counters['groups_active'] = groups['active']
+
+    rows = (
+        CourseGroupSubscription.objects
+        .values('is_confirmed', 'is_declined', 'course__year_id', 'course__type_education_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        status = subscription_status(row['is_confirmed'], row['is_declined'])
+        for name, value in subscription_counters(
+            status, row['course__year_id'], row['course__type_education_id']
+        ).items():
+            counters[name] += value * row['n']
+    return counters
+
+
+def reconcile_counters():
+    """
+    Recompute every counter and overwrite the stored values. Returns
+    ``{name: (old, new)}`` for the counters that were off.
+    """
+    with transaction.atomic():
+        stored = {
+            counter.name: counter for counter in
+            StatsCounter.objects.select_for_update().exclude(name__startswith=MARKER_PREFIX)
+        }
+        fresh = compute_counters()
+        drift = {}
+        for name in set(stored) | set(fresh):
+            old = stored[name].value if name in stored else None
+            new = fresh.get(name, 0)
+            if old != new:
+                drift[name] = (old, new)
+        updated = []
+        for name, (old, new) in drift.items():
+            if name in stored:
+                stored[name].value = new
+                updated.append(stored[name])
+        StatsCounter.objects.bulk_update(updated, ['value'])
+        StatsCounter.objects.bulk_create([
+            StatsCounter(name=name, value=new) for name, (old, new) in drift.items() if name not in stored
+        ])
+        StatsCounter.objects.get_or_create(name=INITIALIZED, defaults={'value': 1})
+    return drift
+
+
+def ensure_counters():
+    """Stored counters, computing them first if they were never reconciled."""
+    counters = dict(StatsCounter.objects.values_list('name', 'value'))
+    if INITIALIZED not in counters:
+        reconcile_counters()
+        return read_counters()
+    return {name: value for name, value in counters.items() if not name.startswith(MARKER_PREFIX)}
@@ -0,0 +1,57 @@
+"""
+Facet counts for the student filter sidebar.
+
+Every facet is counted from a single ``GROUP BY`` over all facet columns
+at once. The query applies the non-facet filters (search, code, ...) and
+returns one row per combination of facet values, which is far fewer rows
+than students. The counts per facet are then summed in Python from those
+combinations. A facet's counts honour the selections on every *other*
+facet but not its own, so the sidebar still shows the alternatives to the
+selected value.
+"""
+from django.db.models import Count
+
+#^ facet -> (group-by column, label column or None)
+STUDENT_FACETS = {
+    'year': ('year_id', 'year__name'),
+    'type_education': ('type_education_id', 'type_education__name'),
+    'active': ('active', None),
+    'block': ('block', None),
+    'by_code': ('by_code', None),
+    'division': ('division', None),
+    'government': ('government', None),
+}
+
+
+def selected_value(value):
+    """A cleaned filter value as stored in the facet column (model instances -> pk)."""
+    return getattr(value, 'pk', value)
+
+
+def facet_counts(queryset, selected, facets=STUDENT_FACETS):
+    """
+    ``{'total': n, 'facets': {facet: [{'value', 'label', 'count'}, ...]}}``
+    for ``queryset`` (already filtered on everything but the facets) with
+    ``selected``: ``{facet: value}`` for the facets being filtered on.
+    """
+    columns = [column for column, _ in facets.values()]
+    labels = [label for _, label in facets.values() if label]
+    rows = list(queryset.order_by().values(*columns, *labels).annotate(n=Count('id')))
+
+    def matches(row, skip=None):
+        return all(row[facets[facet][0]] == value for facet, value in selected.items() if facet != skip)
+
+    result = {}
+    for facet, (column, label) in facets.items():
+        counts = {}
+        for row in rows:
+            if not matches(row, skip=facet):
+                continue
+            entry = counts.setdefault(row[column], {
+                'value': row[column],
+                'label': row[label] if label else row[column],
+                'count': 0,
+            })
+            entry['count'] += row['n']
+        result[facet] = sorted(counts.values(), key=lambda entry: (-entry['count'], str(entry['label'])))
+    return {'total': sum(row['n'] for row in rows if matches(row)), 'facets': result}
@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 from django.utils import timezone
+from accounts.models import Student
 from .models import RequestLog
 import django_filters
 import datetime
@@ -27,6 +28,20 @@ class RequestLogFilter(filters.FilterSet):
             'user': ['exact'],
             'method': ['exact'],
             'status_code': ['exact'],
+            'view_name': ['exact'],
             'path': ['icontains'],
             'timestamp': ['exact'],  
         }
+
+
+#^---------------------students-----------------
+
+class StudentFilter(filters.FilterSet):
+    """Shared by DashboardStudentsView and the student facet counts."""
+
+    class Meta:
+        model = Student
+        fields = [
+            'year', 'type_education', 'active', 'block', 'by_code', 'code', 'is_admin',
+            'division', 'government', 'user__username', 'parent_phone',
+        ]
@@ -0,0 +1,136 @@
+"""
+Per-request database instrumentation for RequestLogMiddleware.
+
+``instrument_queries()`` installs a ``connection.execute_wrapper`` on every
+configured database for the duration of the view and collects the number
+of queries, the total time spent in them and the slowest statement.
+
+``QueryTrace`` additionally keeps every statement with its duration and
+the project call site that issued it, for the slow-request tracer.
+"""
+import os
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+SLOWEST_QUERY_MAX_CHARS = 2000
+
+DEFAULT_TRACE_SETTINGS = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 1000,   # requests slower than this are stored as SlowRequest
+    'MAX_QUERIES': 500,     # statements kept per request
+    'STACK_DEPTH': 5,       # project frames kept per statement
+    'SQL_MAX_CHARS': 2000,
+}
+
+
+def get_trace_settings():
+    return {**DEFAULT_TRACE_SETTINGS, **getattr(settings, 'SLOW_REQUEST_TRACE', {})}
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.record(sql, elapsed_ms)
+
+    def record(self, sql, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms >= self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = sql[:SLOWEST_QUERY_MAX_CHARS] if sql else sql
+
+
+_PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+_SKIP_FILES = (
+    __file__,
+    os.path.join(os.path.dirname(__file__), 'middleware.py'),
+    os.path.join(_PROJECT_ROOT, 'courses', 'middleware.py'),
+    os.path.join(_PROJECT_ROOT, 'manage.py'),
+)
+
+
+def call_site(depth):
+    """
+    Innermost ``depth`` frames of the current stack that belong to this
+    project (not Django, DRF or other installed packages), formatted as
+    ``"path/file.py:42 in func"``.
+    """
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(_PROJECT_ROOT) and filename not in _SKIP_FILES
+                and 'site-packages' not in filename):
+            frames.append(
+                f"{filename[len(_PROJECT_ROOT):]}:{frame.f_lineno} in {frame.f_code.co_name}"
+            )
+        frame = frame.f_back
+    return frames
+
+
+class QueryTrace(QueryStats):
+    """QueryStats that also keeps each statement, its time and call site."""
+
+    def __init__(self, max_queries=500, stack_depth=5, sql_max_chars=2000):
+        super().__init__()
+        self.max_queries = max_queries
+        self.stack_depth = stack_depth
+        self.sql_max_chars = sql_max_chars
+        self.queries = []
+        self.truncated = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # Taken before executing so the stack is the caller's, not the driver's
+        stack = call_site(self.stack_depth) if len(self.queries) < self.max_queries else None
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.record(sql, elapsed_ms)
+            if stack is None:
+                self.truncated = True
+            else:
+                self.queries.append({
+                    'sql': sql[:self.sql_max_chars] if sql else sql,
+                    'time': round(elapsed_ms, 3),
+                    'many': many,
+                    'stack': stack,
+                })
+
+    @classmethod
+    def from_settings(cls):
+        conf = get_trace_settings()
+        return cls(
+            max_queries=conf['MAX_QUERIES'],
+            stack_depth=conf['STACK_DEPTH'],
+            sql_max_chars=conf['SQL_MAX_CHARS'],
+        )
+
+
+@contextmanager
+def instrument_queries(stats=None):
+    stats = stats if stats is not None else QueryStats()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+def server_timing_header(timings):
+    """Format ``{'db': 12.3, ...}`` (milliseconds) as a Server-Timing value."""
+    return ", ".join(f"{name};dur={duration:.1f}" for name, duration in timings.items())
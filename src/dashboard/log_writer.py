@@ -0,0 +1,249 @@
+"""
+Request log persistence.
+
+`RequestLogMiddleware` hands finished log records to `submit_request_log`.
+Depending on ``settings.REQUEST_LOG_WRITER['MODE']`` the record is either
+saved inline (``'sync'``) or pushed onto a bounded in-process queue that a
+background thread drains with ``bulk_create`` (``'buffered'``), which keeps
+log I/O out of the request/response cycle.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .compression import store_request_body
+from .models import RequestLog
+from .rollups import record_rollups
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WRITER_SETTINGS = {
+    'MODE': 'sync',             # 'sync' or 'buffered'
+    'QUEUE_SIZE': 10000,        # max records waiting in memory
+    'BATCH_SIZE': 500,          # flush once this many records are queued
+    'FLUSH_INTERVAL': 2.0,      # ... or after this many seconds
+    'OVERFLOW': 'drop_newest',  # 'drop_newest', 'drop_oldest' or 'block'
+    'BLOCK_TIMEOUT': 0.05,      # seconds to wait when OVERFLOW is 'block'
+    'SHUTDOWN_TIMEOUT': 5.0,    # seconds to wait for the final flush
+}
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+_STOP = object()
+
+
+def get_writer_settings():
+    return {**DEFAULT_WRITER_SETTINGS, **getattr(settings, 'REQUEST_LOG_WRITER', {})}
+
+
+def persist_log_records(records):
+    """Write a batch of unsaved model instances, one ``bulk_create`` per model."""
+    for model, objs in groupby(records, key=type):
+        objs = list(objs)
+        if model is not RequestLog:
+            model._default_manager.bulk_create(objs)
+            continue
+        # Done here rather than in the middleware so that in buffered
+        # mode compression also happens off the request path.
+        for log in objs:
+            store_request_body(log)
+        with transaction.atomic(using=router.db_for_write(RequestLog)):
+            RequestLog.objects.bulk_create(objs)
+            record_rollups(objs)
+
+
+class BufferedLogWriter:
+    """
+    Bounded queue plus a daemon thread that flushes records in batches.
+
+    A batch is written when ``batch_size`` records are waiting or when
+    ``flush_interval`` seconds have passed since the first record of the
+    batch arrived. When the queue is full the ``overflow`` policy decides
+    whether the new record is dropped, the oldest one is evicted, or the
+    caller blocks for up to ``block_timeout`` seconds (back-pressure).
+    """
+
+    def __init__(self, queue_size=10000, batch_size=500, flush_interval=2.0,
+                 overflow='drop_newest', block_timeout=0.05, shutdown_timeout=5.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {overflow!r}, expected one of {OVERFLOW_POLICIES}")
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.shutdown_timeout = shutdown_timeout
+
+        self.dropped = 0
+        self.written = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+    # -- producer side -------------------------------------------------
+
+    def submit(self, record, blocking=True):
+        """
+        Queue a record for writing. Returns False if it had to be dropped.
+        With ``blocking=False`` the 'block' overflow policy drops instead of
+        waiting, for callers running on an event loop.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow == 'block' and blocking:
+            try:
+                self._queue.put(record, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                pass
+        elif self.overflow == 'drop_oldest':
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(record)
+                return True
+            except queue.Full:
+                pass
+
+        self.dropped += 1
+        return False
+
+    def _ensure_started(self):
+        # A forked worker inherits the queue object but not the thread, so
+        # the writer is rebuilt whenever the pid changes.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._thread = threading.Thread(
+                target=self._run, name='request-log-writer', daemon=True
+            )
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    # -- consumer side -------------------------------------------------
+
+    def _run(self):
+        q = self._queue
+        stopping = False
+        try:
+            while not stopping:
+                batch, stopping = self._collect_batch(q)
+                if batch:
+                    self._write(batch)
+                for _ in range(len(batch) + stopping):
+                    q.task_done()
+        finally:
+            connections.close_all()
+
+    def _collect_batch(self, q):
+        batch = []
+        item = q.get()
+        if item is _STOP:
+            return batch, True
+        batch.append(item)
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write(self, batch):
+        try:
+            persist_log_records(batch)
+            self.written += len(batch)
+        except Exception:
+            logger.exception("Failed to write %d request log records", len(batch))
+            # Drop a possibly broken connection so the next batch reconnects.
+            connections.close_all()
+
+    # -- lifecycle -----------------------------------------------------
+
+    def flush(self, timeout=None):
+        """Block until every record queued so far has been written."""
+        if self._thread is None or self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        """Flush pending records and stop the background thread."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=self.shutdown_timeout)
+        except queue.Full:
+            logger.warning("Request log queue still full at shutdown, %d records may be lost",
+                           self._queue.qsize())
+            return
+        thread.join(self.shutdown_timeout)
+        self._thread = None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                conf = get_writer_settings()
+                _writer = BufferedLogWriter(
+                    queue_size=conf['QUEUE_SIZE'],
+                    batch_size=conf['BATCH_SIZE'],
+                    flush_interval=conf['FLUSH_INTERVAL'],
+                    overflow=conf['OVERFLOW'],
+                    block_timeout=conf['BLOCK_TIMEOUT'],
+                    shutdown_timeout=conf['SHUTDOWN_TIMEOUT'],
+                )
+    return _writer
+
+
+def submit_request_log(record, blocking=True):
+    """
+    Persist ``record`` inline or hand it to the background writer. With
+    ``blocking=False`` (async callers) the record is always queued, whatever
+    the mode, and never waited on.
+    """
+    if not blocking or get_writer_settings()['MODE'] == 'buffered':
+        return get_log_writer().submit(record, blocking=blocking)
+    persist_log_records([record])
+    return True
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from dashboard.archive import archive_request_logs, get_archive_settings, prune_archive
+from dashboard.retention import get_retention_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Move request logs older than --older-than-days into the compressed daily "
+        "segment files of REQUEST_LOG_ARCHIVE and delete them from the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            help="Defaults to REQUEST_LOG_RETENTION['MAX_AGE_DAYS'].",
+        )
+        parser.add_argument('--chunk-size', type=int)
+        parser.add_argument('--pause', type=float, help="Seconds to pause between chunks.")
+        parser.add_argument('--dir', help="Archive directory (defaults to REQUEST_LOG_ARCHIVE['DIR']).")
+        parser.add_argument(
+            '--prune', action='store_true',
+            help="Also delete segment files older than REQUEST_LOG_ARCHIVE['KEEP_DAYS'].",
+        )
+
+    def handle(self, *args, **options):
+        retention = get_retention_settings()
+        days = options['older_than_days']
+        if days is None:
+            days = retention['MAX_AGE_DAYS']
+        if days is None:
+            raise CommandError("Pass --older-than-days or set REQUEST_LOG_RETENTION['MAX_AGE_DAYS']")
+        chunk_size = options['chunk_size'] or retention['CHUNK_SIZE']
+        pause = retention['PAUSE'] if options['pause'] is None else options['pause']
+
+        before = timezone.now() - timedelta(days=days)
+        archived = archive_request_logs(before, chunk_size, pause, directory=options['dir'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} request logs older than {before:%Y-%m-%d %H:%M}"))
+
+        if options['prune']:
+            keep_days = get_archive_settings()['KEEP_DAYS']
+            removed = prune_archive(keep_days, directory=options['dir'])
+            self.stdout.write(f"Removed {removed} archived days older than {keep_days} days")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.retention import get_retention_settings, prune_request_logs
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete request logs outside the retention policy (REQUEST_LOG_RETENTION) "
+        "in small primary-key chunks. Meant to be run periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-days', type=int, help="Delete logs older than this many days.")
+        parser.add_argument('--max-rows', type=int, help="Keep at most this many of the newest logs.")
+        parser.add_argument('--rollup-max-age-days', type=int, help="Delete latency rollups older than this.")
+        parser.add_argument('--chunk-size', type=int)
+        parser.add_argument('--pause', type=float, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        conf = get_retention_settings()
+        policy = {
+            key: options[key] if options[key] is not None else conf[key.upper()]
+            for key in ('max_age_days', 'max_rows', 'rollup_max_age_days', 'chunk_size', 'pause')
+        }
+        if policy['chunk_size'] <= 0:
+            raise CommandError("--chunk-size must be positive")
+        if policy['max_age_days'] is None and policy['max_rows'] is None and policy['rollup_max_age_days'] is None:
+            raise CommandError(
+                "No retention policy: set REQUEST_LOG_RETENTION or pass "
+                "--max-age-days / --max-rows / --rollup-max-age-days"
+            )
+
+        result = prune_request_logs(**policy)
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {result['age']} logs by age, {result['rows']} over the row limit "
+            f"and {result['rollups']} rollup rows"
+        ))
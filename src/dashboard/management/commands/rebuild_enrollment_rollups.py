@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.analytics import rebuild_enrollment_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute EnrollmentRollup from the subscription table (initial backfill or after bulk imports)."
+
+    def handle(self, *args, **options):
+        rows = rebuild_enrollment_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Done: {rows} rollup rows"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from dashboard.models import RequestLog, RequestLogRollup
+from dashboard.rollups import minute_bucket, record_rollups
+from dashboard.views import parse_datetime_param
+
+
+class Command(BaseCommand):
+    help = "Recompute RequestLogRollup rows from the raw request log, e.g. to backfill history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild from this ISO datetime or YYYY-MM-DD on.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        logs = RequestLog.objects.all()
+        rollups = RequestLogRollup.objects.all()
+        if options['since']:
+            since = minute_bucket(parse_datetime_param(options['since']))
+            logs = logs.filter(timestamp__gte=since)
+            rollups = rollups.filter(bucket__gte=since)
+
+        fields = ['id', 'timestamp', 'view_name', 'method', 'status_code',
+                  'response_time', 'log_reason', 'sample_rate']
+        with transaction.atomic(using=router.db_for_write(RequestLogRollup)):
+            deleted, _ = rollups.delete()
+        self.stdout.write(f"Deleted {deleted} rollup rows")
+
+        last_pk = 0
+        total = 0
+        while True:
+            chunk = list(logs.filter(pk__gt=last_pk).order_by('pk').only(*fields)[:options['chunk_size']])
+            if not chunk:
+                break
+            record_rollups(chunk)
+            last_pk = chunk[-1].pk
+            total += len(chunk)
+            self.stdout.write(f"Rolled up {total} logs (up to id {last_pk})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: rolled up {total} request logs"))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from dashboard.compression import CODEC_PLAIN, CODEC_ZLIB, get_compression_settings, store_request_body
+from dashboard.models import RequestLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encode stored RequestLog bodies in primary-key chunks, e.g. to compress "
+        "rows written before REQUEST_LOG_COMPRESSION was enabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--codec', choices=['zlib', 'none'],
+            help="Target codec (defaults to REQUEST_LOG_COMPRESSION['CODEC']).",
+        )
+        parser.add_argument('--min-bytes', type=int, help="Leave bodies shorter than this as plain text.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        conf = get_compression_settings()
+        if options['codec'] is None:
+            codec = conf['CODEC']
+        else:
+            codec = CODEC_ZLIB if options['codec'] == 'zlib' else CODEC_PLAIN
+        min_bytes = conf['MIN_BYTES'] if options['min_bytes'] is None else options['min_bytes']
+        chunk_size = options['chunk_size']
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size must be positive")
+
+        using = router.db_for_write(RequestLog)
+        fields = ['request_body', 'request_body_compressed', 'request_body_codec']
+        last_pk = 0
+        scanned = changed = 0
+        while True:
+            with transaction.atomic(using=using):
+                chunk = list(
+                    RequestLog.objects.using(using)
+                    .filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .only('pk', *fields)[:chunk_size]
+                )
+                if not chunk:
+                    break
+                updated = [log for log in chunk if store_request_body(log, codec=codec, min_bytes=min_bytes)]
+                if updated:
+                    RequestLog.objects.using(using).bulk_update(updated, fields)
+            last_pk = chunk[-1].pk
+            scanned += len(chunk)
+            changed += len(updated)
+            self.stdout.write(f"Scanned {scanned} rows, re-encoded {changed} (up to id {last_pk})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: re-encoded {changed} of {scanned} request logs"))
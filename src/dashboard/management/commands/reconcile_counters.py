@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every StatsCounter from the tables, fixing drift from writes "
+        "that bypassed the model signals (raw SQL, bulk_update(), queryset.update() on "
+        "students / courses / groups). Subscription status updates are tracked."
+    )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters()
+        for name, (old, new) in sorted(drift.items()):
+            self.stdout.write(f"{name}: {old} -> {new}")
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(drift)} counters corrected"))
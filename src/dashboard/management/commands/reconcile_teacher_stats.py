@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.teacher_stats import reconcile_teacher_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every TeacherStats row from the groups and subscriptions, fixing drift "
+        "from writes that bypassed the model signals."
+    )
+
+    def handle(self, *args, **options):
+        drift = reconcile_teacher_stats()
+        for teacher_id, changes in sorted(drift.items()):
+            summary = ', '.join(f"{metric}: {old} -> {new}" for metric, (old, new) in sorted(changes.items()))
+            self.stdout.write(f"teacher {teacher_id}: {summary}")
+        self.stdout.write(self.style.SUCCESS(f"Done: {len(drift)} teachers corrected"))
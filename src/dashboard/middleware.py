@@ -1,81 +1,261 @@
+import logging
+import re
 import time
-from .models import RequestLog
-from django.utils.deprecation import MiddlewareMixin
+import uuid
+from .models import RequestLog, SlowRequest
+from .body_capture import build_body_record, prepare_body_capture
+from .instrumentation import QueryTrace, get_trace_settings, instrument_queries, server_timing_header
+from .log_writer import submit_request_log
+from .sampling import REASON_SAMPLED, REASON_WRITE, SamplingPolicy, view_name_for
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.http import HttpResponseServerError
 from django.contrib.auth import get_user_model
-from django.utils.deprecation import MiddlewareMixin
-from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject, empty
 
 
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+DEFAULT_EXCLUDE_PATHS = [
+    '/admin/',
+    '/static/',
+    '/media/',
+    '/center/',
+    '/dashboard/logs/',
+]
+
 
+def compile_exclude_paths(prefixes):
+    """One anchored regex matching any of the path ``prefixes``."""
+    if not prefixes:
+        return None
+    return re.compile('|'.join(re.escape(prefix) for prefix in prefixes))
+
+
+class RequestLogMiddleware:
+    """
+    Logs requests to RequestLog (see dashboard/README.md). Runs natively in
+    both modes: under WSGI it is a plain sync middleware, under ASGI it
+    awaits the rest of the chain without a thread hop and hands records to
+    the background writer without blocking the event loop.
+    """
+    sync_capable = True
+    async_capable = True
 
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Django wraps sync hooks in sync_to_async in an async stack
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+        self.exclude_paths = getattr(settings, 'REQUEST_LOG_EXCLUDE_PATHS', DEFAULT_EXCLUDE_PATHS)
+        self.exclude_re = compile_exclude_paths(self.exclude_paths)
+        self.sampling = SamplingPolicy.from_settings()
+        self.instrument_db = getattr(settings, 'REQUEST_LOG_INSTRUMENT_DB', True)
+        self.server_timing = getattr(settings, 'SERVER_TIMING_HEADER', False)
+        trace = get_trace_settings()
+        self.trace_slow = trace['ENABLED']
+        self.trace_threshold_ms = trace['THRESHOLD_MS']
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        response = self.process_request(request)
+        if response is None:
+            instrument = self.server_timing or (
+                self.instrument_db and request._log_mode is not None
+            )
+            if request._trace_slow:
+                # Whether the request is slow is only known at the end, so
+                # every traceable request keeps its statements until then
+                with instrument_queries(QueryTrace.from_settings()) as request._query_stats:
+                    response = self.get_response(request)
+            elif instrument:
+                with instrument_queries() as request._query_stats:
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        request._response_end = time.perf_counter()
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        # execute_wrapper is per connection/thread and the ORM runs in
+        # worker threads here, so the async path does not instrument queries
+        # or trace slow requests.
+        response = self.process_request(request)
+        request._trace_slow = False
+        if response is None:
+            response = await self.get_response(request)
+        request._response_end = time.perf_counter()
+        if getattr(request, '_log_mode', None) is not None:
+            await self.resolve_user(request)
+        return self.process_response(request, response, blocking=False)
+
+    async def resolve_user(self, request):
+        # A SimpleLazyObject user that nothing has touched yet would hit the
+        # database from the event loop; DRF views replace it with the real
+        # user, so this only costs a thread hop for non-DRF views.
+        user = getattr(request, 'user', None)
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            await sync_to_async(user._setup)()
+
+    def is_excluded(self, path):
+        return self.exclude_re is not None and self.exclude_re.match(path) is not None
 
-class RequestLogMiddleware(MiddlewareMixin):
     def process_request(self, request):
         request.start_time = time.time()
-        request._request_body = None
-        if request.method in ["POST", "PUT", "PATCH", "DELETE"]:
-            content_type = request.META.get("CONTENT_TYPE", "").lower()
-            if "multipart/form-data" in content_type:
-                # Initialize request body as a dictionary
-                request_body = {}
-                # Add form fields from request.POST
-                if request.POST:
-                    request_body.update(dict(request.POST))
-                # Add file metadata from request.FILES
-                if request.FILES:
-                    file_info = {name: f"File: {file.name}, Size: {file.size} bytes" for name, file in request.FILES.items()}
-                    request_body.update(file_info)
-                # Convert to string for logging
-                request._request_body = str(request_body) if request_body else "<empty-multipart>"
-            elif "application/json" in content_type or "text/" in content_type:
-                # Handle JSON or text-based bodies
-                try:
-                    request._request_body = request.body.decode("utf-8")
-                except UnicodeDecodeError:
-                    request._request_body = "<decoding-error>"
-            else:
-                # Other content types
-                request._request_body = "<non-text-body>"
+        request._request_start = time.perf_counter()
+
+        # Decide up front whether this request can end up in the log:
+        #   'always'    staff write request (staff is only known after the view
+        #               has authenticated the user, so every write qualifies)
+        #   'sampled'   won the sampling roll
+        #   'candidate' lost the roll, logged only on error / slow response
+        #   None        never logged, nothing is captured
+        request._log_mode = None
+        request._trace_slow = False
+        if self.is_excluded(request.path):
+            return None
+
+        request._log_sampled, request._log_sample_rate = self.sampling.roll(request)
+        if request.method in WRITE_METHODS:
+            request._log_mode = 'always'
+        elif request._log_sampled:
+            request._log_mode = 'sampled'
+        elif self.sampling.can_force:
+            request._log_mode = 'candidate'
+        else:
+            return None
+
+        # Only requests that can end up in the log are traced
+        request._trace_slow = self.trace_slow
+        if request.method in WRITE_METHODS:
+            prepare_body_capture(request)
         return None
 
-    def process_response(self, request, response):
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_start = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called right after the view returns and before the response is rendered
+        request._render_start = time.perf_counter()
+        return response
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return RequestLogMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_template_response(self, request, response):
+        return RequestLogMiddleware.process_template_response(self, request, response)
+
+    def get_timings(self, request):
+        """
+        Split the request into phases, in milliseconds. ``serialize`` is the
+        view time not spent in the database, which for the DRF views here is
+        mostly serializer work.
+        """
+        stats = getattr(request, '_query_stats', None)
+        end = getattr(request, '_response_end', time.perf_counter())
+        view_start = getattr(request, '_view_start', None)
+        render_start = getattr(request, '_render_start', end)
+        db = stats.total_ms if stats else 0.0
+        timings = {'db': db}
+        if view_start is not None:
+            timings['serialize'] = max((render_start - view_start) * 1000 - db, 0.0)
+            timings['render'] = (end - render_start) * 1000
+        timings['total'] = (end - request._request_start) * 1000
+        return timings
+
+    def get_view(self, response):
+        renderer_context = getattr(response, 'renderer_context', None)
+        return renderer_context.get('view') if renderer_context else None
+
+    def build_slow_request(self, request, response, response_time_ms, request_id, trace):
+        view = self.get_view(response)
+        serializer_class = getattr(view, 'serializer_class', None) if view else None
+        user = getattr(request, 'user', None)
+        return SlowRequest(
+            request_id=request_id,
+            user=user if user is not None and user.is_authenticated else None,
+            path=request.path,
+            method=request.method,
+            view_name=view_name_for(view.__class__) if view else None,
+            serializer_name=view_name_for(serializer_class) if serializer_class else None,
+            status_code=response.status_code,
+            response_time=response_time_ms,
+            db_query_count=trace.count,
+            db_time=trace.total_ms,
+            queries=trace.queries,
+            queries_truncated=trace.truncated,
+        )
+
+    def process_response(self, request, response, blocking=True):
+        """
+        Add Server-Timing and submit the log records. With ``blocking=False``
+        (async mode) records always go to the background writer and are
+        dropped rather than waited for when its queue is full.
+        """
         if response is None:
             return HttpResponseServerError("Internal Server Error")
 
-        exclude_paths = [
-            '/admin/',
-            '/static/',
-            '/media/',
-            '/center/',
-            '/dashboard/logs/',
-            '/dashboard/logs/delete/',
-        ]
-        if any(request.path.startswith(path) for path in exclude_paths):
-            return response
+        if self.server_timing and hasattr(request, '_request_start'):
+            response['Server-Timing'] = server_timing_header(self.get_timings(request))
 
-        if not request.user.is_authenticated or not request.user.is_staff:
-            return response
+        response_time_ms = (time.time() - getattr(request, 'start_time', time.time())) * 1000
+        request_id = str(uuid.uuid4())
+        stats = getattr(request, '_query_stats', None)
 
-        if request.method == "GET":
+        if isinstance(stats, QueryTrace) and response_time_ms >= self.trace_threshold_ms:
+            try:
+                submit_request_log(
+                    self.build_slow_request(request, response, response_time_ms, request_id, stats),
+                    blocking=blocking,
+                )
+            except Exception:
+                logger.exception("Error tracing slow request")
+
+        log_mode = getattr(request, '_log_mode', None)
+        if log_mode is None:
             return response
 
-        response_time_ms = (time.time() - getattr(request, 'start_time', time.time())) * 1000
+        user = request.user if request.user.is_authenticated else None
+
+        sample_rate = request._log_sample_rate
+        if log_mode == 'always' and user is not None and user.is_staff:
+            log_reason, sample_rate = REASON_WRITE, 1.0
+        else:
+            # Errors and slow requests are logged whether sampled or not, so
+            # only rows logged as 'sampled' stand for 1 / sample_rate requests
+            log_reason = self.sampling.forced_reason(response.status_code, response_time_ms)
+            if log_reason is None and request._log_sampled:
+                log_reason = REASON_SAMPLED
+            if log_reason is None:
+                return response
+
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         ip_address = x_forwarded_for.split(',')[0] if x_forwarded_for else request.META.get('REMOTE_ADDR')
         query_params = dict(request.GET)
 
-        view_name = None
-        if hasattr(response, 'renderer_context') and response.renderer_context:
-            view = response.renderer_context.get('view')
-            if view:
-                view_name = f"{view.__class__.__module__}.{view.__class__.__name__}"
+        request_body = body_size = body_sha256 = None
+        if request.method in WRITE_METHODS:
+            request_body, body_size, body_sha256 = build_body_record(request)
+
+        view = self.get_view(response)
+        view_name = view_name_for(view.__class__) if view else None
 
         try:
-            RequestLog.objects.create(
-                user=request.user,
+            # Written inline or queued for the background writer depending on
+            # settings.REQUEST_LOG_WRITER['MODE'] (always queued in async mode).
+            submit_request_log(RequestLog(
+                request_id=request_id,
+                user=user,
                 ip_address=ip_address,
                 path=request.path,
                 method=request.method,
@@ -83,9 +263,17 @@ class RequestLogMiddleware(MiddlewareMixin):
                 query_params=query_params,
                 status_code=response.status_code,
                 response_time=response_time_ms,
-                request_body=getattr(request, '_request_body', None)
-            )
-        except Exception as e:
-            print(f"Error logging request: {e}")
+                request_body=request_body,
+                request_body_size=body_size,
+                request_body_sha256=body_sha256,
+                log_reason=log_reason,
+                sample_rate=sample_rate,
+                db_query_count=stats.count if stats else None,
+                db_time=stats.total_ms if stats else None,
+                db_slowest_time=stats.slowest_ms if stats else None,
+                db_slowest_query=stats.slowest_sql if stats else None,
+            ), blocking=blocking)
+        except Exception:
+            logger.exception("Error logging request")
 
-        return response
\ No newline at end of file
+        return response
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.CharField(blank=True, default=uuid.uuid4, max_length=36, null=True)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('path', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('view_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('query_params', models.JSONField(blank=True, null=True)),
+                ('status_code', models.IntegerField()),
+                ('response_time', models.FloatField(help_text='Response time in milliseconds')),
+                ('timestamp', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('request_body', models.TextField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_logs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['user'], name='dashboard_r_user_id_47ccc3_idx'), models.Index(fields=['method'], name='dashboard_r_method_d745ff_idx'), models.Index(fields=['status_code'], name='dashboard_r_status__2b7376_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_request_log_database'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestlog',
+            name='log_reason',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='sample_rate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
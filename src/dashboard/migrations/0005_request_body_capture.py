@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_request_log_sampling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestlog',
+            name='request_body_sha256',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='request_body_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
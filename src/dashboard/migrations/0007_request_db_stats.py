@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_request_body_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestlog',
+            name='db_query_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='db_slowest_query',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='db_slowest_time',
+            field=models.FloatField(blank=True, help_text='Slowest query time in milliseconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='db_time',
+            field=models.FloatField(blank=True, help_text='Total query time in milliseconds', null=True),
+        ),
+    ]
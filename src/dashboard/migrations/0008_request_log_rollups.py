@@ -0,0 +1,44 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_request_db_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Start of the minute')),
+                ('view_name', models.CharField(blank=True, default='', max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('samples', models.PositiveIntegerField(default=0, help_text='Logged rows')),
+                ('requests', models.FloatField(default=0)),
+                ('errors', models.FloatField(default=0)),
+                ('total_time', models.FloatField(default=0, help_text='Sum of response times in milliseconds')),
+                ('max_time', models.FloatField(default=0, help_text='Slowest response time in milliseconds')),
+                ('le_25', models.FloatField(default=0)),
+                ('le_50', models.FloatField(default=0)),
+                ('le_100', models.FloatField(default=0)),
+                ('le_250', models.FloatField(default=0)),
+                ('le_500', models.FloatField(default=0)),
+                ('le_1000', models.FloatField(default=0)),
+                ('le_2500', models.FloatField(default=0)),
+                ('le_5000', models.FloatField(default=0)),
+                ('gt_5000', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['view_name', 'bucket'], name='dashboard_r_view_na_8595c0_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='requestlogrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'view_name', 'method'), name='unique_request_log_rollup'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_request_log_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='requestlog',
+            name='dashboard_r_user_id_47ccc3_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='requestlog',
+            name='dashboard_r_status__2b7376_idx',
+        ),
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['user', 'timestamp'], name='dashboard_r_user_id_64cf09_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['status_code', 'timestamp'], name='dashboard_r_status__c4ab9d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['view_name', 'timestamp'], name='dashboard_r_view_na_46d404_idx'),
+        ),
+    ]
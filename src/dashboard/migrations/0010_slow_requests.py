@@ -0,0 +1,40 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dashboard', '0009_request_log_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.CharField(db_index=True, max_length=36)),
+                ('path', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('view_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('serializer_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('status_code', models.IntegerField()),
+                ('response_time', models.FloatField(help_text='Response time in milliseconds')),
+                ('timestamp', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('db_query_count', models.PositiveIntegerField(default=0)),
+                ('db_time', models.FloatField(default=0, help_text='Total query time in milliseconds')),
+                ('queries', models.JSONField(blank=True, default=list)),
+                ('queries_truncated', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='slow_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['view_name', 'timestamp'], name='dashboard_s_view_na_a59858_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('accounts', '0001_initial'),
+        ('dashboard', '0011_stats_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnrollmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('year_id', models.BigIntegerField(blank=True, null=True)),
+                ('type_education_id', models.BigIntegerField(blank=True, null=True)),
+                ('created', models.IntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('declined', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='courses.course')),
+                ('teacher', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.teacher')),
+            ],
+            options={
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['teacher', 'day'], name='dashboard_e_teacher_8a65ae_idx'), models.Index(fields=['year_id', 'day'], name='dashboard_e_year_id_23272b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='enrollmentrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'course', 'teacher'), name='unique_enrollment_rollup'),
+        ),
+    ]
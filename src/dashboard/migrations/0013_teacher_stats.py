@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-18 17:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('dashboard', '0012_enrollment_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('groups', models.IntegerField(default=0)),
+                ('active_groups', models.IntegerField(default=0)),
+                ('total_capacity', models.BigIntegerField(default=0)),
+                ('confirmed', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('declined', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='accounts.teacher')),
+            ],
+        ),
+    ]
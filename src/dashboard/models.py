@@ -1,15 +1,19 @@
 from django.db import models
 
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
 class RequestLog(models.Model):
     # Who made the request
+    # No database constraint: logs may be routed to their own database
+    # (see dashboard.routers). dashboard.signals clears it on user delete.
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         null=True,
         blank=True,
-        on_delete=models.SET_NULL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name='request_logs'
     )
     request_id = models.CharField(max_length=36, default=uuid.uuid4, blank=True, null=True)
@@ -29,18 +33,205 @@ class RequestLog(models.Model):
     status_code = models.IntegerField()
     response_time = models.FloatField(help_text="Response time in milliseconds")
     
-    # Timestamps
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Timestamps (set when the request is handled, not when a buffered
+    # record is flushed, hence default instead of auto_now_add)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     
+    # Capped at REQUEST_LOG_BODY_MAX_BYTES (see dashboard.body_capture); the
+    # size and hash describe the full body when it was larger than that
     request_body = models.TextField(null=True, blank=True)
+    request_body_size = models.PositiveIntegerField(null=True, blank=True)
+    request_body_sha256 = models.CharField(max_length=64, null=True, blank=True)
+    # Set instead of request_body when compression is enabled (see
+    # dashboard.compression); use get_request_body() to read either form
+    request_body_compressed = models.BinaryField(null=True, blank=True)
+    request_body_codec = models.CharField(max_length=10, null=True, blank=True)
+
+    # Why the request was logged (see dashboard.sampling) and the sampling
+    # rate in effect, so sampled rows can be weighted back up (1 / rate)
+    log_reason = models.CharField(max_length=10, null=True, blank=True)
+    sample_rate = models.FloatField(null=True, blank=True)
+
+    # Database work done by the view (see dashboard.instrumentation)
+    db_query_count = models.PositiveIntegerField(null=True, blank=True)
+    db_time = models.FloatField(null=True, blank=True, help_text="Total query time in milliseconds")
+    db_slowest_time = models.FloatField(null=True, blank=True, help_text="Slowest query time in milliseconds")
+    db_slowest_query = models.TextField(null=True, blank=True)
 
     class Meta:
         ordering = ['-timestamp']
+        # Composite indexes follow RequestLogFilter: equality filter first,
+        # then timestamp, which the list is ordered and paginated by.
         indexes = [
-            models.Index(fields=['user']),
+            models.Index(fields=['user', 'timestamp']),
             models.Index(fields=['method']),
-            models.Index(fields=['status_code']),
+            models.Index(fields=['status_code', 'timestamp']),
+            models.Index(fields=['view_name', 'timestamp']),
         ]
     
     def __str__(self):
         return f"{self.method} {self.path} - {self.status_code} ({self.user})"
+
+    def get_request_body(self):
+        from .compression import decode_body
+        return decode_body(self.request_body, self.request_body_compressed, self.request_body_codec)
+
+
+class RequestLogRollup(models.Model):
+    """
+    Per-minute latency summary of the request log, keyed by
+    (bucket, view_name, method) and maintained incrementally as logs are
+    written (see dashboard.rollups). Counts are estimates: a sampled row
+    counts as 1 / sample_rate requests.
+    """
+    #^ Upper bounds (ms) of the latency histogram buckets; le_* / gt_* below
+    LATENCY_BUCKETS = (25, 50, 100, 250, 500, 1000, 2500, 5000)
+    HISTOGRAM_FIELDS = (
+        'le_25', 'le_50', 'le_100', 'le_250', 'le_500',
+        'le_1000', 'le_2500', 'le_5000', 'gt_5000',
+    )
+
+    bucket = models.DateTimeField(help_text="Start of the minute")
+    view_name = models.CharField(max_length=255, blank=True, default='')
+    method = models.CharField(max_length=10)
+
+    samples = models.PositiveIntegerField(default=0, help_text="Logged rows")
+    requests = models.FloatField(default=0)
+    errors = models.FloatField(default=0)
+    total_time = models.FloatField(default=0, help_text="Sum of response times in milliseconds")
+    max_time = models.FloatField(default=0, help_text="Slowest response time in milliseconds")
+
+    le_25 = models.FloatField(default=0)
+    le_50 = models.FloatField(default=0)
+    le_100 = models.FloatField(default=0)
+    le_250 = models.FloatField(default=0)
+    le_500 = models.FloatField(default=0)
+    le_1000 = models.FloatField(default=0)
+    le_2500 = models.FloatField(default=0)
+    le_5000 = models.FloatField(default=0)
+    gt_5000 = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'view_name', 'method'], name='unique_request_log_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['view_name', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%Y-%m-%d %H:%M} {self.method} {self.view_name or '-'} ({self.requests:.0f})"
+
+
+class SlowRequest(models.Model):
+    """
+    Trace of a request slower than SLOW_REQUEST_TRACE['THRESHOLD_MS']: every
+    SQL statement with its duration and the project call site that issued
+    it (see dashboard.instrumentation.QueryTrace). Linked to its RequestLog
+    row, when there is one, through request_id.
+    """
+    request_id = models.CharField(max_length=36, db_index=True)
+    # Same arrangement as RequestLog.user (see dashboard.signals)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='slow_requests'
+    )
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    view_name = models.CharField(max_length=255, null=True, blank=True)
+    serializer_name = models.CharField(max_length=255, null=True, blank=True)
+    status_code = models.IntegerField()
+    response_time = models.FloatField(help_text="Response time in milliseconds")
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+
+    db_query_count = models.PositiveIntegerField(default=0)
+    db_time = models.FloatField(default=0, help_text="Total query time in milliseconds")
+    # [{"sql": ..., "time": ms, "stack": ["app/file.py:42 in func", ...]}, ...]
+    queries = models.JSONField(default=list, blank=True)
+    queries_truncated = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['view_name', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} - {self.response_time:.0f}ms ({self.db_query_count} queries)"
+
+
+class StatsCounter(models.Model):
+    """
+    Named running total (e.g. ``subs_confirmed`` or ``students:year:3``)
+    kept up to date with F() increments by dashboard.counters, so summary
+    endpoints read a few rows instead of counting whole tables. Rebuilt
+    from scratch by ``manage.py reconcile_counters``.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class EnrollmentRollup(models.Model):
+    """
+    Subscriptions created / confirmed / declined per day, course and
+    teacher, by created_at / confirmed_at / declined_at of the rows as they
+    are now. Maintained from ``subscriptions_changed`` (see
+    dashboard.analytics) and rebuilt by ``manage.py rebuild_enrollment_rollups``.
+    year and type_education are copied from the course for filtering.
+    """
+    day = models.DateField()
+    # No database constraints: history outlives deleted courses / teachers
+    course = models.ForeignKey('courses.Course', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    teacher = models.ForeignKey('accounts.Teacher', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    year_id = models.BigIntegerField(null=True, blank=True)
+    type_education_id = models.BigIntegerField(null=True, blank=True)
+
+    created = models.IntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    declined = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'course', 'teacher'], name='unique_enrollment_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['teacher', 'day']),
+            models.Index(fields=['year_id', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} course {self.course_id} teacher {self.teacher_id}: +{self.created}/{self.confirmed}/{self.declined}"
+
+
+class TeacherStats(models.Model):
+    """
+    Per-teacher totals over their groups and the subscriptions to them,
+    kept current with F() increments by dashboard.teacher_stats from the
+    CourseGroup signals and ``subscriptions_changed``. Rebuilt by
+    ``manage.py reconcile_teacher_stats``. The fill ratio is derived from
+    ``confirmed`` and ``total_capacity`` when read.
+    """
+    teacher = models.OneToOneField('accounts.Teacher', on_delete=models.CASCADE, related_name='stats')
+    groups = models.IntegerField(default=0)
+    active_groups = models.IntegerField(default=0)
+    total_capacity = models.BigIntegerField(default=0)
+    confirmed = models.IntegerField(default=0)
+    pending = models.IntegerField(default=0)
+    declined = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Teacher {self.teacher_id}: {self.groups} groups, {self.confirmed}/{self.total_capacity} confirmed"
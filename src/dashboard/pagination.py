@@ -0,0 +1,222 @@
+"""
+Pagination for the request log list.
+
+``CustomPageNumberPagination`` runs a ``COUNT(*)`` over the filtered log
+and an ``OFFSET`` scan on every page, both of which grow with the table.
+Two cheaper modes are available through ``?pagination=``:
+
+* ``cursor``: keyset pagination on ``(-timestamp, -id)``. Each page is
+  ``WHERE (timestamp, id) < (last seen)`` on the composite indexes, so
+  page 10,000 costs the same as page one. There is no count.
+* ``estimate``: page numbers as before, but ``count`` is an estimate for
+  unfiltered lists and is capped at ``ESTIMATE_COUNT_CAP`` for filtered ones.
+
+Archived logs (dashboard.archive) are paged with ``ArchivedLogsPagination``,
+whose count is a lower bound when rows have to be decompressed to be
+filtered.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Max, Min, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from accounts.pagination import CustomPageNumberPagination
+
+ESTIMATE_COUNT_CAP = 10000
+
+
+class RequestLogCursorPagination(BasePagination):
+    """
+    Keyset pagination on ``(-timestamp, -id)``. The cursor is the
+    timestamp/id of the last row of the page (or first row, when going
+    backwards), so no OFFSET is ever used.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 100
+    page_size_query_param = 'per_page'
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def encode_cursor(self, log, reverse):
+        payload = {'t': log.timestamp.isoformat(), 'i': log.pk, 'r': int(reverse)}
+        token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            timestamp = parse_datetime(payload['t'])
+            if timestamp is None:
+                raise ValueError(token)
+            return timestamp, int(payload['i']), bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        reverse = False
+        if cursor is not None:
+            timestamp, pk, reverse = cursor
+            if reverse:
+                queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk))
+            else:
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk))
+
+        ordering = ('timestamp', 'pk') if reverse else ('-timestamp', '-pk')
+        # One extra row tells whether there is another page in this direction
+        results = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None and (has_more if reverse else True)
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+def estimate_table_rows(queryset):
+    """
+    Rough row count of the whole table: ``reltuples`` on PostgreSQL,
+    otherwise the primary-key span, which retention keeps close to the
+    real count because it deletes from the low end.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    span = model._default_manager.using(queryset.db).aggregate(low=Min('pk'), high=Max('pk'))
+    if span['low'] is None:
+        return 0
+    return span['high'] - span['low'] + 1
+
+
+class EstimatedPage(Page):
+    def has_next(self):
+        if self.paginator.count_is_estimate:
+            return len(self.object_list) == self.paginator.per_page
+        return super().has_next()
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    count_cap = ESTIMATE_COUNT_CAP
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            self._count_is_estimate = True
+            return estimate_table_rows(queryset)
+        # COUNT over a LIMITed subquery stops after count_cap + 1 rows
+        capped = queryset.order_by()[:self.count_cap + 1].count()
+        self._count_is_estimate = capped > self.count_cap
+        return min(capped, self.count_cap)
+
+    @property
+    def count_is_estimate(self):
+        self.count
+        return self._count_is_estimate
+
+    def page(self, number):
+        if not self.count_is_estimate:
+            return super().page(number)
+        # The real last page may lie beyond num_pages, so only the lower
+        # bound is checked and the slice is not clamped to the count.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class EstimatedCountPagination(CustomPageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_estimate', self.page.paginator.count_is_estimate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class ArchivedLogsPaginator(EstimatedCountPaginator):
+    """
+    Pages of an ``ArchivedLogs``. A page filtered on decompressed rows
+    only scans up to its own last row, so until the scan reaches the end
+    ``count`` is the matches found so far and flagged as an estimate.
+    """
+
+    @property
+    def count(self):
+        return self.object_list.known_count()[0]
+
+    @property
+    def count_is_estimate(self):
+        return self.object_list.known_count()[1]
+
+
+class ArchivedLogsPagination(EstimatedCountPagination):
+    django_paginator_class = ArchivedLogsPaginator
+
+
+REQUEST_LOG_PAGINATORS = {
+    'page': CustomPageNumberPagination,
+    'cursor': RequestLogCursorPagination,
+    'estimate': EstimatedCountPagination,
+}
@@ -0,0 +1,140 @@
+"""
+Retention for the request log.
+
+Rows are removed in primary-key chunks, each deleted in its own short
+transaction, with an optional pause in between. Every chunk is a single
+``DELETE ... WHERE id IN (...)`` (RequestLog has no dependent rows, so
+Django's collector takes the fast-delete path) and the write lock is only
+held for that chunk. Enrollment writes can run between chunks even when
+the log shares the SQLite file with the rest of the app.
+
+``prune_request_logs`` applies ``settings.REQUEST_LOG_RETENTION``. With
+``REQUEST_LOG_ARCHIVE['ENABLED']`` rows past the age limit are moved to the
+archive (see dashboard.archive) instead of being deleted outright. It runs
+from the management command of the same name (e.g. from cron) and from
+``RequestLogDeleteView`` for explicit date ranges.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import RequestLog, RequestLogRollup, SlowRequest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_SETTINGS = {
+    'MAX_AGE_DAYS': None,         # delete logs older than this
+    'MAX_ROWS': None,             # keep at most this many of the newest logs
+    'ROLLUP_MAX_AGE_DAYS': None,  # delete latency rollups older than this
+    'CHUNK_SIZE': 1000,           # rows per DELETE / transaction
+    'PAUSE': 0.05,                # seconds to sleep between chunks
+}
+
+
+def get_retention_settings():
+    return {**DEFAULT_RETENTION_SETTINGS, **getattr(settings, 'REQUEST_LOG_RETENTION', {})}
+
+
+def delete_in_chunks(queryset, chunk_size=1000, pause=0.0):
+    """
+    Delete every row of ``queryset`` in primary-key order, ``chunk_size``
+    rows per transaction. Returns the number of rows deleted.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    queryset = queryset.using(using).order_by('pk')
+    deleted = 0
+    while True:
+        with transaction.atomic(using=using):
+            pks = list(queryset.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            count, _ = model._default_manager.using(using).filter(pk__in=pks).delete()
+        deleted += count
+        if len(pks) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def rows_over_limit(max_rows):
+    """Queryset of the logs beyond the newest ``max_rows`` (by primary key)."""
+    using = router.db_for_read(RequestLog)
+    boundary = (
+        RequestLog.objects.using(using)
+        .order_by('-pk')
+        .values_list('pk', flat=True)[max_rows:max_rows + 1]
+    )
+    boundary = list(boundary)
+    if not boundary:
+        return RequestLog.objects.none()
+    return RequestLog.objects.filter(pk__lte=boundary[0])
+
+
+def prune_request_logs(max_age_days=None, max_rows=None, rollup_max_age_days=None,
+                       chunk_size=None, pause=None, now=None):
+    """
+    Apply the retention policy; arguments left as None fall back to
+    ``settings.REQUEST_LOG_RETENTION``. Returns ``{'age', 'rows', 'rollups'}``
+    deletion counts (``'age'`` counts archived rows when archiving is on);
+    slow-request traces follow the logs' age limit and are
+    counted under ``'age'``.
+    """
+    conf = get_retention_settings()
+    max_age_days = conf['MAX_AGE_DAYS'] if max_age_days is None else max_age_days
+    max_rows = conf['MAX_ROWS'] if max_rows is None else max_rows
+    rollup_max_age_days = conf['ROLLUP_MAX_AGE_DAYS'] if rollup_max_age_days is None else rollup_max_age_days
+    chunk_size = conf['CHUNK_SIZE'] if chunk_size is None else chunk_size
+    pause = conf['PAUSE'] if pause is None else pause
+    now = now or timezone.now()
+
+    result = {'age': 0, 'rows': 0, 'rollups': 0}
+    if max_age_days is not None:
+        cutoff = now - timedelta(days=max_age_days)
+        from .archive import archive_request_logs, get_archive_settings, prune_archive
+        archive = get_archive_settings()
+        if archive['ENABLED']:
+            result['age'] = archive_request_logs(cutoff, chunk_size, pause)
+            if archive['KEEP_DAYS'] is not None:
+                prune_archive(archive['KEEP_DAYS'])
+        else:
+            result['age'] = delete_in_chunks(
+                RequestLog.objects.filter(timestamp__lt=cutoff), chunk_size, pause
+            )
+        result['age'] += delete_in_chunks(
+            SlowRequest.objects.filter(timestamp__lt=cutoff), chunk_size, pause
+        )
+    if max_rows is not None:
+        result['rows'] = delete_in_chunks(rows_over_limit(max_rows), chunk_size, pause)
+    if rollup_max_age_days is not None:
+        cutoff = now - timedelta(days=rollup_max_age_days)
+        result['rollups'] = delete_in_chunks(
+            RequestLogRollup.objects.filter(bucket__lt=cutoff), chunk_size, pause
+        )
+    return result
+
+
+def delete_logs_in_background(queryset, chunk_size=None, pause=None):
+    """Run ``delete_in_chunks`` on a daemon thread and return the thread."""
+    conf = get_retention_settings()
+    chunk_size = conf['CHUNK_SIZE'] if chunk_size is None else chunk_size
+    pause = conf['PAUSE'] if pause is None else pause
+
+    def run():
+        try:
+            deleted = delete_in_chunks(queryset, chunk_size, pause)
+            logger.info("Deleted %d request logs in the background", deleted)
+        except Exception:
+            logger.exception("Background request log deletion failed")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='request-log-purge', daemon=True)
+    thread.start()
+    return thread
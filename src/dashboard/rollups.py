@@ -0,0 +1,136 @@
+"""
+Per-minute latency rollups of the request log.
+
+``record_rollups`` folds a batch of freshly written RequestLog rows into
+RequestLogRollup with one UPDATE (or INSERT) per (minute, view, method)
+key, using F() increments so concurrent writers don't lose counts.
+``latency_summary`` turns the histogram columns back into p50/p95/p99.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Greatest
+
+from .models import RequestLogRollup
+from .sampling import REASON_SAMPLED
+
+ERROR_STATUS = 500
+PERCENTILES = (50, 95, 99)
+
+
+def minute_bucket(timestamp):
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def histogram_field(response_time):
+    for bound, field in zip(RequestLogRollup.LATENCY_BUCKETS, RequestLogRollup.HISTOGRAM_FIELDS):
+        if response_time <= bound:
+            return field
+    return RequestLogRollup.HISTOGRAM_FIELDS[-1]
+
+
+def log_weight(log):
+    if log.log_reason == REASON_SAMPLED and log.sample_rate:
+        return 1.0 / log.sample_rate
+    return 1.0
+
+
+def aggregate_logs(logs):
+    """Group logs by rollup key; returns ``{key: {field: value}}``."""
+    rows = defaultdict(lambda: defaultdict(float))
+    for log in logs:
+        key = (minute_bucket(log.timestamp), log.view_name or '', log.method)
+        weight = log_weight(log)
+        row = rows[key]
+        row['samples'] += 1
+        row['requests'] += weight
+        if log.status_code >= ERROR_STATUS:
+            row['errors'] += weight
+        row['total_time'] += log.response_time * weight
+        row['max_time'] = max(row['max_time'], log.response_time)
+        row[histogram_field(log.response_time)] += weight
+    return rows
+
+
+def _increment(key, values, using):
+    bucket, view_name, method = key
+    updates = {
+        field: F(field) + value for field, value in values.items() if field != 'max_time'
+    }
+    updates['max_time'] = Greatest(F('max_time'), values['max_time'])
+    return RequestLogRollup.objects.using(using).filter(
+        bucket=bucket, view_name=view_name, method=method
+    ).update(**updates)
+
+
+def record_rollups(logs):
+    """Add ``logs`` (RequestLog instances) to their per-minute rollups."""
+    rows = aggregate_logs(logs)
+    if not rows:
+        return
+    using = router.db_for_write(RequestLogRollup)
+    with transaction.atomic(using=using):
+        for key, values in rows.items():
+            if _increment(key, values, using):
+                continue
+            bucket, view_name, method = key
+            try:
+                with transaction.atomic(using=using):
+                    RequestLogRollup.objects.using(using).create(
+                        bucket=bucket, view_name=view_name, method=method, **values
+                    )
+            except IntegrityError:
+                # Another writer created the row in the meantime
+                _increment(key, values, using)
+
+
+def histogram_percentile(counts, max_time, percentile):
+    """
+    Estimate a percentile from bucket counts, interpolating linearly inside
+    the bucket it falls in. The open-ended last bucket is capped at max_time.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    target = total * percentile / 100
+    lower = 0.0
+    bounds = list(RequestLogRollup.LATENCY_BUCKETS) + [max(max_time, RequestLogRollup.LATENCY_BUCKETS[-1])]
+    seen = 0.0
+    for count, upper in zip(counts, bounds):
+        if count and seen + count >= target:
+            return round(min(lower + (upper - lower) * (target - seen) / count, max_time), 2)
+        seen += count
+        lower = upper
+    return round(max_time, 2)
+
+
+def latency_summary(queryset):
+    """
+    Summarise a RequestLogRollup queryset per (view_name, method) with
+    request/error counts, average, max and p50/p95/p99 response times.
+    """
+    fields = ['requests', 'errors', 'total_time', *RequestLogRollup.HISTOGRAM_FIELDS]
+    rows = queryset.order_by().values('view_name', 'method').annotate(
+        max_response_time=Max('max_time'),
+        **{f'sum_{field}': Sum(field) for field in fields},
+    )
+    results = []
+    for row in rows:
+        requests = row['sum_requests'] or 0
+        counts = [row[f'sum_{field}'] or 0 for field in RequestLogRollup.HISTOGRAM_FIELDS]
+        max_time = row['max_response_time'] or 0
+        result = {
+            'view_name': row['view_name'] or None,
+            'method': row['method'],
+            'requests': round(requests),
+            'errors': round(row['sum_errors'] or 0),
+            'error_rate': round((row['sum_errors'] or 0) / requests, 4) if requests else None,
+            'avg_response_time': round(row['sum_total_time'] / requests, 2) if requests else None,
+            'max_response_time': round(max_time, 2),
+        }
+        for percentile in PERCENTILES:
+            result[f'p{percentile}'] = histogram_percentile(counts, max_time, percentile)
+        results.append(result)
+    results.sort(key=lambda r: r['requests'], reverse=True)
+    return results
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+#^ Models that are stored in the request-log database
+LOG_MODELS = {
+    'dashboard.requestlog',
+    'dashboard.requestlogrollup',
+    'dashboard.slowrequest',
+}
+
+
+def get_log_database():
+    return getattr(settings, 'REQUEST_LOG_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def is_log_model(model_or_obj):
+    # _meta is looked up on the object so lazy wrappers (request.user) work
+    return model_or_obj._meta.label_lower in LOG_MODELS
+
+
+class RequestLogRouter:
+    """
+    Route request-log models (reads, writes and migrations) to the
+    ``settings.REQUEST_LOG_DATABASE`` alias so log volume does not compete
+    with enrollment writes for the default database. Every other model is
+    left to the default routing.
+    """
+
+    def db_for_read(self, model, **hints):
+        if is_log_model(model):
+            return get_log_database()
+        instance = hints.get('instance')
+        if instance is not None and is_log_model(instance):
+            # Related objects of a log row (e.g. RequestLog.user) live in the
+            # default database, not in the database the log row came from.
+            return DEFAULT_DB_ALIAS
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_log_model(obj1) or is_log_model(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        log_db = get_log_database()
+        if model_name is not None and f'{app_label}.{model_name}' in LOG_MODELS:
+            return db == log_db
+        if log_db != DEFAULT_DB_ALIAS and db == log_db:
+            return False
+        return None
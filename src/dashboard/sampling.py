@@ -0,0 +1,108 @@
+"""
+Sampling policy for RequestLogMiddleware.
+
+Staff write requests are always logged. Every other request (GETs,
+anonymous and non-staff users) is sampled according to
+``settings.REQUEST_LOG_SAMPLING``:
+
+    REQUEST_LOG_SAMPLING = {
+        'DEFAULT_RATE': 0.0,
+        'RULES': [
+            {'path_prefix': '/courses/subscriptions/', 'rate': 0.02},
+            {'view_name': 'dashboard.views.DashboardSubscriptionsView', 'rate': 0.1},
+        ],
+        'ALWAYS_LOG_ERRORS': True,
+        'ERROR_STATUS': 500,
+        'SLOW_REQUEST_MS': 1000,
+    }
+
+Rules are checked in order and the first match wins. ``view_name`` rules
+resolve the URL, so ``path_prefix`` rules are cheaper. Requests that lose
+the sampling roll are still logged when they fail (``ALWAYS_LOG_ERRORS``)
+or are slower than ``SLOW_REQUEST_MS``.
+"""
+import random
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+DEFAULT_SAMPLING_SETTINGS = {
+    'DEFAULT_RATE': 0.0,
+    'RULES': [],
+    'ALWAYS_LOG_ERRORS': True,
+    'ERROR_STATUS': 500,
+    'SLOW_REQUEST_MS': None,
+}
+
+#^ Why a request ended up in the log (RequestLog.log_reason)
+REASON_WRITE = 'write'
+REASON_SAMPLED = 'sampled'
+REASON_ERROR = 'error'
+REASON_SLOW = 'slow'
+
+
+def view_name_for(view_class):
+    return f"{view_class.__module__}.{view_class.__name__}"
+
+
+class SamplingPolicy:
+    def __init__(self, default_rate=0.0, rules=(), always_log_errors=True,
+                 error_status=500, slow_request_ms=None):
+        self.default_rate = default_rate
+        self.path_rules = []
+        self.view_rules = {}
+        for rule in rules:
+            if 'path_prefix' in rule:
+                self.path_rules.append((rule['path_prefix'], rule['rate']))
+            elif 'view_name' in rule:
+                self.view_rules[rule['view_name']] = rule['rate']
+            else:
+                raise ValueError(f"Sampling rule needs 'path_prefix' or 'view_name': {rule!r}")
+        self.always_log_errors = always_log_errors
+        self.error_status = error_status
+        self.slow_request_ms = slow_request_ms
+
+    @classmethod
+    def from_settings(cls):
+        conf = {**DEFAULT_SAMPLING_SETTINGS, **getattr(settings, 'REQUEST_LOG_SAMPLING', {})}
+        return cls(
+            default_rate=conf['DEFAULT_RATE'],
+            rules=conf['RULES'],
+            always_log_errors=conf['ALWAYS_LOG_ERRORS'],
+            error_status=conf['ERROR_STATUS'],
+            slow_request_ms=conf['SLOW_REQUEST_MS'],
+        )
+
+    @property
+    def can_force(self):
+        """True if an unsampled request may still be logged after the fact."""
+        return self.always_log_errors or self.slow_request_ms is not None
+
+    def rate_for(self, request):
+        for prefix, rate in self.path_rules:
+            if request.path.startswith(prefix):
+                return rate
+        if self.view_rules:
+            try:
+                func = resolve(request.path_info).func
+            except Resolver404:
+                return self.default_rate
+            view_class = getattr(func, 'view_class', None) or getattr(func, 'cls', None)
+            if view_class is not None:
+                rate = self.view_rules.get(view_name_for(view_class))
+                if rate is not None:
+                    return rate
+        return self.default_rate
+
+    def roll(self, request):
+        """Return ``(sampled, rate)`` for a request that is not always logged."""
+        rate = self.rate_for(request)
+        return (rate >= 1 or (rate > 0 and random.random() < rate)), rate
+
+    def forced_reason(self, status_code, response_time_ms):
+        """Reason to log an unsampled request anyway, or None."""
+        if self.always_log_errors and status_code >= self.error_status:
+            return REASON_ERROR
+        if self.slow_request_ms is not None and response_time_ms >= self.slow_request_ms:
+            return REASON_SLOW
+        return None
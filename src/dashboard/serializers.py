@@ -4,7 +4,7 @@ from about.models import AboutPage, Feature
 from courses.models import Course, CourseGroup, CourseGroupSubscription, CourseGroupTime
 from django.contrib.auth.models import User
 
-from dashboard.models import RequestLog
+from dashboard.models import RequestLog, SlowRequest
 
 class YearSerializer(serializers.ModelSerializer):
     """Serializer for the Year model"""
@@ -293,10 +293,10 @@ class CourseGroupSerializer(serializers.ModelSerializer):
         ]
     
     def get_confirmed_subscriptions(self, obj):
-        return obj.coursegroupsubscription_set.filter(is_confirmed=True).count()
+        return obj.confirmed_count
     
     def get_available_capacity(self, obj):
-        return obj.capacity - self.get_confirmed_subscriptions(obj)
+        return obj.available_capacity()
 
 
 class CourseSerializerDetail(serializers.ModelSerializer):
@@ -348,11 +348,37 @@ class UserSerializer(serializers.ModelSerializer):
 
 class RequestLogSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    # Decompressed transparently when the body is stored compressed
+    request_body = serializers.CharField(source='get_request_body', read_only=True)
     
     class Meta:
         model = RequestLog
+        exclude = ['request_body_compressed', 'request_body_codec']
+
+class SlowRequestListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SlowRequest
+        exclude = ['queries']
+
+class SlowRequestSerializer(serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+    repeated_queries = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SlowRequest
         fields = '__all__'
 
+    def get_repeated_queries(self, obj):
+        # Statements issued more than once from the same call site, usually an N+1
+        groups = {}
+        for query in obj.queries:
+            key = (query['sql'], query['stack'][0] if query['stack'] else None)
+            group = groups.setdefault(key, {'sql': key[0], 'call_site': key[1], 'count': 0, 'time': 0.0})
+            group['count'] += 1
+            group['time'] += query['time']
+        repeated = [group for group in groups.values() if group['count'] > 1]
+        return sorted(repeated, key=lambda group: group['time'], reverse=True)
+
 class SubscriptionSimpleSerializer(serializers.ModelSerializer):
     student = serializers.SerializerMethodField()
     course_group = serializers.SerializerMethodField()
@@ -417,8 +443,7 @@ class SubscriptionSimpleSerializer(serializers.ModelSerializer):
             }
 
         # Capacity info
-        confirmed_count = g.coursegroupsubscription_set.filter(is_confirmed=True).count() if g else 0
-        available_capacity = (g.capacity - confirmed_count) if g else 0
+        available_capacity = g.available_capacity() if g else 0
         has_seats = available_capacity > 0
 
         # Image absolute URL if possible
@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from accounts.models import Student, Teacher
+from courses.models import Course, CourseGroup, CourseGroupSubscription, CourseGroupTime
+from courses.signals import STATUS_CONFIRMED, subscriptions_changed
+
+from . import counters, teacher_stats
+from .analytics import record_enrollment_changes
+from .caching import DASHBOARD_STATS, TIMESLOT_HEATMAP, invalidate
+from .models import RequestLog, SlowRequest, TeacherStats
+
+STATS_MODELS = (Student, Teacher, Course, CourseGroup, CourseGroupSubscription)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def detach_request_logs(sender, instance, **kwargs):
+    # RequestLog.user has no database constraint (the logs may live in
+    # another database), so clear the reference by hand.
+    RequestLog.objects.filter(user_id=instance.pk).update(user=None)
+    SlowRequest.objects.filter(user_id=instance.pk).update(user=None)
+
+
+def invalidate_dashboard_stats(sender, **kwargs):
+    # After commit, so a rebuild can't cache the state before the change
+    transaction.on_commit(lambda: invalidate(DASHBOARD_STATS))
+
+
+for model in STATS_MODELS:
+    post_save.connect(invalidate_dashboard_stats, sender=model, dispatch_uid=f'dashboard_stats_save_{model.__name__}')
+    post_delete.connect(invalidate_dashboard_stats, sender=model, dispatch_uid=f'dashboard_stats_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=CourseGroup)
+@receiver(post_delete, sender=CourseGroup)
+@receiver(post_save, sender=CourseGroupTime)
+@receiver(post_delete, sender=CourseGroupTime)
+def invalidate_timeslot_heatmap(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate(TIMESLOT_HEATMAP))
+
+
+#^---------------------counters-----------------
+# Old field values are read in pre_save so post_save can apply the
+# difference; the increments run inside the save's transaction.
+
+COUNTER_FIELDS = {
+    Student: ('active', 'block', 'year_id', 'type_education_id'),
+    Course: ('year_id', 'type_education_id'),
+    CourseGroup: ('is_active', 'teacher_id', 'capacity'),
+}
+
+
+def row_counters(instance, values):
+    if isinstance(instance, Student):
+        return counters.student_counters(
+            values['active'], values['block'], values['year_id'], values['type_education_id']
+        )
+    if isinstance(instance, Course):
+        return counters.course_counters(values['type_education_id'])
+    return counters.group_counters(values['is_active'])
+
+
+def current_values(instance):
+    return {field: getattr(instance, field) for field in COUNTER_FIELDS[type(instance)]}
+
+
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=Course)
+@receiver(pre_save, sender=CourseGroup)
+def remember_counted_fields(sender, instance, raw=False, **kwargs):
+    instance._counter_values = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._counter_values = (
+        sender._default_manager.filter(pk=instance.pk).values(*COUNTER_FIELDS[sender]).first()
+    )
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=CourseGroup)
+def count_saved_row(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_counter_values', None)
+    new = current_values(instance)
+    if not created and old == new:
+        return
+    with transaction.atomic():
+        deltas = counters.diff(row_counters(instance, new), row_counters(instance, old) if old else {})
+        if sender is Course and old and old != new:
+            # Confirmed subscriptions are counted per course year / type
+            confirmed = CourseGroupSubscription.objects.filter(course=instance, is_confirmed=True).count()
+            if confirmed:
+                deltas.update({name: value * confirmed for name, value in counters.diff(
+                    counters.subscription_counters(STATUS_CONFIRMED, new['year_id'], new['type_education_id']),
+                    counters.subscription_counters(STATUS_CONFIRMED, old['year_id'], old['type_education_id']),
+                ).items()})
+        counters.apply_deltas(deltas)
+        if sender is CourseGroup:
+            teacher_stats.apply_teacher_deltas(teacher_stats.group_change_deltas(instance.pk, old, new))
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=CourseGroup)
+def count_deleted_row(sender, instance, **kwargs):
+    values = current_values(instance)
+    counters.apply_deltas(counters.diff({}, row_counters(instance, values)))
+    if sender is CourseGroup:
+        teacher_stats.apply_teacher_deltas(teacher_stats.group_change_deltas(instance.pk, values, None))
+
+
+@receiver(post_save, sender=Teacher)
+def count_saved_teacher(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.apply_deltas({'teachers_total': 1})
+        TeacherStats.objects.get_or_create(teacher=instance)
+
+
+@receiver(post_delete, sender=Teacher)
+def count_deleted_teacher(sender, instance, **kwargs):
+    counters.apply_deltas({'teachers_total': -1})
+
+
+@receiver(subscriptions_changed)
+def count_subscription_changes(sender, changes, **kwargs):
+    counters.apply_deltas(counters.subscription_change_deltas(changes))
+    teacher_stats.apply_teacher_deltas(teacher_stats.subscription_change_deltas(changes))
+    record_enrollment_changes(changes)
+    transaction.on_commit(lambda: invalidate(DASHBOARD_STATS))
+    if any(STATUS_CONFIRMED in (change.old_status, change.new_status) for change in changes):
+        transaction.on_commit(lambda: invalidate(TIMESLOT_HEATMAP))
@@ -0,0 +1,175 @@
+"""
+Per-teacher statistics, stored in TeacherStats.
+
+Like dashboard.counters, every change is turned into deltas per teacher
+(``{teacher_id: Counter(metric=delta)}``) and added with one
+``UPDATE ... SET metric = metric + n`` per teacher inside the caller's
+transaction:
+
+* ``subscription_change_deltas`` for ``subscriptions_changed``,
+* ``group_change_deltas`` for a CourseGroup created, deleted, deactivated,
+  resized or moved to another teacher (its subscriptions move with it).
+
+Increments only touch existing rows. A teacher gets a zero row when
+created; teachers without one (created before the table existed) are
+computed from the tables by ``ensure_teacher_stats``, and
+``reconcile_teacher_stats`` recomputes everyone.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from accounts.models import Teacher
+from courses.models import CourseGroup, CourseGroupSubscription
+from courses.signals import STATUS_CONFIRMED, STATUS_DECLINED, STATUS_PENDING, subscription_status
+
+from .models import TeacherStats
+
+STATUS_METRICS = {STATUS_CONFIRMED: 'confirmed', STATUS_PENDING: 'pending', STATUS_DECLINED: 'declined'}
+METRICS = ('groups', 'active_groups', 'total_capacity', 'confirmed', 'pending', 'declined')
+#^ TeacherStatsView ?ordering= values (its response keys) and the fields they sort on
+ORDERING_FIELDS = {
+    'name': 'teacher__name',
+    'order': 'teacher__order',
+    'total_groups': 'groups',
+    'active_groups': 'active_groups',
+    'confirmed_subscriptions': 'confirmed',
+    'unconfirmed_subscriptions': 'unconfirmed',
+    'pending_subscriptions': 'pending',
+    'declined_subscriptions': 'declined',
+    'total_capacity': 'total_capacity',
+    'fill_ratio': 'fill_ratio',
+}
+
+
+def group_stats(is_active, capacity):
+    return Counter({'groups': 1, 'active_groups': int(bool(is_active)), 'total_capacity': capacity or 0})
+
+
+def subscription_change_deltas(changes):
+    """Deltas for a batch of SubscriptionChange, one query for the groups' teachers."""
+    teachers = dict(
+        CourseGroup.objects.filter(id__in={change.course_group_id for change in changes})
+        .values_list('id', 'teacher_id')
+    )
+    deltas = {}
+    for change in changes:
+        teacher_id = teachers.get(change.course_group_id)
+        if teacher_id is None:
+            continue
+        counts = deltas.setdefault(teacher_id, Counter())
+        if change.new_status:
+            counts[STATUS_METRICS[change.new_status]] += 1
+        if change.old_status:
+            counts[STATUS_METRICS[change.old_status]] -= 1
+    return deltas
+
+
+def group_subscription_counts(group_id):
+    counts = Counter()
+    rows = (
+        CourseGroupSubscription.objects.filter(course_group_id=group_id)
+        .values('is_confirmed', 'is_declined').annotate(n=Count('id')).order_by()
+    )
+    for row in rows:
+        counts[STATUS_METRICS[subscription_status(row['is_confirmed'], row['is_declined'])]] += row['n']
+    return counts
+
+
+def group_change_deltas(group_id, old, new):
+    """
+    Deltas for a CourseGroup going from ``old`` to ``new`` values
+    (``teacher_id``, ``is_active``, ``capacity``; None = not existing).
+    """
+    deltas = {}
+    if old:
+        deltas.setdefault(old['teacher_id'], Counter()).subtract(group_stats(old['is_active'], old['capacity']))
+    if new:
+        deltas.setdefault(new['teacher_id'], Counter()).update(group_stats(new['is_active'], new['capacity']))
+    if old and new and old['teacher_id'] != new['teacher_id']:
+        # The group's subscriptions are now the new teacher's
+        moved = group_subscription_counts(group_id)
+        deltas[old['teacher_id']].subtract(moved)
+        deltas[new['teacher_id']].update(moved)
+    return deltas
+
+
+def apply_teacher_deltas(deltas):
+    with transaction.atomic():
+        # Sorted so concurrent writers lock rows in the same order
+        for teacher_id in sorted(deltas):
+            updates = {metric: F(metric) + delta for metric, delta in deltas[teacher_id].items() if delta}
+            if updates:
+                TeacherStats.objects.filter(teacher_id=teacher_id).update(updated_at=timezone.now(), **updates)
+
+
+def compute_teacher_stats(teacher_ids=None):
+    """``{teacher_id: Counter}`` recomputed from the tables (all teachers, or ``teacher_ids``)."""
+    groups = CourseGroup.objects.order_by()
+    subscriptions = CourseGroupSubscription.objects.order_by()
+    teachers = Teacher.objects.all()
+    if teacher_ids is not None:
+        groups = groups.filter(teacher_id__in=teacher_ids)
+        subscriptions = subscriptions.filter(course_group__teacher_id__in=teacher_ids)
+        teachers = teachers.filter(id__in=teacher_ids)
+
+    stats = {teacher_id: Counter() for teacher_id in teachers.values_list('id', flat=True)}
+    group_rows = groups.values('teacher_id').annotate(
+        groups=Count('id'),
+        active_groups=Count('id', filter=Q(is_active=True)),
+        total_capacity=Sum('capacity'),
+    )
+    for row in group_rows:
+        stats.setdefault(row['teacher_id'], Counter()).update(
+            {metric: row[metric] or 0 for metric in ('groups', 'active_groups', 'total_capacity')}
+        )
+    subscription_rows = (
+        subscriptions.values('course_group__teacher_id', 'is_confirmed', 'is_declined').annotate(n=Count('id'))
+    )
+    for row in subscription_rows:
+        metric = STATUS_METRICS[subscription_status(row['is_confirmed'], row['is_declined'])]
+        stats.setdefault(row['course_group__teacher_id'], Counter())[metric] += row['n']
+    return stats
+
+
+def reconcile_teacher_stats(teacher_ids=None):
+    """
+    Recompute the rows of every teacher (or ``teacher_ids``), creating
+    missing ones. Returns ``{teacher_id: {metric: (old, new)}}`` for the
+    rows that were off or missing.
+    """
+    with transaction.atomic():
+        rows = TeacherStats.objects.select_for_update()
+        if teacher_ids is not None:
+            rows = rows.filter(teacher_id__in=teacher_ids)
+        stored = {row.teacher_id: row for row in rows}
+        drift = {}
+        updated, created = [], []
+        for teacher_id, fresh in compute_teacher_stats(teacher_ids).items():
+            row = stored.get(teacher_id)
+            changes = {
+                metric: (getattr(row, metric) if row else None, fresh[metric])
+                for metric in METRICS if row is None or getattr(row, metric) != fresh[metric]
+            }
+            if not changes:
+                continue
+            drift[teacher_id] = changes
+            if row is None:
+                created.append(TeacherStats(teacher_id=teacher_id, **{metric: fresh[metric] for metric in METRICS}))
+                continue
+            for metric, (old, new) in changes.items():
+                setattr(row, metric, new)
+            row.updated_at = timezone.now()
+            updated.append(row)
+        TeacherStats.objects.bulk_update(updated, [*METRICS, 'updated_at'])
+        TeacherStats.objects.bulk_create(created, ignore_conflicts=True)
+    return drift
+
+
+def ensure_teacher_stats():
+    """Compute the rows of teachers that have none yet."""
+    missing = list(Teacher.objects.filter(stats__isnull=True).values_list('id', flat=True))
+    if missing:
+        reconcile_teacher_stats(missing)
@@ -1,3 +1,270 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date, datetime, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import Student, Teacher, TypeEducation, Year
+from courses.models import Course, CourseGroup, CourseGroupSubscription
+
+from .analytics import enrollment_series, rebuild_enrollment_rollups
+from .archive import INDEX_RECORD, ArchivedLogs, SegmentWriter, archive_request_logs, segment_paths
+from .confirmation_latency import load_columns
+from .counters import compute_counters, ensure_counters, read_counters, reconcile_counters
+from .models import EnrollmentRollup, RequestLog, StatsCounter
+
+
+class DashboardTestData:
+    """A course with one group and a few students."""
+
+    def setUp(self):
+        self.year = Year.objects.create(name='year')
+        self.teacher = Teacher.objects.create(user=User.objects.create_user('teacher'), name='teacher')
+        self.course = Course.objects.create(title='course', year=self.year)
+        self.group = CourseGroup.objects.create(course=self.course, teacher=self.teacher, capacity=10)
+        self.students = [
+            Student.objects.create(user=User.objects.create_user(f'student{i}'), name=f'student{i}', year=self.year)
+            for i in range(3)
+        ]
+
+    def subscribe(self, student, **kwargs):
+        return CourseGroupSubscription.objects.create(
+            student=student, course=self.course, course_group=self.group, **kwargs
+        )
+
+
+class EnrollmentRollupTests(DashboardTestData, TestCase):
+
+    def rollups(self):
+        return list(EnrollmentRollup.objects.order_by('day').values_list('day', 'created', 'confirmed', 'declined'))
+
+    def test_changes_before_the_first_build_are_not_counted_from_zero(self):
+        first, second = self.subscribe(self.students[0]), self.subscribe(self.students[1])
+        CourseGroupSubscription.objects.get(pk=second.pk).delete()
+        CourseGroupSubscription.objects.filter(pk=first.pk).confirm()
+        self.assertEqual(self.rollups(), [])
+
+        [row] = enrollment_series()
+        self.assertEqual((row['created'], row['confirmed'], row['declined']), (1, 1, 0))
+
+    def test_changes_after_the_build_are_incremented(self):
+        first = self.subscribe(self.students[0])
+        enrollment_series()
+        self.subscribe(self.students[1])
+        self.subscribe(self.students[2]).delete()
+        CourseGroupSubscription.objects.filter(pk=first.pk).decline()
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), [(today, 2, 0, 1)])
+
+        rebuild_enrollment_rollups()
+        self.assertEqual(self.rollups(), [(today, 2, 0, 1)])
+
+    def test_rollup_marker_is_not_a_counter(self):
+        enrollment_series()
+        self.assertFalse(any(name.startswith('_') for name in ensure_counters()))
+
+
+class CounterTests(DashboardTestData, TestCase):
+
+    def test_changes_are_incremented(self):
+        ensure_counters()
+        kind = TypeEducation.objects.create(name='kind')
+        other_year = Year.objects.create(name='other year')
+
+        first, second, third = (self.subscribe(student) for student in self.students)
+        CourseGroupSubscription.objects.filter(pk__in=[first.pk, second.pk]).confirm()
+        CourseGroupSubscription.objects.filter(pk=third.pk).decline()
+        CourseGroupSubscription.objects.get(pk=second.pk).delete()
+
+        student = self.students[0]
+        student.active, student.type_education = True, kind
+        student.save()
+        self.students[2].delete()
+        self.course.year, self.course.type_education = other_year, kind
+        self.course.save()
+        self.group.is_active = False
+        self.group.save()
+        Course.objects.create(title='second course', year=self.year)
+        Teacher.objects.create(user=User.objects.create_user('teacher2'), name='teacher2')
+
+        counters = read_counters()
+        self.assertEqual(counters['subs_confirmed'], 1)
+        self.assertEqual(counters[f'subs_confirmed:year:{other_year.pk}'], 1)
+        self.assertEqual(counters[f'students:type:{kind.pk}'], 1)
+        self.assertEqual(reconcile_counters(), {})
+
+    def test_reconcile_repairs_drift(self):
+        ensure_counters()
+        self.subscribe(self.students[0])
+        # Queryset update() on a student bypasses the receivers
+        Student.objects.filter(pk=self.students[1].pk).update(active=True)
+        StatsCounter.objects.filter(name='teachers_total').update(value=7)
+
+        self.assertEqual(reconcile_counters(), {'students_active': (0, 1), 'teachers_total': (7, 1)})
+        self.assertEqual(read_counters(), dict(compute_counters()))
+        self.assertEqual(read_counters()['subs_pending'], 1)
+
+
+@override_settings(TIME_ZONE='Africa/Cairo')
+class ConfirmationLatencyRangeTests(DashboardTestData, TestCase):
+
+    def test_dates_cover_whole_local_days(self):
+        day = date(2024, 3, 10)
+        midnight = timezone.make_aware(datetime(2024, 3, 10))
+        for student, created_at in zip(self.students, (
+            midnight - timedelta(seconds=1), midnight, midnight + timedelta(hours=23, minutes=59),
+        )):
+            CourseGroupSubscription.objects.filter(pk=self.subscribe(student).pk).update(created_at=created_at)
+
+        created = sorted(round(value) for value in load_columns(start=day, end=day)['created'])
+        self.assertEqual(created, [midnight.timestamp(), (midnight + timedelta(hours=23, minutes=59)).timestamp()])
+        self.assertEqual(len(load_columns(end=day - timedelta(days=1))['created']), 1)
+
+
+class RequestLogCursorPaginationTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        # Pairs of rows share a timestamp, so the id decides their order
+        RequestLog.objects.bulk_create([
+            RequestLog(path=f'/p{i}/', method='GET', status_code=200, response_time=1,
+                       timestamp=now - timedelta(seconds=i // 2))
+            for i in range(25)
+        ])
+        self.expected = list(RequestLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.client = APIClient()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pages_cover_every_row_once(self):
+        seen = []
+        page = self.get('/dashboard/logs/?pagination=cursor&per_page=4')
+        while True:
+            seen += [row['id'] for row in page['results']]
+            if not page['next']:
+                break
+            page = self.get(page['next'])
+        self.assertEqual(seen, self.expected)
+
+    def test_new_rows_do_not_shift_later_pages(self):
+        first = self.get('/dashboard/logs/?pagination=cursor&per_page=4')
+        RequestLog.objects.create(path='/new/', method='GET', status_code=200, response_time=1)
+        second = self.get(first['next'])
+        self.assertEqual([row['id'] for row in second['results']], self.expected[4:8])
+
+        back = self.get(second['previous'])
+        self.assertEqual([row['id'] for row in back['results']], self.expected[:4])
+
+
+class RequestLogArchiveTests(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.day = date(2024, 1, 15)
+        self.user = User.objects.create_user('staff')
+        start = timezone.make_aware(datetime(2024, 1, 15, 8))
+        self.logs = RequestLog.objects.bulk_create([
+            RequestLog(user=self.user if i % 2 else None, path=f'/p{i % 3}/', method='POST' if i % 4 else 'GET',
+                       status_code=500 if i % 5 == 0 else 200, response_time=i, view_name=f'view{i % 2}',
+                       request_body=f'body {i}', timestamp=start + timedelta(minutes=i))
+            for i in range(30)
+        ])
+
+    def archived(self, **filters):
+        return [log.pk for log in ArchivedLogs(directory=self.directory, **filters)[0:100]]
+
+    def newest_first(self, logs):
+        return [log.pk for log in sorted(logs, key=lambda log: (log.timestamp, log.pk), reverse=True)]
+
+    def test_round_trip(self):
+        cutoff = timezone.make_aware(datetime(2024, 1, 16))
+        self.assertEqual(archive_request_logs(cutoff, chunk_size=7, directory=self.directory), 30)
+        self.assertFalse(RequestLog.objects.exists())
+
+        self.assertEqual(self.archived(), self.newest_first(self.logs))
+        self.assertEqual(
+            self.archived(status_code=500, view_name='view0'),
+            self.newest_first(log for log in self.logs if log.status_code == 500 and log.view_name == 'view0'),
+        )
+        self.assertEqual(
+            self.archived(user=self.user.pk, method='POST'),
+            self.newest_first(log for log in self.logs if log.user_id and log.method == 'POST'),
+        )
+        [log] = ArchivedLogs(directory=self.directory, path_contains='/P2/')[0:1]
+        self.assertEqual((log.user, log.request_body, log.timestamp), (self.user, 'body 29', self.logs[29].timestamp))
+
+    def test_writer_merges_rows_older_than_the_index(self):
+        writer = SegmentWriter(self.directory, self.day, block_rows=4)
+        writer.append(self.logs[15:])
+        writer.append(self.logs[:15])
+        self.assertEqual(self.archived(), self.newest_first(self.logs))
+        start = timezone.make_aware(datetime(2024, 1, 15, 8, 10))
+        end = timezone.make_aware(datetime(2024, 1, 15, 8, 20))
+        self.assertEqual(len(ArchivedLogs(directory=self.directory, start=start, end=end)), 11)
+
+    def test_rerun_after_a_crash(self):
+        SegmentWriter(self.directory, self.day).append(self.logs[:10])
+        _, index_path, _ = segment_paths(self.directory, self.day)
+        # A run killed while appending the index leaves half a record
+        with open(index_path, 'ab') as index:
+            index.write(b'\0' * (INDEX_RECORD.size // 2))
+        self.assertEqual(len(ArchivedLogs(directory=self.directory)), 10)
+
+        writer = SegmentWriter(self.directory, self.day)
+        self.assertEqual(os.path.getsize(index_path), 10 * INDEX_RECORD.size)
+        self.assertEqual(writer.append(self.logs), 20)
+        self.assertEqual(self.archived(), self.newest_first(self.logs))
+
+
+class ConfirmSubscriptionsTests(DashboardTestData, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        CourseGroup.objects.filter(pk=self.group.pk).update(capacity=2)
+        self.confirmed = self.subscribe(self.students[0], is_confirmed=True)
+        self.older, self.newer = self.subscribe(self.students[1]), self.subscribe(self.students[2])
+        self.client = APIClient()
+
+    def confirm(self, respect_capacity):
+        return self.client.post('/dashboard/confirm-subscriptions/', {
+            'subscription_ids': [self.newer.id, self.older.id, self.confirmed.id, 999],
+            'respect_capacity': respect_capacity,
+        }, format='json')
+
+    def test_respect_capacity_confirms_the_oldest(self):
+        response = self.confirm('true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: response.data[key] for key in ('confirmed', 'overflowed', 'already_confirmed', 'not_found')},
+            {'confirmed': [self.older.id], 'overflowed': [self.newer.id],
+             'already_confirmed': [self.confirmed.id], 'not_found': [999]},
+        )
+        confirmed = CourseGroupSubscription.objects.filter(is_confirmed=True).values_list('id', flat=True)
+        self.assertEqual(sorted(confirmed), [self.confirmed.id, self.older.id])
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.confirmed_count, 2)
+
+    def test_false_confirms_everything(self):
+        response = self.confirm('false')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['confirmed_count'], response.data['already_confirmed'], response.data['not_found']),
+            (2, 1, 1),
+        )
+        self.assertFalse(CourseGroupSubscription.objects.filter(is_confirmed=False).exists())
+
+    def test_invalid_flag_is_rejected(self):
+        response = self.confirm('maybe')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('respect_capacity', response.data)
+        self.assertFalse(CourseGroupSubscription.objects.filter(pk=self.older.pk, is_confirmed=True).exists())
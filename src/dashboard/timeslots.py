@@ -0,0 +1,68 @@
+"""
+Timeslot utilization heatmap.
+
+One query reads every CourseGroupTime of the matching groups together
+with the group's capacity and ``confirmed_count``. The rows are then
+pivoted in memory into a (time of day x weekday) matrix. Each cell sums
+the groups meeting at that slot: groups, capacity, confirmed seats and
+their ratio. The totals count every group once, however many slots it has.
+"""
+from courses.models import CourseGroupTime
+
+DAYS = [day for day, _ in CourseGroupTime.DAY_CHOICES]
+FILTER_FIELDS = {
+    'year': 'course_group__course__year_id',
+    'teacher': 'course_group__teacher_id',
+    'type_education': 'course_group__course__type_education_id',
+}
+
+
+def timeslot_rows(include_inactive=False, **filters):
+    times = CourseGroupTime.objects.order_by()
+    if not include_inactive:
+        times = times.filter(course_group__is_active=True)
+    for name, value in filters.items():
+        if value is not None:
+            times = times.filter(**{FILTER_FIELDS[name]: value})
+    return times.values('day', 'time', 'course_group_id', 'course_group__capacity', 'course_group__confirmed_count')
+
+
+def _cell():
+    return {'groups': 0, 'capacity': 0, 'confirmed': 0, 'utilization': None}
+
+
+def timeslot_heatmap(include_inactive=False, **filters):
+    """
+    ``{'days', 'slots', 'matrix', 'totals'}``: ``matrix`` has one row per
+    slot (``HH:MM``) and one cell per day of ``days``; empty cells are None.
+    """
+    cells = {}
+    groups = {}
+    for row in timeslot_rows(include_inactive, **filters):
+        groups[row['course_group_id']] = (row['course_group__capacity'], row['course_group__confirmed_count'])
+        cell = cells.setdefault((row['time'], row['day']), _cell())
+        cell['groups'] += 1
+        cell['capacity'] += row['course_group__capacity']
+        cell['confirmed'] += row['course_group__confirmed_count']
+
+    for cell in cells.values():
+        if cell['capacity']:
+            cell['utilization'] = round(cell['confirmed'] / cell['capacity'], 4)
+
+    totals = _cell()
+    totals['groups'] = len(groups)
+    totals['capacity'] = sum(capacity for capacity, _ in groups.values())
+    totals['confirmed'] = sum(confirmed for _, confirmed in groups.values())
+    if totals['capacity']:
+        totals['utilization'] = round(totals['confirmed'] / totals['capacity'], 4)
+
+    times = sorted({time for time, _ in cells})
+    return {
+        'days': DAYS,
+        'slots': [time.strftime('%H:%M') for time in times],
+        'matrix': [
+            {'time': time.strftime('%H:%M'), 'cells': [cells.get((time, day)) for day in DAYS]}
+            for time in times
+        ],
+        'totals': totals,
+    }
@@ -14,12 +14,19 @@ from .views import (
     CourseGroupListView,
     DashboardCourseGroupsView,
     DashboardCoursesView,
+    DashboardStudentFacetsView,
     DashboardStudentsView,
     DashboardSubscriptionsView,
     DashboardSubscriptionsSimpleView,
+    ConfirmationLatencyView,
     DeclineSubscriptionView,
+    TimeslotHeatmapView,
+    EnrollmentAnalyticsView,
     RequestLogDeleteView,
+    RequestLogLatencyView,
     RequestLogListView,
+    SlowRequestDetailView,
+    SlowRequestListView,
     StudentSubscriptionDetailView,
     SubscriptionListView,
     TeacherStatsView,
@@ -61,7 +68,11 @@ urlpatterns = [
 
     # needed get endpoints
     path('stats/', dashboard_stats, name='dashboard-stats'),
+    path('analytics/enrollments/', EnrollmentAnalyticsView.as_view(), name='analytics-enrollments'),
+    path('analytics/confirmation-latency/', ConfirmationLatencyView.as_view(), name='analytics-confirmation-latency'),
+    path('analytics/timeslots/', TimeslotHeatmapView.as_view(), name='analytics-timeslots'),
     path('students/', DashboardStudentsView.as_view(), name='dashboard-students'),
+    path('students/facets/', DashboardStudentFacetsView.as_view(), name='dashboard-student-facets'),
     
     path('courses/', DashboardCoursesView.as_view(), name='dashboard-courses'),
     path('coursegroups/', DashboardCourseGroupsView.as_view(), name='dashboard-coursegroups'),
@@ -97,4 +108,7 @@ urlpatterns = [
     #^ < ==============================[ <- Logs -> ]============================== > ^#
     path('logs/', RequestLogListView.as_view(), name='request-logs-list'),
     path('logs/delete/', RequestLogDeleteView.as_view(), name='request-logs-delete'),
+    path('logs/latency/', RequestLogLatencyView.as_view(), name='request-logs-latency'),
+    path('logs/slow/', SlowRequestListView.as_view(), name='slow-requests'),
+    path('logs/slow/<int:pk>/', SlowRequestDetailView.as_view(), name='slow-request-detail'),
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.shortcuts import get_object_or_404, render
-from rest_framework import generics, permissions, status, filters
+from rest_framework import generics, permissions, serializers, status, filters
 from rest_framework.response import Response
 from accounts.models import Student, Year, TypeEducation, Teacher
 from about.models import AboutPage, Feature
@@ -9,21 +9,40 @@ from rest_framework.response import Response
 from django.db.models import Prefetch
 from accounts.pagination import CustomPageNumberPagination
 from accounts.serializers import StudentProfileSerializer
-from courses.models import Course, CourseGroup, CourseGroupSubscription, CourseGroupTime
+from courses.models import FREE_SEATS, Course, CourseGroup, CourseGroupSubscription, CourseGroupTime
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAdminUser
 from django.db.models import Q, Exists, OuterRef,Count, Case, When
 from django.utils import timezone
 from django.contrib.auth.models import User
-from dashboard.filters import RequestLogFilter
-from dashboard.models import RequestLog
+from dashboard.analytics import ENROLLMENT_METRICS, GROUP_BY_FIELDS, INTERVALS, enrollment_series
+from dashboard.archive import ArchivedLogs, archive_horizon
+from dashboard.caching import CONFIRMATION_LATENCY, DASHBOARD_STATS, STUDENT_FACETS as STUDENT_FACETS_CACHE, TIMESLOT_HEATMAP, cached_snapshot
+from dashboard.confirmation_latency import (
+    FILTER_FIELDS as LATENCY_FILTER_FIELDS,
+    GROUP_BY_FIELDS as LATENCY_GROUP_BY_FIELDS,
+    confirmation_latency,
+)
+from dashboard.counters import ensure_counters
+from dashboard.facets import STUDENT_FACETS, facet_counts, selected_value
+from dashboard.filters import RequestLogFilter, StudentFilter
+from dashboard.models import RequestLog, RequestLogRollup, SlowRequest, TeacherStats
+from dashboard.pagination import REQUEST_LOG_PAGINATORS, ArchivedLogsPagination, RequestLogCursorPagination
+from dashboard.retention import delete_in_chunks, delete_logs_in_background, get_retention_settings
+from dashboard.rollups import latency_summary
+from dashboard.timeslots import FILTER_FIELDS as TIMESLOT_FILTER_FIELDS, timeslot_heatmap
+from dashboard.teacher_stats import ORDERING_FIELDS as TEACHER_STATS_ORDERING, ensure_teacher_stats
+from core.idempotency import idempotent
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import F, BooleanField
+from django.db.models import F, BooleanField, ExpressionWrapper, FloatField, Value
 from datetime import datetime, timedelta
 from django.utils.dateparse import parse_datetime,parse_date
 from rest_framework.filters import SearchFilter,OrderingFilter
 from django.db.models import Subquery, OuterRef, IntegerField
 from django.conf import settings
+from rest_framework.settings import api_settings
+import hashlib
+import json
 
 
 
@@ -36,6 +55,8 @@ from .serializers import (
     CourseSerializer,
     CourseSerializerDetail,
     RequestLogSerializer,
+    SlowRequestListSerializer,
+    SlowRequestSerializer,
     StudentSerializer,
     SubscriptionSerializer,
     SubscriptionSimpleSerializer,
@@ -179,7 +200,7 @@ class DashboardStudentsView(generics.ListAPIView):
     queryset = Student.objects.select_related('year', 'type_education', 'user').all()
 
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['year', 'type_education', 'active', 'block', 'by_code','code', 'is_admin', 'division', 'government','user__username','parent_phone']
+    filterset_class = StudentFilter
     search_fields = [
         'user__first_name', 'user__last_name', 'user__email',
         'name','government', 'division', 'code'
@@ -188,6 +209,46 @@ class DashboardStudentsView(generics.ListAPIView):
     ordering = ['-created']
 
 
+class DashboardStudentFacetsView(APIView):
+    """
+    Counts per value of every student facet (see dashboard.facets) under
+    the same filters and ?search= as DashboardStudentsView, from one GROUP
+    BY query. Cached per normalized filter set for STUDENT_FACETS_CACHE_TTL
+    seconds.
+    """
+    search_fields = DashboardStudentsView.search_fields
+
+    def get(self, request):
+        filterset = StudentFilter(request.query_params, queryset=Student.objects.all(), request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        active_filters = {
+            name: value for name, value in filterset.form.cleaned_data.items() if value not in (None, '')
+        }
+        search = request.query_params.get(api_settings.SEARCH_PARAM, '').strip()
+        normalized = json.dumps(
+            {'filters': {name: selected_value(value) for name, value in active_filters.items()}, 'search': search},
+            sort_keys=True, default=str,
+        )
+
+        def build():
+            queryset = filterset.queryset
+            for name, value in active_filters.items():
+                if name not in STUDENT_FACETS:
+                    queryset = filterset.filters[name].filter(queryset, value)
+            queryset = filters.SearchFilter().filter_queryset(request, queryset, self)
+            selected = {
+                name: selected_value(value) for name, value in active_filters.items() if name in STUDENT_FACETS
+            }
+            return facet_counts(queryset, selected)
+
+        result = cached_snapshot(
+            STUDENT_FACETS_CACHE, hashlib.sha1(normalized.encode()).hexdigest(), build,
+            ttl=getattr(settings, 'STUDENT_FACETS_CACHE_TTL', 30),
+        )
+        return Response(result)
+
+
 
 
 class DashboardCoursesView(generics.ListAPIView):
@@ -233,20 +294,10 @@ class DashboardCourseGroupsView(generics.ListAPIView):
             'course', 'course__year', 'course__type_education', 'teacher'
         ).prefetch_related(
             Prefetch('times', queryset=CourseGroupTime.objects.order_by('day', 'time')),
-            'coursegroupsubscription_set'
         ).annotate(
-            confirmed_subscriptions=Count(
-                'coursegroupsubscription',
-                filter=Q(coursegroupsubscription__is_confirmed=True)
-            ),
-            unconfirmed_subscriptions=Count(
-                'coursegroupsubscription',
-                filter=Q(coursegroupsubscription__is_confirmed=False)
-            ),
-            available_capacity=F('capacity') - Count(
-                'coursegroupsubscription',
-                filter=Q(coursegroupsubscription__is_confirmed=True)
-            )
+            confirmed_subscriptions=F('confirmed_count'),
+            unconfirmed_subscriptions=F('pending_count') + F('declined_count'),
+            available_capacity=FREE_SEATS,
         ).annotate(
             has_seats=Case(
                 When(available_capacity__gt=0, then=True),
@@ -285,36 +336,169 @@ class DashboardSubscriptionsView(generics.ListAPIView):
         ).all()
 
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def dashboard_stats(request):
-    
-    stats = {
+def build_dashboard_stats():
+    # Read from the incrementally maintained counters (see dashboard.counters)
+    counts = ensure_counters()
+    type_names = dict(TypeEducation.objects.values_list('id', 'name'))
+    by_type = []
+    for name, count in counts.items():
+        if name.startswith('courses:type:') and count:
+            type_id = name.rsplit(':', 1)[1]
+            by_type.append({
+                'type_education__name': None if type_id == 'none' else type_names.get(int(type_id)),
+                'count': count,
+            })
+    return {
         'students': {
-            'total': Student.objects.count(),
-            'active': Student.objects.filter(active=True).count(),
-            'blocked': Student.objects.filter(block=True).count(),
+            'total': counts.get('students_total', 0),
+            'active': counts.get('students_active', 0),
+            'blocked': counts.get('students_blocked', 0),
         },
         'teachers': {
-            'total': Teacher.objects.count(),
+            'total': counts.get('teachers_total', 0),
         },
         'courses': {
-            'total': Course.objects.count(),
-            'by_type': list(Course.objects.values('type_education__name').annotate(count=Count('id')))
+            'total': counts.get('courses_total', 0),
+            'by_type': by_type
         },
         'groups': {
-            'total': CourseGroup.objects.count(),
-            'active': CourseGroup.objects.filter(is_active=True).count(),
+            'total': counts.get('groups_total', 0),
+            'active': counts.get('groups_active', 0),
         },
         'subscriptions': {
-            'total': CourseGroupSubscription.objects.count(),
-            'confirmed': CourseGroupSubscription.objects.filter(is_confirmed=True).count(),
-            'pending': CourseGroupSubscription.objects.filter(is_confirmed=False).count(),
+            'total': counts.get('subs_total', 0),
+            'confirmed': counts.get('subs_confirmed', 0),
+            # not confirmed, declined included
+            'pending': counts.get('subs_pending', 0) + counts.get('subs_declined', 0),
         }
     }
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def dashboard_stats(request):
+    """
+    Cached for DASHBOARD_STATS_CACHE_TTL seconds and invalidated when
+    students, teachers, courses, groups or subscriptions change (see
+    dashboard.signals). Staff can pass ?fresh=1 to rebuild the snapshot.
+    """
+    fresh = request.query_params.get('fresh') in ('1', 'true') and request.user.is_staff
+    stats = cached_snapshot(
+        DASHBOARD_STATS, 'all', build_dashboard_stats,
+        ttl=getattr(settings, 'DASHBOARD_STATS_CACHE_TTL', 60), fresh=fresh,
+    )
     return Response(stats)
 
 
+class EnrollmentAnalyticsView(APIView):
+    """
+    Subscriptions created / confirmed / declined per day or week, read from
+    EnrollmentRollup (see dashboard.analytics).
+    Query params: interval (day|week), start, end (YYYY-MM-DD, default: the
+    last 90 days), course, teacher, year, type_education (ids) and
+    group_by (one of those four).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        interval = params.get('interval', 'day')
+        group_by = params.get('group_by') or None
+        if interval not in INTERVALS:
+            return Response({"error": f"interval must be one of {', '.join(INTERVALS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if group_by is not None and group_by not in GROUP_BY_FIELDS:
+            return Response({"error": f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end = parse_date(params['end']) if params.get('end') else timezone.localdate()
+            start = parse_date(params['start']) if params.get('start') else end - timedelta(days=90)
+            filters = {
+                name: int(params[name]) if params.get(name) else None for name in GROUP_BY_FIELDS
+            }
+        except ValueError:
+            return Response({"error": "Invalid parameters: dates are YYYY-MM-DD, filters are ids"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if start is None or end is None:
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        series = enrollment_series(start, end, interval=interval, group_by=group_by, **filters)
+        totals = {metric: sum(row[metric] for row in series) for metric in ENROLLMENT_METRICS}
+        return Response({
+            'interval': interval,
+            'start': start,
+            'end': end,
+            'totals': totals,
+            'series': series,
+        })
+
+
+class ConfirmationLatencyView(APIView):
+    """
+    How long subscriptions wait before being confirmed or declined, and how
+    old the pending backlog is (see dashboard.confirmation_latency).
+    Query params: start, end (YYYY-MM-DD, created_at range, default: all
+    history), course, teacher, year, type_education (ids) and group_by
+    (teacher|course). Cached per filter for CONFIRMATION_LATENCY_CACHE_TTL
+    seconds; staff can pass ?fresh=1.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        group_by = params.get('group_by') or None
+        if group_by is not None and group_by not in LATENCY_GROUP_BY_FIELDS:
+            return Response({"error": f"group_by must be one of {', '.join(LATENCY_GROUP_BY_FIELDS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            dates = {name: parse_date(params[name]) if params.get(name) else None for name in ('start', 'end')}
+            filters = {
+                name: int(params[name]) if params.get(name) else None for name in LATENCY_FILTER_FIELDS
+            }
+        except ValueError:
+            return Response({"error": "Invalid parameters: dates are YYYY-MM-DD, filters are ids"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if any(params.get(name) and value is None for name, value in dates.items()):
+            return Response({"error": "Invalid date format. Use YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        key = ':'.join(f'{name}={value}' for name, value in sorted({**dates, **filters, 'group_by': group_by}.items()))
+        fresh = params.get('fresh') in ('1', 'true') and request.user.is_staff
+        result = cached_snapshot(
+            CONFIRMATION_LATENCY, key,
+            lambda: confirmation_latency(dates['start'], dates['end'], group_by=group_by, **filters),
+            ttl=getattr(settings, 'CONFIRMATION_LATENCY_CACHE_TTL', 300), fresh=fresh,
+        )
+        return Response(result)
+
+
+class TimeslotHeatmapView(APIView):
+    """
+    Weekday x time-slot matrix of groups, capacity and confirmed seats
+    (see dashboard.timeslots). Query params: year, teacher, type_education
+    (ids) and include_inactive. Cached until groups, their times or
+    subscriptions change.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            filters = {name: int(params[name]) if params.get(name) else None for name in TIMESLOT_FILTER_FIELDS}
+        except ValueError:
+            return Response({"error": "Filters must be ids"}, status=status.HTTP_400_BAD_REQUEST)
+        include_inactive = params.get('include_inactive') in ('1', 'true')
+
+        key = ':'.join(f'{name}={value}' for name, value in sorted(filters.items()))
+        result = cached_snapshot(
+            TIMESLOT_HEATMAP, f'{key}:inactive={include_inactive}',
+            lambda: timeslot_heatmap(include_inactive, **filters),
+            ttl=getattr(settings, 'TIMESLOT_HEATMAP_CACHE_TTL', 3600),
+        )
+        return Response(result)
+
+
 ################################ new #######################################
 
 class ApplyStudentCodeView(APIView):
@@ -366,6 +550,7 @@ class ApplyStudentCodeView(APIView):
 class ConfirmSubscriptionsView(APIView):
     # permission_classes = [IsAdminUser]
 
+    @idempotent
     def post(self, request):
         subscription_ids = request.data.get('subscription_ids', [])
         
@@ -375,6 +560,17 @@ class ConfirmSubscriptionsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
+        # Form posts send "false" / "0", which are truthy strings
+        try:
+            respect_capacity = serializers.BooleanField().to_internal_value(
+                request.data.get('respect_capacity', False)
+            )
+        except serializers.ValidationError as exc:
+            return Response({"respect_capacity": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        if respect_capacity:
+            return self.confirm_within_capacity(subscription_ids)
+
         try:
             # Get all existing subscriptions from the provided IDs
             existing_subscriptions = CourseGroupSubscription.objects.filter(
@@ -390,18 +586,11 @@ class ConfirmSubscriptionsView(APIView):
                 is_confirmed=False
             )
             
-            # Update unconfirmed subscriptions
-            confirmed_count = unconfirmed_subscriptions.update(
-                is_confirmed=True,
-                confirmed_at=timezone.now(),
-                is_declined=False,
-                decline_note=None,
-                declined_at=None
-
-            )
+            # Confirm them (keeps the dashboard counters in step)
+            confirmed_count = unconfirmed_subscriptions.confirm()
             
             # Calculate already confirmed
-            already_confirmed = len(existing_subscriptions) - confirmed_count
+            already_confirmed = len(found_ids) - confirmed_count
             
             response_data = {
                 "confirmed_count": confirmed_count,
@@ -425,6 +614,33 @@ class ConfirmSubscriptionsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    def confirm_within_capacity(self, subscription_ids):
+        # Oldest first per group, never past a group's capacity; the rest
+        # are reported as overflowed and stay unconfirmed
+        try:
+            result = CourseGroupSubscription.objects.filter(id__in=subscription_ids).confirm_within_capacity()
+            found = {*result['confirmed'], *result['overflowed'], *result['already_confirmed']}
+            result['not_found'] = [
+                subscription_id for subscription_id in dict.fromkeys(map(int, subscription_ids))
+                if subscription_id not in found
+            ]
+        except (TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            **result,
+            "confirmed_count": len(result['confirmed']),
+            "overflowed_count": len(result['overflowed']),
+            "already_confirmed_count": len(result['already_confirmed']),
+            "not_found_count": len(result['not_found']),
+            "message": (
+                f"تم تفعيل {len(result['confirmed'])} اشتراك. "
+                f"{len(result['overflowed'])} اشتراك لم يتم تفعيله لعدم توفر أماكن. "
+                f"{len(result['already_confirmed'])} اشتراك مفعل مسبقاً. "
+                f"{len(result['not_found'])} اشتراك غير موجود"
+            )
+        }, status=status.HTTP_200_OK)
+
 
 class AdminDeleteSubscriptionView(APIView):
     # permission_classes = [IsAdminUser]
@@ -963,6 +1179,7 @@ class AdminTeacherDetailView(APIView):
 class AdminCreateSubscriptionsView(APIView):
     # permission_classes = [IsAdminUser]
 
+    @idempotent
     def post(self, request):
         serializer = AdminCreateSubscriptionSerializer(data=request.data)
         if not serializer.is_valid():
@@ -1070,23 +1287,38 @@ class CourseGroupListView(APIView):
 
 
 class TeacherStatsView(APIView):
+    """
+    Reads the materialized TeacherStats rows (see dashboard.teacher_stats),
+    one row per teacher. ?ordering= takes any of TEACHER_STATS_ORDERING,
+    optionally prefixed with '-'; the default is the teachers' own order.
+    """
     def get(self, request):
-        teachers = Teacher.objects.annotate(
-            group_count=Count('coursegroup', distinct=True),
-            confirmed_subscriptions=Count(
-                'coursegroup__coursegroupsubscription',
-                filter=Q(coursegroup__coursegroupsubscription__is_confirmed=True),
-                distinct=True
+        ordering = request.query_params.get('ordering')
+        if ordering and ordering.lstrip('-') not in TEACHER_STATS_ORDERING:
+            return Response({"error": f"ordering must be one of {', '.join(TEACHER_STATS_ORDERING)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ensure_teacher_stats()
+
+        rows = TeacherStats.objects.select_related('teacher').annotate(
+            unconfirmed=F('pending') + F('declined'),
+            fill_ratio=Case(
+                When(total_capacity__gt=0, then=ExpressionWrapper(
+                    F('confirmed') * 1.0 / F('total_capacity'), output_field=FloatField()
+                )),
+                default=Value(0.0),
+                output_field=FloatField(),
             ),
-            unconfirmed_subscriptions=Count(
-                'coursegroup__coursegroupsubscription',
-                filter=Q(coursegroup__coursegroupsubscription__is_confirmed=False),
-                distinct=True
-            )
-        ).select_related('user').prefetch_related('coursegroup_set')
+        )
+        if ordering:
+            descending = ordering.startswith('-')
+            field = TEACHER_STATS_ORDERING[ordering.lstrip('-')]
+            rows = rows.order_by(F(field).desc() if descending else F(field).asc(), 'teacher__order', 'teacher_id')
+        else:
+            rows = rows.order_by('teacher__order', 'teacher_id')
 
         data = []
-        for teacher in teachers:
+        for row in rows:
+            teacher = row.teacher
             data.append({
                 'teacher_id': teacher.id,
                 'name': teacher.name,
@@ -1094,9 +1326,14 @@ class TeacherStatsView(APIView):
                 'education_language_type': teacher.education_language_type,
                 'order': teacher.order,
                 'image': teacher.image.url if teacher.image else None,
-                'total_groups': teacher.group_count,
-                'confirmed_subscriptions': teacher.confirmed_subscriptions,
-                'unconfirmed_subscriptions': teacher.unconfirmed_subscriptions,
+                'total_groups': row.groups,
+                'active_groups': row.active_groups,
+                'confirmed_subscriptions': row.confirmed,
+                'unconfirmed_subscriptions': row.unconfirmed,
+                'pending_subscriptions': row.pending,
+                'declined_subscriptions': row.declined,
+                'total_capacity': row.total_capacity,
+                'fill_ratio': round(row.fill_ratio, 4),
             })
 
         return Response({'teachers': data})
@@ -1263,9 +1500,149 @@ class RequestLogListView(generics.ListAPIView):
     filterset_class = RequestLogFilter 
     search_fields = ['path', 'view_name']
     ordering_fields = ['timestamp', 'response_time', 'status_code']
+    ordering = ['-timestamp', '-id']
+
+    @property
+    def paginator(self):
+        """
+        ?pagination=page (default), cursor (keyset on -timestamp, -id, no
+        count) or estimate (page numbers with an estimated/capped count).
+        """
+        if not hasattr(self, '_paginator'):
+            mode = self.request.query_params.get('pagination', 'page')
+            if self.request.query_params.get('cursor'):
+                mode = 'cursor'
+            self._paginator = REQUEST_LOG_PAGINATORS.get(mode, CustomPageNumberPagination)()
+        return self._paginator
+
+    def filter_queryset(self, queryset):
+        # Keyset pagination always walks (-timestamp, -id); a custom
+        # ?ordering= would not match the cursor.
+        for backend in self.filter_backends:
+            if backend is OrderingFilter and isinstance(self.paginator, RequestLogCursorPagination):
+                continue
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Served from the archive (see dashboard.archive) with ?source=archive,
+        or when timestamp_before lies entirely before the archive horizon.
+        """
+        filterset = self.filterset_class(request.query_params, queryset=RequestLog.objects.none())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = filterset.form.cleaned_data
+
+        horizon = archive_horizon()
+        use_archive = request.query_params.get('source') == 'archive'
+        if not use_archive and horizon is not None and data.get('timestamp_before'):
+            use_archive = data['timestamp_before'] < timezone.localdate(horizon)
+        if not use_archive:
+            return super().list(request, *args, **kwargs)
+
+        start = end = None
+        if data.get('timestamp_after'):
+            start = parse_datetime_param(data['timestamp_after'].isoformat())
+        if data.get('timestamp_before'):
+            end = parse_datetime_param(data['timestamp_before'].isoformat(), end_of_day=True)
+        if data.get('timestamp'):
+            start = end = data['timestamp']
+        user = data.get('user')
+        logs = ArchivedLogs(
+            start=start,
+            end=end,
+            status_code=data.get('status_code'),
+            view_name=data.get('view_name') or None,
+            user=user.pk if user else None,
+            method=data.get('method') or None,
+            path_contains=data.get('path__icontains') or None,
+        )
+        paginator = ArchivedLogsPagination()
+        page = paginator.paginate_queryset(logs, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+def parse_datetime_param(value, end_of_day=False):
+    """
+    Parse an ISO datetime or a YYYY-MM-DD date (start or end of that day)
+    into an aware datetime. Raises ValueError on bad input.
+    """
+    # Dates first: parse_datetime also accepts a bare date, as midnight
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day, datetime.max.time() if end_of_day else datetime.min.time())
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class RequestLogLatencyView(APIView):
+    """
+    Latency percentiles per view from the per-minute rollups.
+    Query params: start, end (ISO datetime or YYYY-MM-DD, default: last
+    24 hours), view_name, method.
+    """
+    # permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            end = parse_datetime_param(params['end'], end_of_day=True) if params.get('end') else timezone.now()
+            start = parse_datetime_param(params['start']) if params.get('start') else end - timedelta(days=1)
+        except ValueError:
+            return Response(
+                {"error": "Invalid start/end format. Use ISO format (YYYY-MM-DDThh:mm:ss) or YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rollups = RequestLogRollup.objects.filter(bucket__gte=start, bucket__lte=end)
+        if params.get('view_name'):
+            rollups = rollups.filter(view_name=params['view_name'])
+        if params.get('method'):
+            rollups = rollups.filter(method=params['method'].upper())
+
+        return Response({
+            'start': start,
+            'end': end,
+            'views': latency_summary(rollups),
+        })
+
+
+class SlowRequestListView(generics.ListAPIView):
+    """Traces of slow requests (see SLOW_REQUEST_TRACE), without the statements."""
+    queryset = SlowRequest.objects.all()
+    serializer_class = SlowRequestListSerializer
+    # permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    filterset_fields = ['view_name', 'method', 'status_code', 'user']
+    search_fields = ['path', 'view_name', 'serializer_name']
+    ordering_fields = ['timestamp', 'response_time', 'db_time', 'db_query_count']
     ordering = ['-timestamp']
 
+    def get_queryset(self):
+        return super().get_queryset().defer('queries')
+
+
+class SlowRequestDetailView(generics.RetrieveAPIView):
+    """One slow request with every SQL statement, its time and call site."""
+    queryset = SlowRequest.objects.all()
+    serializer_class = SlowRequestSerializer
+    # permission_classes = [IsAdminUser]
+
+
 class RequestLogDeleteView(APIView):
+    """
+    Delete logs between start_date and end_date (ISO datetime or YYYY-MM-DD)
+    in small chunks so the purge never holds the write lock for long.
+    With ?background=true the deletion runs on a worker thread and the view
+    answers 202 straight away.
+    """
     # permission_classes = [IsAdminUser]
 
     def delete(self, request):
@@ -1278,76 +1655,48 @@ class RequestLogDeleteView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Start building the query
         query_filter = {}
         
-        # Process start_date if provided
         if start_date:
             try:
-                # Try to parse as ISO datetime first
-                start_datetime = parse_datetime(start_date)
-                
-                # If that fails, try to parse as date only
-                if not start_datetime:
-                    date_obj = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-                    start_datetime = timezone.make_aware(datetime.datetime.combine(date_obj, datetime.time.min))
-                
-                # If it's still None, it's an invalid format
-                if not start_datetime:
-                    return Response(
-                        {"error": "Invalid start_date format. Use ISO format (YYYY-MM-DDThh:mm:ss) or YYYY-MM-DD"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                    
-                query_filter['timestamp__gte'] = start_datetime
-                
+                query_filter['timestamp__gte'] = parse_datetime_param(start_date)
             except ValueError:
                 return Response(
                     {"error": "Invalid start_date format. Use ISO format (YYYY-MM-DDThh:mm:ss) or YYYY-MM-DD"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        # Process end_date if provided
         if end_date:
             try:
-                # Try to parse as ISO datetime first
-                end_datetime = parse_datetime(end_date)
-                
-                # If that fails, try to parse as date only
-                if not end_datetime:
-                    date_obj = datetime.datetime.strptime(end_date, "%Y-%m-%d").date()
-                    end_datetime = timezone.make_aware(datetime.datetime.combine(date_obj, datetime.time.max))
-                
-                # If it's still None, it's an invalid format
-                if not end_datetime:
-                    return Response(
-                        {"error": "Invalid end_date format. Use ISO format (YYYY-MM-DDThh:mm:ss) or YYYY-MM-DD"},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                    
-                query_filter['timestamp__lte'] = end_datetime
-                
+                query_filter['timestamp__lte'] = parse_datetime_param(end_date, end_of_day=True)
             except ValueError:
                 return Response(
                     {"error": "Invalid end_date format. Use ISO format (YYYY-MM-DDThh:mm:ss) or YYYY-MM-DD"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        # Debug info before deletion
-        logs_before_delete = RequestLog.objects.filter(**query_filter).count()
-        
-        # Delete logs
-        deleted, _ = RequestLog.objects.filter(**query_filter).delete()
+        logs = RequestLog.objects.filter(**query_filter)
+        applied_filter = {
+            "start_date": str(query_filter.get('timestamp__gte')),
+            "end_date": str(query_filter.get('timestamp__lte'))
+        }
+
+        if request.query_params.get('background', '').lower() in ('1', 'true'):
+            delete_logs_in_background(logs)
+            return Response({
+                "message": "Deletion started in the background",
+                "query_filter": applied_filter
+            }, status=status.HTTP_202_ACCEPTED)
+
+        conf = get_retention_settings()
+        deleted = delete_in_chunks(logs, conf['CHUNK_SIZE'], conf['PAUSE'])
         
-        # Add debug info to response
         return Response({
             "message": f"Successfully deleted {deleted} logs",
             "deleted_count": deleted,
-            "found_before_delete": logs_before_delete,
-            "query_filter": {
-                "start_date": str(query_filter.get('timestamp__gte')),
-                "end_date": str(query_filter.get('timestamp__lte'))
-            }
+            # Kept for existing clients; no separate count() is run any more
+            "found_before_delete": deleted,
+            "query_filter": applied_filter
         })
 
 